@@ -0,0 +1,117 @@
+import numpy as np # type: ignore
+
+
+# ----------------------
+#  Trajectories
+# ----------------------
+
+def unwrap(positions, boxsize, images=None):
+    """Unwrapped trajectory of shape (T, N, 2) from wrapped positions.
+
+    Uses the box crossings tracked by the engine (System.images) when available. Otherwise every jump larger than half the box between two consecutive frames is taken as a crossing, which is only valid if no atom moves more than half a box between frames.
+    """
+    positions = np.asarray(positions, dtype=float)
+    if images is not None:
+        return positions + np.asarray(images) * boxsize
+
+    jumps = np.diff(positions, axis=0)
+    crossings = -np.round(jumps / boxsize)
+    shift = np.concatenate([np.zeros_like(positions[:1]),
+                            np.cumsum(crossings, axis=0)])
+    return positions + shift * boxsize
+
+
+def from_recorder(recorder, boxsize):
+    """Unwrapped positions and velocities (T, N, 2) of the frames kept by an MDRecorder."""
+    positions = np.asarray(recorder.positions)
+    images = np.asarray(recorder.images) if recorder.images else None
+    return unwrap(positions, boxsize, images), np.asarray(recorder.velocities)
+
+
+# ----------------------
+#  FFT correlations
+# ----------------------
+
+def _autocorrelation(x):
+    """Sum over t of x(t) x(t + lag) for every column of x (T, M), via FFT in O(T log T)."""
+    T = x.shape[0]
+    # Zero padding to 2T avoids the circular wrap-around
+    n_fft = 1 << (2 * T - 1).bit_length()
+    f = np.fft.rfft(x, n=n_fft, axis=0)
+    return np.fft.irfft(f * f.conj(), n=n_fft, axis=0)[:T]
+
+
+def msd_fft(positions, chunk=256):
+    """Mean-square displacement of unwrapped positions (T, N, dim), averaged over atoms and time origins.
+
+    MSD(m) = S1(m) - 2 S2(m), with S2 the FFT autocorrelation of the positions and S1 obtained from cumulative sums of r^2. Atoms are processed by chunks so that np.memmap trajectories are read chunk by chunk.
+
+    Returns:
+        numpy.ndarray: MSD for lags 0 .. T - 1.
+    """
+    T, N = positions.shape[:2]
+    lags = np.arange(T)
+    n_origins = (T - lags)[:, None] # (T, 1)
+    msd = np.zeros(T)
+
+    for start in range(0, N, chunk):
+        r = np.asarray(positions[:, start:start + chunk], dtype=float)
+        r = r.reshape(T, -1, r.shape[-1])
+
+        d = np.einsum("tnk,tnk->tn", r, r) # r^2, (T, n)
+        cumsum = np.concatenate([np.zeros((1, d.shape[1])), np.cumsum(d, axis=0)])
+        total = cumsum[-1]
+
+        # sum_{t < T - m} r^2(t) + sum_{t >= m} r^2(t)
+        s1 = cumsum[T - lags] + total - cumsum[lags]
+
+        s2 = _autocorrelation(r.reshape(T, -1)).reshape(r.shape).sum(axis=2)
+
+        msd += ((s1 - 2 * s2) / n_origins).sum(axis=1)
+
+    return msd / N
+
+
+def vacf_fft(velocities, chunk=256, normalise=False):
+    """Velocity autocorrelation <v(0) . v(lag)> (T, N, dim), averaged over atoms and time origins.
+
+    Returns:
+        numpy.ndarray: VACF for lags 0 .. T - 1, divided by its value at lag 0 if normalise.
+    """
+    T, N = velocities.shape[:2]
+    n_origins = (T - np.arange(T))[:, None]
+    vacf = np.zeros(T)
+
+    for start in range(0, N, chunk):
+        v = np.asarray(velocities[:, start:start + chunk], dtype=float)
+        corr = _autocorrelation(v.reshape(T, -1))
+        vacf += (corr / n_origins).sum(axis=1)
+
+    vacf /= N
+    if normalise and vacf[0] != 0:
+        vacf /= vacf[0]
+    return vacf
+
+
+# ----------------------
+#  Diffusion coefficients
+# ----------------------
+
+def diffusion_from_msd(msd, dt, dim=2, fit_range=(0.1, 0.5)):
+    """Einstein relation MSD = 2 dim D t, fitted over a fraction of the lags.
+
+    The first lags (ballistic regime) and the last ones (few time origins) are excluded by fit_range.
+    """
+    T = len(msd)
+    start = max(int(fit_range[0] * T), 1)
+    stop = max(int(fit_range[1] * T), start + 2)
+    t = np.arange(start, stop) * dt
+    slope = np.polyfit(t, msd[start:stop], 1)[0]
+    return slope / (2 * dim)
+
+
+def diffusion_from_vacf(vacf, dt, dim=2):
+    """Green-Kubo relation D = 1/dim * integral of the (non normalised) VACF."""
+    # Trapezoidal rule
+    integral = dt * (np.sum(vacf) - 0.5 * (vacf[0] + vacf[-1]))
+    return integral / dim
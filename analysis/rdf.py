@@ -0,0 +1,112 @@
+import numpy as np # type: ignore
+
+
+class RDFAccumulator():
+    """Streaming radial distribution function g(r) of a 2D periodic system.
+
+    Analysis stage run by the Engine every `every` steps (see Engine.add_analysis). It reuses the minimum-image pair distances kept by the force kernel for that step (system.pair_distances): the full matrix of the dense kernel, or the pairs within the cutoff of the tabulated kernels, usable when r_max does not exceed that cutoff. It falls back to computing them from the positions, in row blocks, when they are not available.
+    Only the histogram is kept, so memory does not depend on the length of the run.
+
+    Attributes:
+        boxsize (float): Side of the periodic box.
+        r_max (float): Largest distance of the histogram, half the box by default, at most the cutoff to reuse the distances of the tabulated kernels.
+        n_bins (int): Number of histogram bins.
+        every (int): Sampling period in engine steps, 0 to disable.
+        counts (numpy.ndarray): Accumulated number of pairs per bin.
+        n_frames (int): Number of sampled frames.
+        n_atoms (int): Number of atoms of the sampled frames.
+
+    Methods:
+        wants(step): Returns True if the stage samples this step.
+        update(engine): Adds the current configuration of the engine to the histogram.
+        add_distances(r, n_atoms, both_ways): Adds pair distances to the histogram.
+        add_positions(positions): Computes the minimum-image pair distances and adds them.
+        result(): Returns the bin centres and g(r).
+        reset(): Clears the histogram.
+        set_box(boxsize): Follows a rescaled box, the histogram restarts. The default r_max follows half the box, a given one is kept within it.
+    """
+    def __init__(self, boxsize, n_bins=100, r_max=None, every=10, block_size=1024):
+        self.boxsize = boxsize
+        self.r_max = r_max if r_max is not None else 0.5 * boxsize
+        self._half_box = r_max is None
+        self.n_bins = n_bins
+        self.every = every
+        self.block_size = block_size
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.n_bins)
+        self.n_frames = 0
+        self.n_atoms = 0
+
+    def set_box(self, boxsize):
+        # Histograms of different densities do not add up
+        self.r_max = 0.5 * boxsize if self._half_box else min(self.r_max, 0.5 * boxsize)
+        self.boxsize = boxsize
+        self.reset()
+
+    def wants(self, step):
+        return self.every > 0 and step % self.every == 0
+
+    def update(self, engine):
+        positions = engine.system.positions
+        distances = getattr(engine.system, "pair_distances", None)
+
+        if distances is None or (distances.ndim == 1 and self.r_max > engine.system.pair_cutoff):
+            self.add_positions(positions)
+        elif distances.ndim == 2:
+            # Dense (N, N) matrix from the kernel: every pair appears twice
+            self.add_distances(distances, len(positions), both_ways=True)
+        else:
+            # Pairs within the cutoff from a tabulated kernel: every pair once
+            self.add_distances(distances, len(positions), both_ways=False)
+
+    def add_distances(self, r, n_atoms, both_ways=False):
+        # Uniform bins: direct index computation and one bincount
+        r = r[r < self.r_max]
+        idx = (r * (self.n_bins / self.r_max)).astype(np.intp)
+        counts = np.bincount(idx, minlength=self.n_bins)[:self.n_bins]
+
+        self.counts += 0.5 * counts if both_ways else counts
+        self.n_frames += 1
+        self.n_atoms = n_atoms
+
+    def add_positions(self, positions):
+        n = len(positions)
+        counts = np.zeros(self.n_bins)
+        scale = self.n_bins / self.r_max
+
+        # Blocks of rows bound the memory to (block_size, N)
+        for start in range(0, n, self.block_size):
+            stop = min(start + self.block_size, n)
+            d = positions[start:stop, None, :] - positions[None, :, :]
+            # Minimum image convention
+            d -= self.boxsize * np.round(d / self.boxsize)
+            r = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+
+            # Keep each pair once (j > i)
+            rows = np.arange(stop - start)[:, None]
+            cols = np.arange(n)[None, :]
+            r = r[(cols > rows + start) & (r < self.r_max)]
+
+            idx = (r * scale).astype(np.intp)
+            counts += np.bincount(idx, minlength=self.n_bins)[:self.n_bins]
+
+        self.counts += counts
+        self.n_frames += 1
+        self.n_atoms = n
+
+    def result(self):
+        edges = np.linspace(0, self.r_max, self.n_bins + 1)
+        centres = 0.5 * (edges[1:] + edges[:-1])
+
+        if self.n_frames == 0 or self.n_atoms < 2:
+            return centres, np.zeros(self.n_bins)
+
+        # Ideal-gas pair count per shell: N (N - 1) / 2 * shell area / box area
+        n = self.n_atoms
+        shell_area = np.pi * (edges[1:]**2 - edges[:-1]**2)
+        ideal = 0.5 * n * (n - 1) * shell_area / (self.boxsize * self.boxsize)
+        ideal *= self.n_frames
+
+        return centres, self.counts / ideal
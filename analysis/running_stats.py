@@ -0,0 +1,136 @@
+import math
+
+
+class RunningStats():
+    """Streaming mean, variance, min and max of a scalar series (Welford's algorithm).
+
+    Attributes:
+        n (int): Number of values pushed.
+        mean (float): Running mean.
+        min (float): Smallest value pushed.
+        max (float): Largest value pushed.
+
+    Methods:
+        push(x): Adds a value in O(1) time and memory.
+        variance(): Returns the sample variance.
+        std(): Returns the sample standard deviation.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def push(self, x):
+        x = float(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def variance(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+class BlockAverager():
+    """Streaming Flyvbjerg-Petersen block averaging for the error of the mean of a correlated series.
+
+    Level k holds the means of blocks of 2^k consecutive values: each level keeps one pending value and its own RunningStats, and every completed pair is pushed to the next level. Memory is O(log n).
+    The standard error estimated at level k grows with k until blocks are longer than the correlation time, then plateaus; error() returns the largest estimate among levels with at least min_blocks blocks, a conservative plateau estimate.
+
+    Methods:
+        push(x): Adds a value to level 0 and cascades the completed pairs.
+        levels(): Returns (block size, number of blocks, error, error of the error) for every level.
+        error(min_blocks): Returns the error of the mean, 0 before two values.
+    """
+    def __init__(self):
+        self._stats = []
+        self._pending = []
+
+    def push(self, x):
+        level = 0
+        x = float(x)
+        while True:
+            if level == len(self._stats):
+                self._stats.append(RunningStats())
+                self._pending.append(None)
+
+            self._stats[level].push(x)
+
+            pending = self._pending[level]
+            if pending is None:
+                self._pending[level] = x
+                return
+
+            self._pending[level] = None
+            x = 0.5 * (pending + x)
+            level += 1
+
+    def levels(self):
+        result = []
+        for k, stats in enumerate(self._stats):
+            if stats.n < 2:
+                break
+            # Standard error of the mean from n blocks, with its own uncertainty
+            err = math.sqrt(stats.variance() / stats.n)
+            result.append((2**k, stats.n, err, err / math.sqrt(2 * (stats.n - 1))))
+        return result
+
+    def error(self, min_blocks=16):
+        levels = self.levels()
+        if not levels:
+            return 0.0
+        errors = [err for _, n, err, _ in levels if n >= min_blocks]
+        # Short series: the naive level-0 estimate is all we have
+        return max(errors) if errors else levels[0][2]
+
+
+class ObservableStats():
+    """Running statistics and block-averaged error of one observable, updated at each record.
+
+    Attributes:
+        running (RunningStats): Mean, variance, min and max.
+        blocks (BlockAverager): Hierarchical block averages for the error of the mean.
+
+    Methods:
+        push(x): Adds a value.
+        error(): Returns the block-averaged error of the mean.
+        summary(): Returns a dictionary with n, mean, std, min, max and error.
+    """
+    def __init__(self):
+        self.running = RunningStats()
+        self.blocks = BlockAverager()
+
+    @property
+    def n(self):
+        return self.running.n
+
+    @property
+    def mean(self):
+        return self.running.mean
+
+    def push(self, x):
+        self.running.push(x)
+        self.blocks.push(x)
+
+    def error(self):
+        return self.blocks.error()
+
+    def summary(self):
+        return {
+            "n": self.running.n,
+            "mean": self.running.mean,
+            "std": self.running.std(),
+            "min": self.running.min,
+            "max": self.running.max,
+            "error": self.error(),
+        }
@@ -0,0 +1,203 @@
+import mmap
+import struct
+import zlib
+import numpy as np # type: ignore
+
+
+# File layout:
+#   header   MAGIC, version, n_atoms, chunk_size, boxsize, precision, species (n_atoms x 2 bytes)
+#   chunks   CHUNK, first frame, n_frames, itemsize, payload length, steps (n_frames int64), payload
+#   index    chunk offsets (uint64), number of chunks, INDEX, offset of the index
+MAGIC = b"DYNTRJ\x00\x00"
+CHUNK = b"CHNK"
+INDEX = b"INDX"
+VERSION = 1
+
+HEADER = struct.Struct("<8sIIIdd")
+CHUNK_HEADER = struct.Struct("<4sQIII")
+TRAILER = struct.Struct("<Q4sQ")
+
+
+# ----------------------
+#  Encoding
+# ----------------------
+
+def quantise(positions, boxsize, precision):
+    """Positions as integers on a grid of round(1 / precision) levels per box side, wrapped in the box.
+
+    The reconstruction error is at most half a grid spacing, i.e. precision * boxsize / 2 per coordinate.
+    """
+    levels = int(round(1 / precision))
+    q = np.rint(np.asarray(positions) * (levels / boxsize)).astype(np.int64)
+    return q % levels
+
+
+def _zigzag(d):
+    # Small signed values to small unsigned values: 0, -1, 1, -2... -> 0, 1, 2, 3...
+    return ((d << 1) ^ (d >> 63)).view(np.uint64)
+
+
+def _unzigzag(z):
+    z = z.astype(np.uint64)
+    return (z >> np.uint64(1)).astype(np.int64) ^ -(z & np.uint64(1)).astype(np.int64)
+
+
+def encode_chunk(q, levels, level=6):
+    """Compresses a chunk of quantised frames of shape (n_frames, n_atoms, 2).
+
+    Each frame is stored as its difference with the previous one (the first with zero), wrapped to the shortest periodic displacement so that atoms crossing the box stay small. The differences are zigzag-encoded in the smallest unsigned type that fits, their bytes are grouped by significance (byte shuffle), and the result is entropy-coded with DEFLATE.
+
+    Returns:
+        tuple: itemsize and compressed bytes.
+    """
+    d = np.diff(q, axis=0, prepend=0)
+    d = (d + levels // 2) % levels - levels // 2
+    z = _zigzag(d)
+
+    itemsize = 1
+    largest = int(z.max(initial=0))
+    while itemsize < 8 and largest >= 1 << (8 * itemsize):
+        itemsize *= 2
+    z = z.astype(f"<u{itemsize}")
+
+    shuffled = z.view(np.uint8).reshape(-1, itemsize).T
+    return itemsize, zlib.compress(shuffled.tobytes(), level)
+
+
+def decode_chunk(payload, itemsize, n_frames, n_atoms, levels):
+    """Inverse of encode_chunk, vectorised over the whole chunk: quantised frames of shape (n_frames, n_atoms, 2)."""
+    raw = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+    z = raw.reshape(itemsize, -1).T.copy().view(f"<u{itemsize}").ravel()
+    d = _unzigzag(z).reshape(n_frames, n_atoms, 2)
+    return np.cumsum(d, axis=0) % levels
+
+
+def write_header(f, species, boxsize, precision, chunk_size):
+    species = np.asarray(species).astype("S2")
+    f.write(HEADER.pack(MAGIC, VERSION, len(species), chunk_size, boxsize, precision))
+    f.write(species.tobytes())
+
+
+def write_chunk(f, first, steps, q, levels, level=6):
+    """Appends one chunk of quantised frames, returns its offset in the file."""
+    offset = f.tell()
+    itemsize, payload = encode_chunk(q, levels, level)
+    f.write(CHUNK_HEADER.pack(CHUNK, first, len(q), itemsize, len(payload)))
+    f.write(np.asarray(steps, dtype="<i8").tobytes())
+    f.write(payload)
+    return offset
+
+
+def write_index(f, offsets):
+    index = f.tell()
+    f.write(np.asarray(offsets, dtype="<u8").tobytes())
+    f.write(TRAILER.pack(len(offsets), INDEX, index))
+
+
+# ----------------------
+#  Reading
+# ----------------------
+
+class CompressedTrajectory():
+    """Reader of the compressed trajectories written by assets.trajectory.CompressedWriter.
+
+    The file is memory-mapped. Frames are grouped in independent chunks, listed in an index at the end of the file, so reading frame i only reads and decodes the chunk holding it (the last decoded chunk is cached). Files that were not closed have no index, their chunks are then found by following the chunk headers.
+
+    Attributes:
+        species (numpy.ndarray): Type of each atom, in atom ID order.
+        boxsize (float): Size of the periodic box.
+        precision (float): Grid spacing relative to boxsize.
+        max_error (float): Largest difference between a decoded coordinate and the original one (modulo the box), precision * boxsize / 2.
+        steps (numpy.ndarray): Engine step of each frame.
+        n_frames (int): Number of frames.
+
+    Methods:
+        read(start, stop): Returns the frames start to stop as an array of shape (n, n_atoms, 2).
+        __getitem__(i): Returns frame i, of shape (n_atoms, 2).
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, _, n_atoms, self.chunk_size, self.boxsize, self.precision = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compressed DynAtom trajectory")
+        self.n_atoms = n_atoms
+        self.levels = int(round(1 / self.precision))
+        self.spacing = self.boxsize / self.levels
+        self.max_error = 0.5 * self.spacing
+
+        start = HEADER.size
+        self.species = np.frombuffer(self.data, dtype="S2", count=n_atoms, offset=start).astype("U2")
+        self._first_chunk = start + 2 * n_atoms
+
+        self.chunks = self._read_index()
+        self.steps = np.concatenate([chunk["steps"] for chunk in self.chunks]) \
+                     if self.chunks else np.zeros(0, dtype=np.int64)
+        self.n_frames = len(self.steps)
+        self._cache = (None, None)
+
+    def _read_index(self):
+        offsets = None
+        if len(self.data) >= self._first_chunk + TRAILER.size:
+            n_chunks, magic, index = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+            if magic == INDEX:
+                offsets = np.frombuffer(self.data, dtype="<u8", count=n_chunks, offset=index)
+
+        if offsets is None:
+            # Not closed: follow the chunk headers
+            offsets, offset = [], self._first_chunk
+            while offset + CHUNK_HEADER.size <= len(self.data) and \
+                    self.data[offset:offset + 4] == CHUNK:
+                _, _, n_frames, _, length = CHUNK_HEADER.unpack_from(self.data, offset)
+                end = offset + CHUNK_HEADER.size + 8 * n_frames + length
+                if end > len(self.data):
+                    break
+                offsets.append(offset)
+                offset = end
+
+        chunks = []
+        for offset in offsets:
+            _, first, n_frames, itemsize, length = CHUNK_HEADER.unpack_from(self.data, int(offset))
+            steps_at = int(offset) + CHUNK_HEADER.size
+            chunks.append({
+                "first": first,
+                "n_frames": n_frames,
+                "itemsize": itemsize,
+                "steps": np.frombuffer(self.data, dtype="<i8", count=n_frames, offset=steps_at),
+                "payload": (steps_at + 8 * n_frames, length),
+            })
+        return chunks
+
+    def _decode(self, k):
+        if self._cache[0] == k:
+            return self._cache[1]
+        chunk = self.chunks[k]
+        start, length = chunk["payload"]
+        q = decode_chunk(self.data[start:start + length], chunk["itemsize"],
+                         chunk["n_frames"], self.n_atoms, self.levels)
+        frames = q * self.spacing
+        self._cache = (k, frames)
+        return frames
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n_frames
+        if not 0 <= i < self.n_frames:
+            raise IndexError(i)
+        k = i // self.chunk_size
+        return self._decode(k)[i - self.chunks[k]["first"]]
+
+    def read(self, start=0, stop=None):
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        if start >= stop:
+            return np.zeros((0, self.n_atoms, 2))
+        first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+        frames = np.concatenate([self._decode(k) for k in range(first, last + 1)])
+        offset = self.chunks[first]["first"]
+        return frames[start - offset:stop - offset]
@@ -1,4 +1,4 @@
-from gui.graph_view import GraphView
+from gui.graph_view import GraphView, AnalysisView
 
 
 class GraphManager():
@@ -12,7 +12,7 @@ class GraphManager():
             Adds a new graph view to the manager.
     
         get_widgets():
-            Returns a list of plot widgets for all managed graph views.
+            Returns a list of plot widgets for all managed graph views, building those not built yet.
     
         update_all(engine):
             Updates all graph views with data from the provided engine.
@@ -37,11 +37,31 @@ class GraphManager():
                                                    "Total acceleration",
                                                    ))
 
+        self.add_graph("total_energy", GraphView("Total energy",
+                                                 "Step number",
+                                                 "Total Energy (kcal/mol)",
+                                                ))
+
+        self.add_graph("temperature", GraphView("Temperature",
+                                                "Step number",
+                                                "Temperature",
+                                               ))
+
+        self.add_graph("pressure", GraphView("Pressure",
+                                             "Step number",
+                                             "Virial pressure",
+                                            ))
+
+        self.add_graph("rdf", AnalysisView("Radial distribution g(r)",
+                                           "r",
+                                           "g(r)",
+                                          ))
+
     def add_graph(self, name, graph_view):
         self.graphs[name] = graph_view
 
     def get_widgets(self):
-        return [graph_view.plot for graph_view in self.graphs.values()]
+        return [graph_view.build() for graph_view in self.graphs.values()]
 
     def update_all(self, engine):
         for key, view in self.graphs.items():
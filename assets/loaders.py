@@ -0,0 +1,162 @@
+import io
+import os
+import re
+import numpy as np # type: ignore
+from engine import choices
+
+
+# First value of the Lattice="..." entry, and Properties=... of an extended XYZ comment line
+LATTICE = re.compile(rb'Lattice="\s*([-+0-9.eE]+)')
+PROPERTIES = re.compile(rb"Properties=(\S+)")
+
+
+# ----------------------
+#  XYZ
+# ----------------------
+
+# numpy type of the extended XYZ property types
+PROPERTY_TYPES = {"S": "U16", "R": "f8", "I": "i8", "L": "U1"}
+
+
+def _xyz_columns(comment, n_columns):
+    # numpy type of each column, and first column of each property
+    match = PROPERTIES.search(comment)
+    if not match:
+        # Plain XYZ: species then coordinates
+        return ["U16"] + ["f8"] * (n_columns - 1), {"species": 0, "pos": 1}
+
+    fields = match.group(1).decode().split(":")
+    types, starts = [], {}
+    for name, kind, count in zip(fields[::3], fields[1::3], fields[2::3]):
+        starts[name] = len(types)
+        types += [PROPERTY_TYPES.get(kind, "U16")] * int(count)
+    return types, starts
+
+
+def load_xyz(path):
+    """Reads the first frame of an XYZ or extended XYZ file.
+
+    The file is read in one block and the atom lines are parsed in bulk by a single call of numpy.loadtxt, without a Python loop over the atoms. Only the species, x and y (and vx, vy) columns are converted, the others are skipped. Extended XYZ files also give the box size (first Lattice value) and the velocities, if they have a vel property.
+
+    Returns:
+        dict: species, positions, velocities (or None) and boxsize (or None).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    header_end = data.find(b"\n", data.find(b"\n") + 1) + 1
+    n = int(data[:data.find(b"\n")])
+    comment = data[data.find(b"\n") + 1:header_end]
+    first_line = data[header_end:data.find(b"\n", header_end)]
+
+    n_columns = len(first_line.split())
+    types, starts = _xyz_columns(comment, n_columns)
+    if "species" not in starts or "pos" not in starts or len(types) != n_columns \
+            or n_columns < starts["pos"] + 2:
+        raise ValueError(f"{path}: species and positions are needed on each line")
+
+    # Species, x, y and the in-plane velocities: z and the other properties are not parsed
+    fields = [("species", starts["species"], "S2"),
+              ("x", starts["pos"], "f8"), ("y", starts["pos"] + 1, "f8")]
+    if "vel" in starts:
+        fields += [("vx", starts["vel"], "f8"), ("vy", starts["vel"] + 1, "f8")]
+    table = np.loadtxt(io.BytesIO(data[header_end:]), dtype=[(name, kind) for name, _, kind in fields],
+                       usecols=[column for _, column, _ in fields], max_rows=n, ndmin=1)
+    if len(table) != n:
+        raise ValueError(f"{path}: {n} atoms announced, {len(table)} lines found")
+
+    species = table["species"].astype("U2")
+    positions = np.stack([table["x"], table["y"]], axis=1)
+    velocities = np.stack([table["vx"], table["vy"]], axis=1) if "vel" in starts else None
+
+    match = LATTICE.search(comment)
+    boxsize = float(match.group(1)) if match else None
+
+    return {"species": species, "positions": positions,
+            "velocities": velocities, "boxsize": boxsize}
+
+
+# ----------------------
+#  NPZ
+# ----------------------
+
+def load_npz(path):
+    """Reads a configuration saved by save_npz: species and positions arrays, optional velocities, boxsize, bonds (atom index pairs, with their lengths or not) and frozen flags."""
+    with np.load(path) as data:
+        if "species" not in data or "positions" not in data:
+            raise ValueError(f"{path}: species and positions arrays are needed")
+        return {
+            "species": data["species"].astype("U2"),
+            "positions": data["positions"].astype(float),
+            "velocities": data["velocities"].astype(float) if "velocities" in data else None,
+            "boxsize": float(data["boxsize"]) if "boxsize" in data else None,
+            "bonds": data["bonds"].astype(np.int64).reshape(-1, 2) if "bonds" in data else None,
+            "bond_lengths": data["bond_lengths"].astype(float) if "bond_lengths" in data else None,
+            "frozen": data["frozen"].astype(bool) if "frozen" in data else None,
+        }
+
+
+def save_npz(path, system, boxsize):
+    """Saves the species, positions, velocities, bonds and frozen atoms of a System in atom ID order, to be loaded by load_npz."""
+    bonds = {"bonds": system.bonds, "bond_lengths": system.bond_lengths} if len(system.bonds) else {}
+    if not system.mobile.all():
+        bonds["frozen"] = ~system.by_id(system.mobile)
+    np.savez(path,
+             species=system.by_id(system.species),
+             positions=system.by_id(system.positions),
+             velocities=system.by_id(system.velocities),
+             boxsize=boxsize,
+             **bonds)
+
+
+# ----------------------
+#  Dispatch
+# ----------------------
+
+LOADERS = {
+    ".xyz": load_xyz,
+    ".extxyz": load_xyz,
+    ".npz": load_npz,
+}
+choices.check_table(choices.LOADERS, LOADERS, "LOADERS")
+
+
+def load_configuration(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in LOADERS:
+        raise ValueError(f"{extension} not in LOADERS")
+    return LOADERS[extension](path)
+
+
+def peek_configuration(path):
+    """Number of atoms and box size of a configuration file, without parsing the atoms.
+
+    Returns:
+        tuple: n_atoms and boxsize (None if the file does not give it).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npz":
+        with np.load(path) as data:
+            boxsize = float(data["boxsize"]) if "boxsize" in data else None
+            return len(data["species"]), boxsize
+
+    with open(path, "rb") as f:
+        n = int(f.readline())
+        match = LATTICE.search(f.readline())
+    return n, float(match.group(1)) if match else None
+
+
+def peek_bonds(path):
+    """Number of bonds of a configuration file, 0 for the XYZ files which have none."""
+    if os.path.splitext(path)[1].lower() != ".npz":
+        return 0
+    with np.load(path) as data:
+        return len(data["bonds"]) if "bonds" in data else 0
+
+
+def peek_frozen(path):
+    """Number of frozen atoms of a configuration file, 0 for the XYZ files which have none."""
+    if os.path.splitext(path)[1].lower() != ".npz":
+        return 0
+    with np.load(path) as data:
+        return int(np.count_nonzero(data["frozen"])) if "frozen" in data else 0
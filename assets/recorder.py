@@ -1,14 +1,33 @@
 import numpy as np # type: ignore
- 
+from engine.observables import compute_observables
+from analysis.running_stats import ObservableStats
+
+
+# Scalar series with streaming mean / error estimates
+STAT_KEYS = [
+    "LJ_potential_total", "kinetic_energy", "total_energy",
+    "force_norm_total", "acc_norm_total", "vel_norm_total",
+    "temperature", "pressure",
+]
+
 
 class MDRecorder():
     """MDRecorder is a class for recording molecular dynamics simulation data.
     
+    The engine records every stride steps (see wants()), and only computes its observables on those steps.
+    Per-atom frames (positions, velocities, accelerations, forces, per-atom potential) are kept every frame_stride records only, or never if frame_stride is 0; scalar quantities are recorded every call.
+    Frames are stored in atom ID order, whatever the order of the rows of the System (see System.reorder).
+
     Attributes:
+        stride (int): The engine records every stride steps.
+        frame_stride (int): Record per-atom frames every frame_stride calls of record(), 0 to disable them.
+        n_records (int): Number of calls of record().
+        steps (list): A list to store the engine step number of each record.
         positions (list): A list to store the positions of particles at each recorded step.
         forces (list): A list to store the forces acting on particles at each recorded step.
         accelerations (list): A list to store the accelerations of particles at each recorded step.
         velocities (list): A list to store the velocities of particles at each recorded step.
+        images (list): A list to store the periodic box crossings of particles at each recorded step, to unwrap the positions.
         LJ_potential_total (list): A list to store the total Lennard-Jones potential energy at each recorded step.
         LJ_potential_per_atom (list): A list to store the Lennard-Jones potential energy per atom at each recorded step.
         kinetic_energy (list): A list to store the kinetic energy of the system at each recorded step.
@@ -16,16 +35,31 @@ class MDRecorder():
         force_norm_total (list): A list to store the total norm of forces at each recorded step.
         acc_norm_total (list): A list to store the total norm of accelerations at each recorded step.
         vel_norm_total (list): A list to store the total norm of velocities at each recorded step.
-    
+        temperature (list): A list to store the temperature at each recorded step.
+        pressure (list): A list to store the virial pressure at each recorded step.
+        stats (dict): Streaming mean, min/max and block-averaged error of each scalar series in STAT_KEYS, in O(1) memory per observable.
+        writers (list): Trajectory exporters (see assets.trajectory) fed with the positions every writer.every records, written on their own thread.
+
     Methods:
+        wants(step): Returns True if the engine step must be recorded.
+        reset_stats(): Restarts the streaming statistics, e.g. at the start of a phase.
+        reset_frames(): Drops the per-atom frames, e.g. after a rescaling of the box, whose frames do not unwrap with the same box size.
         record(engine): Records the current state of the simulation, including positions, velocities, accelerations, forces, and energy metrics.
+        add_writer(writer): Exports the recorded positions with a TrajectoryWriter.
+        close_writers(): Flushes and closes the trajectory exporters.
     """
-    def __init__(self):
-        
+    def __init__(self, stride=1, frame_stride=1):
+
+        self.stride = max(stride, 1)
+        self.frame_stride = frame_stride
+        self.n_records = 0
+        self.steps = []
+
         self.positions = []
         self.forces = []
         self.accelerations = []
         self.velocities = []
+        self.images = []
 
         self.LJ_potential_total = []
         self.LJ_potential_per_atom = []
@@ -36,30 +70,77 @@ class MDRecorder():
         self.acc_norm_total = []
         self.vel_norm_total = []
 
+        self.temperature = []
+        self.pressure = []
+
+        self.writers = []
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {key: ObservableStats() for key in STAT_KEYS}
+
+    def reset_frames(self):
+        for frames in (self.positions, self.velocities, self.images, self.accelerations,
+                       self.forces, self.LJ_potential_per_atom):
+            frames.clear()
+
+    def add_writer(self, writer):
+        self.writers.append(writer)
+
+    def close_writers(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    def wants(self, step):
+        return step % self.stride == 0
+
+    def _frame(self, system, array):
+        # by_id() already returns a new array once the atoms were reordered
+        frame = system.by_id(array)
+        return frame.copy() if frame is array else frame
+
     def record(self, engine):
-        # Data per atoms        
-        self.positions.append(engine.system.positions.copy())
-        self.velocities.append(engine.system.velocities.copy())
-        self.accelerations.append(engine.system.accelerations.copy())
-        self.forces.append(engine.system.forces.copy())
+        system = engine.system
+
+        # Data per atoms, every frame_stride records
+        if self.frame_stride and self.n_records % self.frame_stride == 0:
+            self.positions.append(self._frame(system, system.positions))
+            self.velocities.append(self._frame(system, system.velocities))
+            self.images.append(system.by_id(system.images).astype(np.int32))
+            self.accelerations.append(self._frame(system, system.accelerations))
+            self.forces.append(self._frame(system, system.forces))
+            self.LJ_potential_per_atom.append(self._frame(system, np.asarray(system.ene_pot_LJ)))
+
+        # Only a copy into the writer queue, the formatting is done by its thread
+        for writer in self.writers:
+            if self.n_records % writer.every == 0:
+                writer.write(system.by_id(system.positions), engine.step_count,
+                             system.by_id(system.velocities))
+        self.n_records += 1
+        self.steps.append(engine.step_count)
+
+        # Fused observables computed by the engine for this step
+        obs = engine.observables
+        if obs is None:
+            obs = compute_observables(engine.system, engine.params["boxsize"])
 
         # Energies
-        self.LJ_potential_total.append(engine.system.ene_pot_LJ_total)
-        self.LJ_potential_per_atom.append(engine.system.ene_pot_LJ.copy())
-        self.kinetic_energy.append(engine.system.kinetic_ene)
-        self.total_energy.append(engine.system.total_ene)
-
-        # Total forces
-        f_norm = np.linalg.norm(engine.system.forces, axis=1).sum()
-        self.force_norm_total.append(f_norm)
-
-        # Total accelerations
-        a_norm = np.linalg.norm(engine.system.accelerations, axis=1).sum()
-        self.acc_norm_total.append(a_norm)
-
-        # Total velocities
-        v_norm = np.linalg.norm(engine.system.velocities, axis=1).sum()
-        self.vel_norm_total.append(v_norm)
+        self.LJ_potential_total.append(obs.potential_ene)
+        self.kinetic_energy.append(obs.kinetic_ene)
+        self.total_energy.append(obs.total_ene)
+
+        # Total forces, accelerations and velocities
+        self.force_norm_total.append(obs.force_norm_total)
+        self.acc_norm_total.append(obs.acc_norm_total)
+        self.vel_norm_total.append(obs.vel_norm_total)
+
+        self.temperature.append(obs.temperature)
+        self.pressure.append(obs.pressure)
+
+        # Streaming statistics, no need of the stored history
+        for key, stats in self.stats.items():
+            stats.push(getattr(self, key)[-1])
 
 
     
@@ -0,0 +1,257 @@
+import os
+import queue
+import struct
+import threading
+import numpy as np # type: ignore
+from assets import codec
+from engine import choices
+
+
+class TrajectoryWriter():
+    """Base class of the trajectory exporters, writing frames on a background thread.
+
+    write() only copies the frame into a bounded queue; a writer thread takes the frames out in batches of up to batch_size, formats them and writes each batch in one call. When the disk is slower than the simulation the queue fills up and write() blocks until there is room again (backpressure), so the memory stays bounded to queue_size frames.
+    An error of the writer thread is raised again by the next write() or by close().
+
+    Attributes:
+        path (str): Path of the trajectory file.
+        species (numpy.ndarray): Type of each atom, in atom ID order.
+        boxsize (float): Size of the periodic box.
+        every (int): Export every `every` records of the MDRecorder.
+        n_frames (int): Number of frames written to the file.
+        stalls (int): Number of write() calls that had to wait for the writer thread.
+
+    Methods:
+        write(positions, step, velocities): Queues a frame, blocks while the queue is full.
+        close(): Writes the queued frames, then closes the file.
+    """
+    mode = "w"
+
+    def __init__(self, path, species, boxsize, every=1, queue_size=64, batch_size=16):
+        self.path = path
+        self.species = np.asarray(species)
+        self.boxsize = boxsize
+        self.every = max(every, 1)
+        self.batch_size = batch_size
+        self.n_frames = 0
+        self.stalls = 0
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+
+        self.file = open(path, self.mode)
+        self.write_header()
+
+        self._thread = threading.Thread(target=self._run, name="TrajectoryWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, positions, step, velocities=None):
+        self._raise_error()
+        frame = (np.array(positions), step,
+                 None if velocities is None else np.array(velocities))
+
+        if self._queue.full():
+            self.stalls += 1
+        self._queue.put(frame)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        # None tells the thread to stop after the queued frames
+        self._queue.put(None)
+        self._thread.join()
+        self.write_footer()
+        self.file.close()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Trajectory writer of {self.path} failed") from error
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            # Everything already queued goes in the same write
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            if not batch or self._error is not None:
+                continue
+
+            try:
+                self.write_batch(batch)
+                self.n_frames += len(batch)
+            except Exception as error:
+                # Keep emptying the queue so that write() never blocks forever
+                self._error = error
+
+    # ----------------------
+    #  Format
+    # ----------------------
+
+    def write_header(self):
+        pass
+
+    def write_batch(self, frames):
+        raise NotImplementedError
+
+    def write_footer(self):
+        pass
+
+
+class XYZWriter(TrajectoryWriter):
+    """Plain XYZ trajectory: atom count, comment line with the step, then one "species x y z" line per atom (z = 0)."""
+    with_velocities = False
+
+    def comment(self, step, velocities):
+        return f"step={step}"
+
+    def lines(self, positions, velocities):
+        columns = [self.species, positions[:, 0], positions[:, 1]]
+        fmt = "%s %.6f %.6f 0.000000"
+        if velocities is not None and self.with_velocities:
+            columns += [velocities[:, 0], velocities[:, 1]]
+            fmt += " %.6f %.6f 0.000000"
+
+        # One % formatting of the whole frame instead of a loop over the atoms
+        values = np.empty((len(positions), len(columns)), dtype=object)
+        for k, column in enumerate(columns):
+            values[:, k] = column
+        return ((fmt + "\n") * len(positions)) % tuple(values.ravel())
+
+    def write_batch(self, frames):
+        chunks = []
+        for positions, step, velocities in frames:
+            chunks.append(f"{len(positions)}\n{self.comment(step, velocities)}\n")
+            chunks.append(self.lines(positions, velocities))
+        self.file.write("".join(chunks))
+        self.file.flush()
+
+
+class ExtXYZWriter(XYZWriter):
+    """Extended XYZ trajectory: the comment line also holds the periodic cell, the columns and the step, with the velocities when given."""
+    with_velocities = True
+
+    def comment(self, step, velocities):
+        L = self.boxsize
+        properties = "species:S:1:pos:R:3"
+        if velocities is not None:
+            properties += ":vel:R:3"
+        return (f'Lattice="{L} 0.0 0.0 0.0 {L} 0.0 0.0 0.0 1.0" '
+                f'Properties={properties} step={step} pbc="T T F"')
+
+
+class DCDWriter(TrajectoryWriter):
+    """Binary CHARMM/NAMD DCD trajectory, single precision, with the unit cell of each frame.
+
+    The frame count in the header is updated after each batch, so the file stays readable while it is written.
+    """
+    mode = "wb"
+
+    def write_header(self):
+        n = len(self.species)
+        icntrl = [0] * 20
+        icntrl[10] = 1  # unit cell in each frame
+        icntrl[19] = 24 # CHARMM version
+
+        header = b"CORD" + struct.pack("<20i", *icntrl)
+        title = b"Created by DynAtom".ljust(80)
+        self.file.write(self._record(header))
+        self.file.write(self._record(struct.pack("<i", 1) + title))
+        self.file.write(self._record(struct.pack("<i", n)))
+
+    def _record(self, payload):
+        # Fortran unformatted record: length, payload, length
+        size = struct.pack("<i", len(payload))
+        return size + payload + size
+
+    def write_batch(self, frames):
+        L = self.boxsize
+        n = len(self.species)
+        # A, gamma, B, beta, alpha, C
+        cell = self._record(struct.pack("<6d", L, 90.0, L, 90.0, 90.0, L))
+        zeros = self._record(np.zeros(n, dtype="<f4").tobytes())
+
+        chunks = []
+        for positions, step, _ in frames:
+            chunks.append(cell)
+            chunks.append(self._record(positions[:, 0].astype("<f4").tobytes()))
+            chunks.append(self._record(positions[:, 1].astype("<f4").tobytes()))
+            chunks.append(zeros)
+        self.file.write(b"".join(chunks))
+
+        # Frame count (NSET), just after the first record length and "CORD"
+        self.file.seek(8)
+        self.file.write(struct.pack("<i", self.n_frames + len(frames)))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+
+
+class CompressedWriter(TrajectoryWriter):
+    """Lossy compressed trajectory (XTC-like), read back by assets.codec.CompressedTrajectory.
+
+    Positions are quantised on a grid of spacing precision * boxsize, so every decoded coordinate is within precision * boxsize / 2 of the original one. Frames are then delta-encoded and entropy-coded by chunks of chunk_size frames (see assets.codec.encode_chunk); the chunks are independent, which allows seeking by frame.
+    With the default precision of 1e-4 the files are typically 5 to 15 times smaller than the float64 frames, depending on how far the atoms move between frames.
+    """
+    mode = "wb"
+
+    def __init__(self, path, species, boxsize, every=1, precision=1e-4, chunk_size=32, level=6, **kwargs):
+        self.precision = precision
+        self.levels = int(round(1 / precision))
+        self.chunk_size = chunk_size
+        self.level = level
+        self._pending = []
+        self._offsets = []
+        self._n_encoded = 0
+        super().__init__(path, species, boxsize, every, **kwargs)
+
+    def write_header(self):
+        codec.write_header(self.file, self.species, self.boxsize, self.precision, self.chunk_size)
+
+    def write_batch(self, frames):
+        for positions, step, _ in frames:
+            self._pending.append((codec.quantise(positions, self.boxsize, self.precision), step))
+            if len(self._pending) == self.chunk_size:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        q = np.stack([q for q, _ in self._pending])
+        steps = [step for _, step in self._pending]
+        self._offsets.append(codec.write_chunk(self.file, self._n_encoded, steps, q,
+                                               self.levels, self.level))
+        self.file.flush()
+        self._n_encoded += len(self._pending)
+        self._pending = []
+
+    def write_footer(self):
+        if self._pending:
+            self._write_chunk()
+        codec.write_index(self.file, self._offsets)
+
+
+TRAJECTORY_FORMATS = {
+    ".xyz": XYZWriter,
+    ".extxyz": ExtXYZWriter,
+    ".dcd": DCDWriter,
+    ".dtrj": CompressedWriter,
+}
+choices.check_table(choices.TRAJECTORY_FORMATS, TRAJECTORY_FORMATS, "TRAJECTORY_FORMATS")
+
+
+def open_trajectory(path, species, boxsize, every=1, precision=1e-4):
+    """Returns the TrajectoryWriter matching the extension of path, precision is only used by the compressed format."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TRAJECTORY_FORMATS:
+        raise ValueError(f"{extension} not in TRAJECTORY_FORMATS")
+    writer = TRAJECTORY_FORMATS[extension]
+    if writer is CompressedWriter:
+        return writer(path, species, boxsize, every, precision=precision)
+    return writer(path, species, boxsize, every)
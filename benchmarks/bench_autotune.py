@@ -0,0 +1,85 @@
+"""Benchmark of the force backend auto-tuner (force_backend = "auto").
+
+For each atom count of --sizes, a lattice at --density is tuned twice with a
+fresh cache file: the first tuning times every eligible backend and its block
+size or cell grid, the second one reads the decision back from the cache. It
+reports the cost of both tunings, the chosen configuration and the time per
+force evaluation of every candidate, so that the choice can be compared with
+the fixed backends.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_autotune --sizes 500 2000 8000 32000 --cutoff 2.5 --out autotune.json
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.bench_engine import make_engine, git_commit
+
+
+def run(n, args, cache_path):
+    engine = make_engine(n, args.density, 0.005, args.seed, "auto", args.cutoff)
+    engine.autotuner.cache_path = cache_path
+
+    t0 = time.perf_counter()
+    choice = engine.autotuner.tune()
+    cold = time.perf_counter() - t0
+    timings = engine.autotuner.timings
+
+    t0 = time.perf_counter()
+    engine.autotuner.tune()
+    warm = time.perf_counter() - t0
+
+    best = min(timing["seconds"] for timing in timings)
+    return {
+        "n": n,
+        "choice": choice,
+        "tuning_s": cold,
+        "cached_tuning_s": warm,
+        "force_s": best,
+        "candidates": timings,
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000, 32000])
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--cutoff", type=float, default=2.5,
+                        help="Explicit cutoff, 0 keeps the dense backend out")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, "autotune.json")
+        for n in args.sizes:
+            result = run(n, args, cache_path)
+            results.append(result)
+            logging.info(f"N = {n:<7} {result['choice']}  {result['force_s'] * 1e3:8.2f} ms/force  "
+                         f"tuning {result['tuning_s']:.2f} s, cached {result['cached_tuning_s'] * 1e3:.1f} ms")
+            for timing in result["candidates"]:
+                config = {key: value for key, value in timing.items() if key != "seconds"}
+                logging.info(f"    {str(config):<45} {timing['seconds'] * 1e3:8.2f} ms")
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           **{key: value for key, value in vars(args).items() if key != "out"}},
+                  "results": results}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Benchmark of rigid bonds (SHAKE/RATTLE) against flexible harmonic bonds.
+
+The system is a lattice of 2D triatomic molecules O-H-H with light hydrogens,
+bonded O-H, O-H and H-H. The same configuration is run in constant energy with
+velocity Verlet for --time time units, with flexible bonds of --stiffness and
+with rigid bonds, at each time step of --dt. For each run it reports the
+fluctuation and the drift of the total energy per atom and the wall-clock cost
+per time unit. The largest dt whose fluctuation stays under --max-fluctuation
+is kept for each model, and the speedup compares their costs at these dt.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_constraints --molecules 400 --dt 0.002 0.005 0.01 0.02 --out bonds.json
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import git_commit
+from engine.md_engine import Engine
+from assets.recorder import MDRecorder
+
+
+def molecular_lattice(n_molecules, spacing, angle, seed):
+    """Triatomics O-H-H with O-H bonds of length 1 and the given H-O-H angle, randomly oriented on a square lattice.
+
+    Returns:
+        dict: A configuration for Engine.load_atoms, with its bonds, and the box size.
+    """
+    rng = np.random.default_rng(seed)
+    n_side = int(np.ceil(np.sqrt(n_molecules)))
+    boxsize = n_side * spacing
+    grid = (np.arange(n_side) + 0.5) * spacing
+    oxygens = np.stack(np.meshgrid(grid, grid), -1).reshape(-1, 2)[:n_molecules]
+
+    phi = rng.uniform(0, 2 * np.pi, n_molecules)
+    half = np.radians(angle) / 2
+    positions = np.empty((3 * n_molecules, 2))
+    positions[0::3] = oxygens
+    positions[1::3] = oxygens + np.stack([np.cos(phi - half), np.sin(phi - half)], axis=1)
+    positions[2::3] = oxygens + np.stack([np.cos(phi + half), np.sin(phi + half)], axis=1)
+
+    first = 3 * np.arange(n_molecules)
+    bonds = np.concatenate([np.stack([first, first + 1], axis=1),
+                            np.stack([first, first + 2], axis=1),
+                            np.stack([first + 1, first + 2], axis=1)])
+    return {"species": np.tile(["O", "H", "H"], n_molecules),
+            "positions": positions % boxsize,
+            "velocities": None,
+            "boxsize": boxsize,
+            "bonds": bonds}, boxsize
+
+
+def run(rigid, dt, configuration, boxsize, velocities, args):
+    params = {"n_atoms": 0, "boxsize": boxsize, "force_backend": args.backend,
+              "cutoff": args.cutoff, "constrain_bonds": rigid, "bond_stiffness": args.stiffness}
+    engine = Engine(params, MDRecorder(stride=10**9, frame_stride=0))
+    engine.load_atoms(dict(configuration, velocities=velocities))
+
+    n_steps = int(round(args.time / dt))
+    energies = np.zeros(n_steps)
+    elapsed = 0.0
+    for step in range(n_steps):
+        t0 = time.perf_counter()
+        engine.run_once(dt)
+        elapsed += time.perf_counter() - t0
+        energies[step] = engine.update_observables().total_ene
+
+    n_atoms = len(engine.system.masses)
+    return {
+        "model": "rigid" if rigid else "flexible",
+        "dt": dt,
+        "steps": n_steps,
+        "wall_s_per_time": elapsed / args.time,
+        "fluctuation_per_atom": float(np.std(energies) / n_atoms),
+        "drift_per_atom": float((energies[-1] - energies[0]) / n_atoms),
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--molecules", type=int, default=400)
+    parser.add_argument("--spacing", type=float, default=3.5)
+    parser.add_argument("--angle", type=float, default=104.0, help="H-O-H angle in degrees")
+    parser.add_argument("--stiffness", type=float, default=2000.0)
+    parser.add_argument("--dt", type=float, nargs="+", default=[0.002, 0.005, 0.01, 0.02])
+    parser.add_argument("--time", type=float, default=2.0, help="Simulated time of every run")
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--max-fluctuation", type=float, default=5e-3,
+                        help="Largest energy fluctuation per atom of a usable dt")
+    parser.add_argument("--backend", default="cells")
+    parser.add_argument("--cutoff", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    configuration, boxsize = molecular_lattice(args.molecules, args.spacing, args.angle, args.seed)
+    rng = np.random.default_rng(args.seed)
+    masses = np.tile([18.0, 1.0, 1.0], args.molecules)
+    velocities = rng.normal(size=(len(masses), 2)) * np.sqrt(args.temperature / masses)[:, None]
+
+    results, best = [], {}
+    for rigid in (False, True):
+        for dt in sorted(args.dt):
+            try:
+                result = run(rigid, dt, configuration, boxsize, velocities, args)
+            except RuntimeError as error:
+                logging.info(f"{'rigid' if rigid else 'flexible'} dt = {dt}: {error}")
+                continue
+            results.append(result)
+            usable = result["fluctuation_per_atom"] < args.max_fluctuation
+            if usable:
+                best[result["model"]] = result
+            logging.info(f"{result['model']:<9} dt = {dt:<6} "
+                         f"{result['wall_s_per_time']:8.3f} s per time unit  "
+                         f"fluctuation {result['fluctuation_per_atom']:.2e}  "
+                         f"drift {result['drift_per_atom']:+.2e} per atom"
+                         f"{'' if usable else '  (unusable)'}")
+
+    summary = {}
+    if len(best) == 2:
+        flexible, rigid = best["flexible"], best["rigid"]
+        summary = {"flexible_dt": flexible["dt"], "rigid_dt": rigid["dt"],
+                   "speedup": flexible["wall_s_per_time"] / rigid["wall_s_per_time"]}
+        logging.info(f"Largest usable dt: flexible {flexible['dt']}, rigid {rigid['dt']}, "
+                     f"rigid bonds {summary['speedup']:.2f}x faster per time unit")
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           **{key: value for key, value in vars(args).items() if key != "out"}},
+                  "results": results, "summary": summary}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
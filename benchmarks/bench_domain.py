@@ -0,0 +1,99 @@
+"""Scaling benchmark of the domain-decomposed engine.
+
+Times velocity-Verlet steps of the same lattice liquid with the single-process
+cell-list Engine and with DomainEngine for each worker count of --workers, and
+checks that the forces of the decomposed engine match the single-process ones.
+Speedups are only meaningful up to the number of physical cores.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_domain --n 100000 --workers 1 2 4 8 --out domain.json
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import make_engine, git_commit
+from engine.domain import DomainEngine
+from assets.loaders import save_npz
+from assets.recorder import MDRecorder
+
+
+def time_steps(engine, args):
+    engine.run_once(args.dt)
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        engine.run_once(args.dt)
+    return (time.perf_counter() - start) / args.steps
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--dt", type=float, default=0.005)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--cutoff", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--configuration", default="bench_domain.npz",
+                        help="Temporary file of the shared initial configuration")
+    parser.add_argument("--out", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    # Same initial configuration for every engine
+    reference = make_engine(args.n, args.density, args.dt, args.seed, "cells", args.cutoff)
+    reference.recorder = MDRecorder(frame_stride=0)
+    save_npz(args.configuration, reference.system, reference.params["boxsize"])
+    params = dict(reference.params, init_file=args.configuration)
+
+    reference.calc_forces()
+    reference.update_acc()
+    forces = reference.system.forces.copy()
+    single = time_steps(reference, args)
+    logging.info(f"single process  {single * 1e3:9.2f} ms/step")
+
+    results = {"single_s": single, "workers": {}}
+    try:
+        for n_workers in args.workers:
+            engine = DomainEngine(dict(params), MDRecorder(frame_stride=0), n_workers)
+            try:
+                error = float(np.abs(engine.system.forces - forces).max())
+                elapsed = time_steps(engine, args)
+                loads = engine.loads.tolist()
+            finally:
+                engine.stop()
+
+            results["workers"][n_workers] = {
+                "step_s": elapsed,
+                "speedup": single / elapsed,
+                "efficiency": single / elapsed / n_workers,
+                "max_force_err": error,
+                "loads": loads,
+            }
+            logging.info(f"{n_workers:>3} workers     {elapsed * 1e3:9.2f} ms/step  "
+                         f"speedup {single / elapsed:5.2f}x  force err {error:.1e}")
+    finally:
+        os.remove(args.configuration)
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "cpu_count": os.cpu_count(), "n": args.n, "density": args.density,
+                           "cutoff": args.cutoff},
+                  "results": results}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""Headless benchmarks for the DynAtom engine.
+
+Times the force kernels, the stepping functions, the recorder and the System
+construction over a range of atom counts, and checks every alternative force
+backend against the dense reference. No Qt import is needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_engine --sizes 100 1000 10000 100000 --out bench.json
+    python -m benchmarks.bench_engine --compare old.json new.json
+
+ns/day assumes the timestep is expressed in ps.
+"""
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np # type: ignore
+
+from engine.md_engine import Engine
+from engine.system import System
+from engine.atom import Atom
+from assets.recorder import MDRecorder
+
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+# Benchmarks whose cost grows with the number of pairs
+PAIR_BENCHES = {"calc_LJ", "calc_forces", "run_once",
+                "equilibrate_step", "minimize_step"}
+
+# Backends whose cost grows with the number of atoms only
+LINEAR_BACKENDS = {"cells"}
+
+# Benchmarks that advance the simulation by one step
+STEP_BENCHES = {"run_once", "equilibrate_step", "minimize_step"}
+
+
+# ----------------------
+#  Setup
+# ----------------------
+
+def make_params(n, density, dt):
+    boxsize = float(np.sqrt(n / density))
+    return {
+        "n_atoms": n,
+        "boxsize": boxsize,
+        "temperature": 300,
+        "mini_dt": 1e-3,
+        "mini_conv_crit": 1e-3,
+        "eq_dt": dt,
+        "eq_tau": 1e-3,
+        "prod_dt": dt,
+    }
+
+
+def lattice_positions(n, boxsize, rng):
+    """Square lattice with a small jitter, avoids the overlaps of random placement."""
+    side = int(np.ceil(np.sqrt(n)))
+    spacing = boxsize / side
+    grid = np.stack(np.meshgrid(np.arange(side), np.arange(side)), axis=-1)
+    positions = (grid.reshape(-1, 2)[:n] + 0.5) * spacing
+    positions += rng.uniform(-0.05, 0.05, size=positions.shape) * spacing
+    return positions % boxsize
+
+
+def make_engine(n, density, dt, seed, backend="dense", cutoff=None, reorder_every=0,
+                shuffle=False):
+    rng = np.random.default_rng(seed)
+    params = make_params(n, density, dt)
+    params["n_atoms"] = 0
+    params["force_backend"] = backend
+    params["cutoff"] = cutoff
+    params["reorder_every"] = reorder_every
+
+    engine = Engine(params, MDRecorder())
+    engine.params["n_atoms"] = n
+
+    # Bulk construction instead of add_atoms(), whose cost is timed separately
+    system = System.from_arrays(np.full(n, "C"), lattice_positions(n, params["boxsize"], rng))
+    engine.system = system
+    if shuffle:
+        # Rows in random order, like atoms that diffused for a long time
+        system.reorder(rng.permutation(n))
+    return engine
+
+
+def build_system_bulk(n, boxsize):
+    positions = np.random.uniform(0, boxsize, size=(n, 2))
+    return System.from_arrays(np.full(n, "C"), positions)
+
+
+def build_system(n, boxsize):
+    system = System()
+    positions = np.random.uniform(0, boxsize, size=(n, 2))
+    for i in range(n):
+        system.add_atom(Atom("C", positions[i]))
+    return system
+
+
+# ----------------------
+#  Measurements
+# ----------------------
+
+def time_call(fn, min_repeat, budget):
+    """Call fn at least min_repeat times, and until budget seconds are spent."""
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_repeat or time.perf_counter() - start < budget:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if len(times) >= 10 * min_repeat:
+            break
+    return times
+
+
+def peak_memory(fn):
+    """Peak bytes allocated during one call of fn (numpy arrays included)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def summarise(times, peak, dt, is_step):
+    mean = float(np.mean(times))
+    result = {
+        "calls": len(times),
+        "mean_s": mean,
+        "best_s": float(np.min(times)),
+        "std_s": float(np.std(times)),
+        "peak_mem_mb": peak / 2**20,
+    }
+    if is_step:
+        steps_per_s = 1.0 / mean
+        result["steps_per_s"] = steps_per_s
+        # dt in ps -> simulated ns per wall-clock day
+        result["ns_per_day"] = steps_per_s * dt * 86400 * 1e-3
+    return result
+
+
+def bench_size(n, args):
+    """Run every benchmark at one system size."""
+    results = {}
+    n_pairs = n * n
+
+    engine = make_engine(n, args.density, args.dt, args.seed,
+                         args.backend, args.bench_cutoff, args.reorder_every,
+                         args.shuffle)
+    if args.reorder_every:
+        engine.reorder_atoms()
+    engine.calc_forces()
+    engine.update_acc()
+
+    equilibrate_state = {"step": 0}
+
+    def equilibrate():
+        equilibrate_state["step"] += 1
+        engine.equilibrate_step(equilibrate_state["step"], args.dt,
+                                engine.params["temperature"],
+                                engine.params["eq_tau"])
+
+    benches = {
+        "calc_LJ": engine.calc_LJ,
+        "calc_forces": engine.calc_forces,
+        "reorder_atoms": engine.reorder_atoms,
+        "run_once": lambda: engine.run_once(args.dt),
+        "equilibrate_step": equilibrate,
+        "minimize_step": lambda: engine.minimize_step(
+            engine.params["mini_dt"], engine.params["mini_conv_crit"]),
+        "recorder_record": lambda: engine.recorder.record(engine),
+        "system_build": lambda: build_system(n, engine.params["boxsize"]),
+        "system_from_arrays": lambda: build_system_bulk(n, engine.params["boxsize"]),
+    }
+
+    for name, fn in benches.items():
+        if args.only and name not in args.only:
+            continue
+
+        # Dense or blocked kernels and add_atom() scale as N^2
+        quadratic = name == "system_build" or name == "calc_LJ" or \
+            (name in PAIR_BENCHES and args.backend not in LINEAR_BACKENDS)
+        if quadratic and n_pairs > args.max_pairs:
+            results[name] = {"skipped": f"N^2 = {n_pairs:.2e} > --max-pairs"}
+            logging.info(f"N={n:>7} {name:<18} skipped")
+            continue
+
+        peak = peak_memory(fn)
+        times = time_call(fn, args.repeat, args.budget)
+        results[name] = summarise(times, peak, args.dt, name in STEP_BENCHES)
+
+        # The recorder grows at every call, start from a fresh one
+        engine.recorder = MDRecorder()
+
+        logging.info(f"N={n:>7} {name:<18} "
+                     f"{results[name]['mean_s'] * 1e3:10.3f} ms  "
+                     f"{results[name]['peak_mem_mb']:9.2f} MB")
+
+    return results
+
+
+# ----------------------
+#  Accuracy
+# ----------------------
+
+def check_backends(n, args):
+    """Compare forces and energy of every backend with the dense reference.
+
+    All the engines use the same cutoff (--cutoff), the dense kernel truncates
+    its pairs the same way as the tabulated potentials.
+    """
+    reference = make_engine(n, args.density, args.dt, args.seed,
+                            cutoff=args.cutoff)
+    reference.calc_forces()
+    f_ref = reference.system.forces.copy()
+    e_ref = reference.system.ene_pot_LJ_total
+    f_scale = max(np.max(np.abs(f_ref)), 1e-12)
+
+    report = {}
+    for backend in Engine.FORCE_BACKENDS:
+        if backend == "dense":
+            continue
+        engine = make_engine(n, args.density, args.dt, args.seed, backend,
+                             cutoff=args.cutoff)
+        engine.calc_forces()
+
+        f_err = float(np.max(np.abs(engine.system.forces - f_ref)) / f_scale)
+        e_err = float(abs(engine.system.ene_pot_LJ_total - e_ref)
+                      / max(abs(e_ref), 1e-12))
+        report[backend] = {
+            "max_rel_force_err": f_err,
+            "rel_energy_err": e_err,
+            "passed": f_err < args.tol and e_err < args.tol,
+        }
+        logging.info(f"N={n:>7} backend {backend:<12} force err {f_err:.2e} "
+                     f"energy err {e_err:.2e} "
+                     f"{'ok' if report[backend]['passed'] else 'FAILED'}")
+
+    return report
+
+
+# ----------------------
+#  Output
+# ----------------------
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args):
+    return {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "node": platform.node(),
+        "density": args.density,
+        "dt": args.dt,
+        "backend": args.backend,
+        "reorder_every": args.reorder_every,
+        "shuffle": args.shuffle,
+    }
+
+
+def compare(old_path, new_path):
+    """Print the speedup of every benchmark between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'N':>8} {'benchmark':<18} {'old ms':>10} {'new ms':>10} {'speedup':>8}")
+    for n, benches in new["results"].items():
+        for name, res in benches.items():
+            old_res = old["results"].get(n, {}).get(name)
+            if not old_res or "mean_s" not in old_res or "mean_s" not in res:
+                continue
+            speedup = old_res["mean_s"] / res["mean_s"]
+            print(f"{n:>8} {name:<18} {old_res['mean_s'] * 1e3:10.3f} "
+                  f"{res['mean_s'] * 1e3:10.3f} {speedup:7.2f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="Run only these benchmarks")
+    parser.add_argument("--density", type=float, default=0.5,
+                        help="Atoms per unit area (GUI default: 50 atoms in a 10x10 box)")
+    parser.add_argument("--dt", type=float, default=1e-4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="Seconds spent per benchmark after --repeat calls")
+    parser.add_argument("--max-pairs", type=float, default=1e7,
+                        help="Skip O(N^2) benchmarks above this number of pairs")
+    parser.add_argument("--backend", default="dense", choices=list(Engine.FORCE_BACKENDS),
+                        help="Force backend of the timed engine")
+    parser.add_argument("--bench-cutoff", type=float, default=None,
+                        help="Cutoff of the timed engine (default: potential default)")
+    parser.add_argument("--reorder-every", type=int, default=0,
+                        help="Morton reordering period of the timed engine, 0 to disable")
+    parser.add_argument("--shuffle", action="store_true",
+                        help="Start the timed engine from atoms stored in random order")
+    parser.add_argument("--accuracy-size", type=int, default=500)
+    parser.add_argument("--cutoff", type=float, default=2.5,
+                        help="Cutoff shared by all the engines of the accuracy checks")
+    parser.add_argument("--tol", type=float, default=1e-6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    args = parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    np.random.seed(args.seed)
+
+    output = {
+        "meta": metadata(args),
+        "results": {str(n): bench_size(n, args) for n in args.sizes},
+        "accuracy": check_backends(args.accuracy_size, args),
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark of frozen atoms: cost of the force evaluation and of a step against the mobile fraction.
+
+The lattice of --n atoms at --density has its lowest rows frozen, a substrate
+of --fractions of the atoms. For each backend of --backends and each fraction
+it times calc_forces and run_once, and checks the forces on the mobile atoms
+against an evaluation without frozen atoms: the pairs of two frozen atoms are
+skipped, those with a mobile atom are not. The cost is expected to follow the
+number of mobile atoms.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_frozen --n 20000 --fractions 0 0.5 0.9 --out frozen.json
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import make_engine, git_commit
+
+
+def timed(function, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(backend, fraction, args):
+    engine = make_engine(args.n, args.density, args.dt, args.seed, backend, args.cutoff)
+    positions = engine.system.positions.copy()
+
+    # Reference forces of all the pairs
+    engine.calc_forces()
+    reference = engine.system.forces.copy()
+
+    # The lowest atoms are the substrate
+    frozen = np.zeros(args.n, dtype=bool)
+    frozen[np.argsort(positions[:, 1], kind="stable")[:int(fraction * args.n)]] = True
+    engine.set_frozen(frozen)
+    engine.calc_forces()
+    forces = engine.system.by_id(engine.system.forces)
+    error = float(np.abs(forces[~frozen] - reference[~frozen]).max(initial=0.0))
+
+    force_s = timed(engine.calc_forces, args.repeats)
+    step_s = timed(lambda: engine.run_once(args.dt), args.repeats)
+    return {
+        "backend": backend,
+        "frozen_fraction": fraction,
+        "mobile": int(engine.system.n_mobile()),
+        "force_s": force_s,
+        "step_s": step_s,
+        "max_force_error": error,
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.0, 0.5, 0.9])
+    parser.add_argument("--backends", nargs="+", default=["cells"])
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--cutoff", type=float, default=2.5)
+    parser.add_argument("--dt", type=float, default=0.005)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends:
+        baseline = None
+        for fraction in sorted(args.fractions):
+            result = run(backend, fraction, args)
+            results.append(result)
+            baseline = baseline or result["force_s"]
+            logging.info(f"{backend:<6} {fraction:4.0%} frozen  {result['force_s'] * 1e3:8.2f} ms/force "
+                         f"({result['force_s'] / baseline:.2f}x)  {result['step_s'] * 1e3:8.2f} ms/step  "
+                         f"max force error {result['max_force_error']:.1e}")
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           **{key: value for key, value in vars(args).items() if key != "out"}},
+                  "results": results}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark of the RESPA multiple time step integrator against velocity Verlet.
+
+Every run starts from the same equilibrated liquid and covers the same
+simulated time with the same inner step dt: velocity Verlet (run_once, with
+the force backend of --backend) and RESPA (run_respa) with each k of --k, the
+long-range forces being evaluated every k steps. For each run it reports the
+wall-clock cost per unit of simulated time and the energy conservation: drift
+(slope of a linear fit of the total energy) and fluctuation, per atom.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_respa --n 4000 --k 2 4 8 --out respa.json
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import make_engine, git_commit
+from assets.recorder import MDRecorder
+
+
+def equilibrated_state(args):
+    """Positions and velocities after --warmup thermostatted steps, in atom ID order."""
+    engine = make_engine(args.n, args.density, args.dt, args.seed, args.backend,
+                         args.cutoff)
+    rng = np.random.default_rng(args.seed)
+    engine.system.velocities = rng.normal(size=(args.n, 2)) * \
+                               np.sqrt(args.temperature / engine.system.masses)[:, None]
+
+    for step in range(1, args.warmup + 1):
+        engine.equilibrate_step(step, args.dt, args.temperature, args.tau)
+    return engine.system.by_id(engine.system.positions), \
+           engine.system.by_id(engine.system.velocities)
+
+
+def run(k, state, args):
+    """Runs --steps inner steps with velocity Verlet (k = 1) or RESPA, returns the timing and energies."""
+    engine = make_engine(args.n, args.density, args.dt, args.seed, args.backend,
+                         args.cutoff)
+    engine.params["respa_split"] = args.split
+    engine.params["respa_width"] = args.width
+    engine.system.positions = state[0].copy()
+    engine.system.velocities = state[1].copy()
+    # Only step 0 is recorded, the observables are computed outside the timed calls
+    engine.recorder = MDRecorder(stride=10**9, frame_stride=0)
+
+    if k == 1:
+        step = lambda: engine.run_once(args.dt)
+    else:
+        step = lambda: engine.run_respa(args.dt, k)
+
+    n_outer = args.steps // k
+    energies = np.zeros(n_outer)
+    elapsed = 0.0
+    for i in range(n_outer):
+        t0 = time.perf_counter()
+        step()
+        elapsed += time.perf_counter() - t0
+        energies[i] = engine.update_observables().total_ene
+
+    simulated = n_outer * k * args.dt
+    t = np.arange(1, n_outer + 1) * k * args.dt
+    slope = np.polyfit(t, energies, 1)[0]
+    result = {
+        "k": k,
+        "outer_steps": n_outer,
+        "wall_s": elapsed,
+        "wall_s_per_time": elapsed / simulated,
+        "drift_per_atom": float(slope / args.n),
+        "fluctuation_per_atom": float(np.std(energies) / args.n),
+    }
+    if k > 1:
+        result["slow_evaluations"] = engine.respa.slow_evaluations
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=4000)
+    parser.add_argument("--k", type=int, nargs="+", default=[2, 4, 8],
+                        help="Inner steps per slow force evaluation")
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--tau", type=float, default=0.1)
+    parser.add_argument("--dt", type=float, default=0.01)
+    parser.add_argument("--steps", type=int, default=800,
+                        help="Inner steps of every run, the same simulated time for all")
+    parser.add_argument("--warmup", type=int, default=400)
+    parser.add_argument("--backend", default="cells",
+                        help="Force backend of the velocity Verlet reference")
+    parser.add_argument("--cutoff", type=float, default=2.5)
+    parser.add_argument("--split", type=float, default=2.0,
+                        help="Cutoff of the short-range forces")
+    parser.add_argument("--width", type=float, default=0.5,
+                        help="Width of the switching region")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    args = parse_args()
+
+    state = equilibrated_state(args)
+    results = []
+    for k in [1] + [k for k in args.k if k > 1]:
+        result = run(k, state, args)
+        results.append(result)
+        name = "verlet" if k == 1 else f"respa k={k}"
+        logging.info(f"{name:<12} {result['wall_s_per_time']:8.3f} s per time unit  "
+                     f"drift {result['drift_per_atom']:+.2e}  "
+                     f"fluctuation {result['fluctuation_per_atom']:.2e} per atom")
+
+    reference = results[0]["wall_s_per_time"]
+    for result in results:
+        result["speedup"] = reference / result["wall_s_per_time"]
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           **{key: value for key, value in vars(args).items() if key != "out"}},
+                  "results": results}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
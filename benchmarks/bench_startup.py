@@ -0,0 +1,114 @@
+"""Startup-time benchmark of the DynAtom GUI.
+
+Each run starts a fresh Python process with the offscreen Qt platform, and
+times the stages up to the first window: imports (PyQt5 and gui.main_window),
+the QApplication, the MainWindow construction and its first show. It also
+times the first selection of a graph, which builds its plot widget, and counts
+the plot widgets built before any selection (none are expected).
+The median over --repeats runs is reported; with --budget the benchmark exits
+with status 1 when the median time to first window is over budget.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --repeats 5 --budget 1.0 --out startup.json
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import git_commit
+
+
+STAGES = ["import_s", "app_s", "window_s", "show_s", "first_window_s", "first_graph_s"]
+
+
+def child():
+    """Runs in the measured process, prints the timings as JSON."""
+    t0 = time.perf_counter()
+    from PyQt5.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+    t1 = time.perf_counter()
+    app = QApplication([])
+    t2 = time.perf_counter()
+    window = MainWindow()
+    t3 = time.perf_counter()
+    window.show()
+    app.processEvents()
+    t4 = time.perf_counter()
+
+    graphs = window.graphs_panel.graph_manager.graphs
+    built = sum(view.plot is not None for view in graphs.values())
+    name = next(iter(graphs))
+    getattr(window.graphs_panel, name).setChecked(True)
+    app.processEvents()
+    t5 = time.perf_counter()
+
+    print(json.dumps({
+        "import_s": t1 - t0,
+        "app_s": t2 - t1,
+        "window_s": t3 - t2,
+        "show_s": t4 - t3,
+        "first_window_s": t4 - t0,
+        "first_graph_s": t5 - t4,
+        "graphs": len(graphs),
+        "built_at_startup": built,
+    }))
+
+
+def run_once():
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+                         capture_output=True, text=True, check=True, env=env)
+    # The last line is the JSON, Qt may print warnings before
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Maximum median time to first window, in seconds")
+    parser.add_argument("--out", default=None, help="JSON results file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    runs = [run_once() for _ in range(args.repeats)]
+    results = {stage: float(np.median([run[stage] for run in runs])) for stage in STAGES}
+    results["graphs"] = runs[0]["graphs"]
+    results["built_at_startup"] = runs[0]["built_at_startup"]
+
+    for stage in STAGES:
+        logging.info(f"{stage[:-2]:<15} {results[stage] * 1e3:8.1f} ms")
+    logging.info(f"{results['built_at_startup']} of {results['graphs']} plot widgets built at startup")
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "repeats": args.repeats},
+                  "results": results, "runs": runs}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+    if args.budget is not None and results["first_window_s"] > args.budget:
+        logging.error(f"Time to first window {results['first_window_s']:.3f} s "
+                      f"over the budget of {args.budget:.3f} s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark of the thermostats of the equilibration.
+
+Every run starts from the same lattice at rest and equilibrates it at
+--temperature with Engine.equilibrate_step and one thermostat of --thermostats.
+For each thermostat it reports the number of steps until the instantaneous
+temperature first comes within --tolerance of the target, the mean and the
+standard deviation of the temperature over the second half of the run, and the
+cost per step. In the canonical ensemble the relative fluctuation of the
+temperature is sqrt(2 / n_dof): Berendsen gives much smaller fluctuations.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_thermostats --n 2000 --steps 4000 --out thermostats.json
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np # type: ignore
+
+from benchmarks.bench_engine import make_engine, git_commit
+from engine.thermostats import THERMOSTATS
+from assets.recorder import MDRecorder
+
+
+def run(thermostat, args):
+    engine = make_engine(args.n, args.density, args.dt, args.seed, args.backend, args.cutoff)
+    engine.recorder = MDRecorder(stride=10**9, frame_stride=0)
+    # A tiny initial temperature, the Berendsen scaling is undefined at T = 0
+    rng = np.random.default_rng(args.seed)
+    engine.system.velocities = 1e-3 * rng.normal(size=(args.n, 2))
+
+    temperatures = np.zeros(args.steps)
+    elapsed = 0.0
+    for step in range(1, args.steps + 1):
+        t0 = time.perf_counter()
+        engine.equilibrate_step(step, args.dt, args.temperature, args.tau, 1, thermostat)
+        elapsed += time.perf_counter() - t0
+        temperatures[step - 1] = engine.compute_temperature()
+
+    close = np.abs(temperatures - args.temperature) < args.tolerance * args.temperature
+    second_half = temperatures[args.steps // 2:]
+    return {
+        "thermostat": thermostat,
+        "steps_to_target": int(np.argmax(close)) + 1 if close.any() else None,
+        "mean_T": float(second_half.mean()),
+        "std_T": float(second_half.std()),
+        "canonical_std_T": float(args.temperature * np.sqrt(2 / (2 * args.n))),
+        "step_s": elapsed / args.steps,
+    }
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--thermostats", nargs="+", default=THERMOSTATS)
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--tau", type=float, default=0.1)
+    parser.add_argument("--dt", type=float, default=0.005)
+    parser.add_argument("--steps", type=int, default=4000)
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative distance to the target temperature")
+    parser.add_argument("--backend", default="cells")
+    parser.add_argument("--cutoff", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results file")
+    args = parser.parse_args()
+
+    results = []
+    for thermostat in args.thermostats:
+        result = run(thermostat, args)
+        results.append(result)
+        logging.info(f"{thermostat:<12} target reached at step {result['steps_to_target']}  "
+                     f"T = {result['mean_T']:.4f} +/- {result['std_T']:.4f} "
+                     f"(canonical {result['canonical_std_T']:.4f})  "
+                     f"{result['step_s'] * 1e3:.2f} ms/step")
+
+    if args.out:
+        output = {"meta": {"commit": git_commit(), "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           **{key: value for key, value in vars(args).items() if key != "out"}},
+                  "results": results}
+        with open(args.out, "w") as f:
+            json.dump(output, f, indent=2)
+        logging.info(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
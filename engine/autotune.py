@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import platform
+import time
+
+import numpy as np # type: ignore
+from engine.cell_list import CellList
+
+
+# Above these atom counts the O(N^2) kernels are not even timed
+DENSE_MAX_ATOMS = 2048
+TABLE_MAX_ATOMS = 4096
+
+# Candidate row blocks of the "table" backend
+BLOCK_SIZES = [256, 1024, 4096]
+
+
+def default_cache_path():
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "dynatom", "autotune.json")
+
+
+def machine_signature():
+    """What the timings depend on besides the workload: host, CPU, cores and numpy build."""
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def load_cache(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as error:
+        logging.warning(f"Auto-tuning cache {path} unreadable, tuning again: {error}")
+        return {}
+
+
+def save_cache(path, cache):
+    # Replaced in one rename, another process may be tuning too
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, path)
+
+
+class AutoTuner():
+    """Picks the fastest force kernel of an Engine for its workload, with params["force_backend"] = "auto".
+
+    Each eligible backend is timed on the current positions with a few evaluations, along with its own parameter: the row block size of "table" and the number of cells per side of "cells" (fewer, wider cells than the cutoff allows evaluate more pairs in larger batches). The candidates run from the cheapest expected to the dearest; one whose first evaluation is already over twice the best time is not timed further, nor are the other configurations of its backend.
+    All the backends compute the same forces: "dense" is only eligible for LJ with an explicit cutoff, which it truncates like the tables.
+    The choice is cached in a JSON file, keyed by the workload signature (potential, cutoff, atom count to a quarter octave, density to two digits, fraction of mobile atoms) and by the machine, so that a later phase or run with the same workload skips the timings.
+
+    Attributes:
+        engine (Engine): The engine whose force kernels are timed and set.
+        cache_path (str): JSON file of the decisions, params["autotune_cache"] or ~/.cache/dynatom/autotune.json.
+        repeats (int): Timed evaluations of each candidate, the best one is kept.
+        choice (dict): The configuration in use: force_backend, and block_size or cell_side.
+        timings (list): Seconds per evaluation of each candidate, from the last tuning (empty for a cached decision).
+
+    Methods:
+        signature(): Returns the key of the current workload and machine in the cache.
+        candidates(): Returns the eligible configurations.
+        measure(config): Times one configuration, in seconds per evaluation.
+        apply(config): Makes the engine use a configuration.
+        tune(): Applies the cached choice of the workload, or times the candidates and caches the fastest.
+    """
+    def __init__(self, engine, cache_path=None, repeats=3):
+        self.engine = engine
+        self.cache_path = cache_path or default_cache_path()
+        self.repeats = repeats
+        self.choice = None
+        self.timings = []
+
+    def signature(self):
+        engine = self.engine
+        n = len(engine.system.masses)
+        box = engine.params["boxsize"]
+        workload = {
+            "potential": engine.potential.name,
+            "cutoff": round(float(engine.potential.cutoff), 3),
+            "dense_cutoff": bool(engine.params.get("cutoff")),
+            "atoms": int(round(4 * np.log2(max(n, 1)))),
+            "density": float(f"{n / box ** 2:.2g}"),
+            "mobile": round(engine.system.n_mobile() / max(n, 1), 1),
+        }
+        return json.dumps({"workload": workload, "machine": machine_signature()}, sort_keys=True)
+
+    def candidates(self):
+        engine = self.engine
+        n = len(engine.system.masses)
+        box, cutoff = engine.params["boxsize"], engine.potential.cutoff
+
+        # Cheapest expected first, the O(N^2) kernels last
+        configs = []
+        most = int(box // cutoff)
+        # Under 3 cells per side the neighbouring cells overlap
+        for side in sorted({most, max(most // 2, 3)}, reverse=True):
+            if 3 <= side <= most:
+                configs.append({"force_backend": "cells", "cell_side": side})
+        if n <= TABLE_MAX_ATOMS or not configs:
+            for block in sorted({min(b, n) for b in BLOCK_SIZES if b < 2 * n} or {max(n, 1)}):
+                configs.append({"force_backend": "table", "block_size": block})
+        if n <= DENSE_MAX_ATOMS and engine.potential.name == "LJ" and engine.params.get("cutoff"):
+            configs.append({"force_backend": "dense"})
+        return configs
+
+    def apply(self, config):
+        engine = self.engine
+        engine.force_backend = config["force_backend"]
+        if "block_size" in config:
+            engine.params["block_size"] = config["block_size"]
+        if "cell_side" in config:
+            engine.params["cell_side"] = config["cell_side"]
+            engine.cell_list = CellList(engine.params["boxsize"], engine.potential.cutoff,
+                                        config["cell_side"])
+        self.choice = config
+
+    def measure(self, config, limit=None):
+        self.apply(config)
+        kernel = getattr(self.engine, self.engine.FORCE_BACKENDS[config["force_backend"]])
+
+        best = np.inf
+        for _ in range(self.repeats):
+            t0 = time.perf_counter()
+            kernel()
+            best = min(best, time.perf_counter() - t0)
+            # Clearly slower: one evaluation is enough to tell
+            if limit is not None and best > 2 * limit:
+                break
+        return best
+
+    def tune(self):
+        key = self.signature()
+        cache = load_cache(self.cache_path)
+        if key in cache:
+            self.apply(cache[key]["choice"])
+            self.timings = []
+            logging.info(f"Force backend {self.choice} from the auto-tuning cache")
+            return self.choice
+
+        self.timings = []
+        best, choice = np.inf, None
+        dropped = set()
+        for config in self.candidates():
+            if config["force_backend"] in dropped:
+                continue
+            seconds = self.measure(config, best if choice is not None else None)
+            self.timings.append(dict(config, seconds=seconds))
+            if seconds < best:
+                best, choice = seconds, config
+            elif seconds > 2 * best:
+                dropped.add(config["force_backend"])
+        self.apply(choice)
+        logging.info(f"Force backend {choice} tuned, {best * 1e3:.2f} ms per evaluation")
+
+        cache = load_cache(self.cache_path)
+        cache[key] = {"choice": choice, "timings": self.timings,
+                      "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            save_cache(self.cache_path, cache)
+        except OSError as error:
+            logging.warning(f"Auto-tuning cache {self.cache_path} not written: {error}")
+        return choice
@@ -0,0 +1,202 @@
+import numpy as np # type: ignore
+
+
+# ----------------------
+#  Topology
+# ----------------------
+
+def molecule_labels(bonds, n_atoms):
+    """Molecule of every atom (connected set of bonded atoms), as the ID of one of its atoms; a lone atom is its own molecule."""
+    # Union-find over the atoms
+    parent = list(range(n_atoms))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for i, j in bonds:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_i] = root_j
+
+    return np.array([find(a) for a in range(n_atoms)], dtype=np.int64)
+
+
+def molecules(bonds, n_atoms):
+    """Groups the bonds by molecule, the molecules with the same number of bonds together.
+
+    Returns:
+        dict: For each number of bonds m, an (n_molecules, m) array of indices into bonds.
+    """
+    roots = molecule_labels(bonds, n_atoms)[bonds[:, 0]]
+    order = np.argsort(roots, kind="stable")
+    _, starts, counts = np.unique(roots[order], return_index=True, return_counts=True)
+    return {int(m): order[starts[counts == m][:, None] + np.arange(m)] for m in np.unique(counts)}
+
+
+def coupling(bonds, inv_masses):
+    """Coupling matrices C of the bonds of each molecule, (n_molecules, m, m) for an (n_molecules, m, 2) array of bonded atoms.
+
+    A multiplier g_l of bond l moves its atoms by +g_l / m_i d_l and -g_l / m_j d_l, which changes the vector of bond k by g_l C_kl d_l: C_kk = 1 / m_i + 1 / m_j, and C_kl is +-1 / m of the atoms the bonds share.
+    """
+    I, J = bonds[..., 0], bonds[..., 1]
+
+    def sign(a):
+        # +1 if atom a is the first atom of bond l, -1 if the second
+        return (a[:, :, None] == I[:, None, :]).astype(float) - (a[:, :, None] == J[:, None, :])
+
+    return inv_masses[I][:, :, None] * sign(I) - inv_masses[J][:, :, None] * sign(J)
+
+
+def bond_vectors(positions, rows, boxsize):
+    """Minimum-image vectors r_i - r_j of the bonded rows (M, 2)."""
+    d = positions[rows[:, 0]] - positions[rows[:, 1]]
+    d -= boxsize * np.round(d / boxsize)
+    return d
+
+
+def measure_bonds(positions, bonds, boxsize):
+    """Lengths of the bonds in a configuration, e.g. to constrain them as they are."""
+    d = bond_vectors(positions, bonds, boxsize)
+    return np.sqrt(np.einsum("ij,ij->i", d, d))
+
+
+# ----------------------
+#  Flexible bonds
+# ----------------------
+
+def harmonic_bond_forces(positions, rows, lengths, stiffness, boxsize):
+    """Forces of harmonic bonds V = k / 2 (r - r0)^2, added to the pair potential.
+
+    Returns:
+        tuple: forces (N, 2), energy per atom (N,) (half of each bond to each of its atoms), total energy and virial sum(r_ij . f_ij).
+    """
+    n = len(positions)
+    d = bond_vectors(positions, rows, boxsize)
+    r = np.sqrt(np.einsum("ij,ij->i", d, d))
+    stretch = r - lengths
+
+    # Force on i along d, the opposite on j
+    magnitude = -stiffness * stretch
+    f = (magnitude / r)[:, None] * d
+
+    forces = np.zeros((n, 2))
+    for axis in range(2):
+        forces[:, axis] = np.bincount(rows[:, 0], f[:, axis], minlength=n) - \
+                          np.bincount(rows[:, 1], f[:, axis], minlength=n)
+
+    bond_energy = 0.5 * stiffness * stretch * stretch
+    energy = 0.5 * (np.bincount(rows[:, 0], bond_energy, minlength=n) +
+                    np.bincount(rows[:, 1], bond_energy, minlength=n))
+    return forces, energy, bond_energy.sum(), np.dot(magnitude, r)
+
+
+# ----------------------
+#  Constraints
+# ----------------------
+
+class Constraints():
+    """Rigid bonds of an Engine's System, kept at their lengths with SHAKE and RATTLE (Ryckaert et al. 1977, Andersen 1983).
+
+    SHAKE corrects the positions after a drift with one multiplier per bond, each moving the two atoms along the bond vector of the previous positions, so that every bond has its length within the relative tolerance; the same corrections divided by dt go to the velocities, which is the constraint force of the first half kick. RATTLE removes the velocity components along the bonds after the second half kick.
+    The bonds only couple within a molecule, so the multipliers are solved molecule by molecule, all the molecules with the same number of bonds at once with batched linear solves: Newton iterations for SHAKE (matrix SHAKE, quadratic convergence, about 3 iterations), one exact solve for RATTLE, which is linear. This suits small molecules, the cost grows as the cube of the bonds per molecule.
+    The virial of the constraint forces is added to the one of the force kernel by RATTLE, and each constraint removes one degree of freedom. The bonds are the atom ID pairs of system.bonds, so they survive the reordering of the rows. A frozen atom has an infinite mass for the constraints, a bond between two frozen atoms is not allowed.
+
+    Attributes:
+        engine (Engine): The engine whose System, box and profiler are used.
+        tolerance (float): Relative tolerance on the bond lengths.
+        max_iterations (int): Newton iterations of SHAKE before giving up.
+        groups (dict): Bond indices of the molecules, by number of bonds.
+        couplings (dict): Coupling matrices of the molecules, by number of bonds.
+        iterations (int): Newton iterations of the last call of shake.
+
+    Methods:
+        shake(old_positions, dt): Corrects the positions, and the velocities if dt is given, after a drift from old_positions.
+        rattle(dt): Makes the velocities tangent to the constraints, and adds the constraint virial to the System.
+    """
+    def __init__(self, engine, tolerance=1e-8, max_iterations=50):
+        self.engine = engine
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+
+        # Built in atom IDs, which do not change with the rows
+        # Frozen atoms weigh as infinite masses, only their bonded partners move
+        system = engine.system
+        inv_masses = system.by_id(system.mobile) / system.by_id(system.masses)
+        self.groups = molecules(system.bonds, len(system.masses))
+        self.couplings = {m: coupling(system.bonds[index], inv_masses)
+                          for m, index in self.groups.items()}
+        self.iterations = 0
+
+    def _scatter(self, multipliers, vectors):
+        # Displacement of every atom by the multipliers of its bonds
+        system = self.engine.system
+        rows = system.bond_rows()
+        n = len(system.masses)
+        f = multipliers[:, None] * vectors
+        out = np.empty((n, 2))
+        for axis in range(2):
+            out[:, axis] = np.bincount(rows[:, 0], f[:, axis], minlength=n) - \
+                           np.bincount(rows[:, 1], f[:, axis], minlength=n)
+        return out * (system.mobile / system.masses)[:, None]
+
+    def shake(self, old_positions, dt=None):
+        system = self.engine.system
+        box = self.engine.params["boxsize"]
+        rows = system.bond_rows()
+        lengths2 = system.bond_lengths ** 2
+
+        with self.engine.profiler.section("constraints"):
+            # Corrections go along the bonds at the start of the drift
+            reference = bond_vectors(old_positions, rows, box)
+            unconstrained = bond_vectors(system.positions, rows, box)
+            multipliers = np.zeros(len(rows))
+
+            self.iterations = 0
+            for m, index in self.groups.items():
+                C, R, target = self.couplings[m], reference[index], lengths2[index]
+                G = np.zeros(index.shape)
+                for iteration in range(1, self.max_iterations + 1):
+                    D = unconstrained[index] + np.einsum("nkl,nlj->nkj", C * G[:, None, :], R)
+                    diff = target - np.einsum("nkj,nkj->nk", D, D)
+                    error = np.abs(diff / target).max() / 2
+                    if error < self.tolerance:
+                        break
+                    # Newton step on |d_k(G)|^2 = L_k^2
+                    jacobian = 2 * C * np.einsum("nkj,nlj->nkl", D, R)
+                    G += np.linalg.solve(jacobian, diff[..., None])[..., 0]
+                else:
+                    raise RuntimeError(f"SHAKE not converged after {self.max_iterations} iterations "
+                                       f"(relative error {error:.2e}), the time step is too large")
+                multipliers[index] = G
+                self.iterations = max(self.iterations, iteration - 1)
+
+            displacements = self._scatter(multipliers, reference)
+            system.positions += displacements
+            if dt is not None:
+                # Half kick of the constraint forces
+                system.velocities += displacements / dt
+
+    def rattle(self, dt):
+        system = self.engine.system
+        box = self.engine.params["boxsize"]
+        rows = system.bond_rows()
+
+        with self.engine.profiler.section("constraints"):
+            d = bond_vectors(system.positions, rows, box)
+            relative = system.velocities[rows[:, 0]] - system.velocities[rows[:, 1]]
+            along = np.einsum("ij,ij->i", d, relative)
+            multipliers = np.zeros(len(rows))
+
+            # sum_l C_kl (d_k . d_l) k_l = -d_k . v_k, linear: one solve
+            for m, index in self.groups.items():
+                D = d[index]
+                A = self.couplings[m] * np.einsum("nkj,nlj->nkl", D, D)
+                multipliers[index] = np.linalg.solve(A, -along[index][..., None])[..., 0]
+
+            system.velocities += self._scatter(multipliers, d)
+
+        # The force of bond l on its first atom is 2 k_l d_l / dt
+        system.virial += 2.0 / dt * np.dot(multipliers, np.einsum("ij,ij->i", d, d))
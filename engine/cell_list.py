@@ -0,0 +1,157 @@
+import numpy as np # type: ignore
+from engine.pair_table import table_forces
+
+
+class CellList():
+    """Atoms binned into a periodic grid of square cells at least one cutoff wide.
+
+    Each atom then only interacts with the atoms of its own cell and of the 8 neighbouring cells, so a force evaluation costs O(N) instead of O(N^2).
+    Cells are stored as a padded array of atom indices (-1 in the empty slots), so that all the cell pairs of one neighbour offset are evaluated as a single vectorised batch. The gathers through this array are contiguous when the atoms are stored in spatial order (see System.reorder).
+
+    Attributes:
+        boxsize (float): Size of the periodic box.
+        cutoff (float): Interaction cutoff, lower bound of the cell size.
+        n_side (int): Number of cells along each side of the box.
+        n_cells (int): Total number of cells.
+        usable (bool): False when fewer than 3 cells fit along a side, the neighbouring cells would then overlap.
+        neighbours (numpy.ndarray): Array of shape (n_cells, 4) with the index of 4 neighbouring cells of each cell: one half of the 8 neighbours, each pair of cells is visited once.
+        shifts (numpy.ndarray): Array of shape (n_cells, 4, 2), periodic image shift of each of these neighbouring cells.
+        slots (numpy.ndarray): Array of shape (n_cells, max occupancy) with the atoms of each cell, from the last build().
+
+    Methods:
+        build(positions): Bins the atoms into the cells, returns slots.
+        counts(): Number of atoms in each cell, from the last build().
+    """
+    # Half of the 8 neighbouring cells, the other half sees them the other way
+    OFFSETS = [(1, -1), (1, 0), (1, 1), (0, 1)]
+
+    def __init__(self, boxsize, cutoff, n_side=None):
+        self.boxsize = boxsize
+        self.cutoff = cutoff
+        # At most boxsize // cutoff cells, fewer if requested
+        self.n_side = max(int(boxsize // cutoff), 1)
+        if n_side is not None:
+            self.n_side = max(min(n_side, self.n_side), 1)
+        self.n_cells = self.n_side * self.n_side
+        self.usable = self.n_side >= 3
+        self.slots = None
+
+        n = self.n_side
+        cx, cy = np.divmod(np.arange(self.n_cells), n)
+        self.neighbours = np.stack([((cx + dx) % n) * n + (cy + dy) % n
+                                    for dx, dy in self.OFFSETS], axis=1)
+        # Neighbours across the box are seen through their periodic image
+        self.shifts = boxsize * np.stack([np.stack([(cx + dx) // n, (cy + dy) // n], axis=1)
+                                          for dx, dy in self.OFFSETS], axis=1)
+
+    def build(self, positions):
+        n = self.n_side
+        c = (positions * (n / self.boxsize)).astype(np.intp)
+        np.clip(c, 0, n - 1, out=c)
+        cell = c[:, 0] * n + c[:, 1]
+        self.slots = bin_atoms(cell, self.n_cells)
+        return self.slots
+
+    def counts(self):
+        return (self.slots >= 0).sum(axis=1)
+
+
+def bin_atoms(cell, n_cells):
+    """Padded array of shape (n_cells, max occupancy) with the atoms of each cell, -1 in the empty slots."""
+    # Atoms sorted by cell, then their rank inside their cell
+    order = np.argsort(cell, kind="stable")
+    counts = np.bincount(cell, minlength=n_cells)
+    starts = np.cumsum(counts) - counts
+    sorted_cells = cell[order]
+    rank = np.arange(len(order)) - starts[sorted_cells]
+
+    slots = np.full((n_cells, max(counts.max(initial=0), 1)), -1, dtype=np.intp)
+    slots[sorted_cells, rank] = order
+    return slots
+
+
+def _cell_pairs(d, valid_pairs, table, distances=None, once=None):
+    # Table values of the pairs of d within the cutoff, 0 elsewhere
+    s = np.einsum("cijk,cijk->cij", d, d)
+    mask = (s < table.s_max) & (s > 0) & valid_pairs
+    e_pairs, fr_pairs = table.evaluate(s[mask])
+    if distances is not None:
+        distances.append(np.sqrt(s[mask if once is None else mask & once]))
+
+    fr = np.zeros_like(s)
+    fr[mask] = fr_pairs
+    e = np.zeros_like(s)
+    e[mask] = e_pairs
+    return fr, e, np.dot(fr_pairs, s[mask]), len(e_pairs)
+
+
+def cell_forces(positions, boxsize, table, cells, n_mobile=None, distances=None):
+    """Forces, energies and virial of all pairs within the cutoff, found through a CellList.
+
+    Pairs inside a cell are visited in both directions, pairs of neighbouring cells once, with the opposite force given to the other atom. No minimum image rounding is needed, the periodic shift of each neighbouring cell is known.
+    With n_mobile, the rows from n_mobile on are frozen atoms: the pairs of two frozen atoms are skipped, and so are the cells, and the pairs of neighbouring cells, without a mobile atom.
+    Same outputs as table_forces, which is used instead when the box is too small for 3 cells per side. With a distances list, the distances of the pairs within the cutoff are appended to it, each pair once.
+
+    Returns:
+        tuple: forces (N, 2), per-atom energy (N,), total energy, virial and number of evaluated pairs.
+    """
+    if not cells.usable:
+        return table_forces(positions, boxsize, table, n_mobile=n_mobile, distances=distances)
+
+    n = len(positions)
+    slots = cells.build(positions)
+    valid = slots >= 0
+    pos = positions[np.where(valid, slots, 0)] # (C, M, 2)
+
+    if n_mobile is None or n_mobile == n:
+        moving = valid
+        inside = slice(None)
+    else:
+        moving = valid & (slots < n_mobile)
+        active = moving.any(axis=1)
+        inside = np.flatnonzero(active)
+
+    def pairs(i, j):
+        # Pair mask of the slots of two cell batches, one atom at least mobile
+        both = valid[i][:, :, None] & valid[j][:, None, :]
+        if moving is valid:
+            return both
+        return both & (moving[i][:, :, None] | moving[j][:, None, :])
+
+    forces = np.zeros(pos.shape)
+    energy = np.zeros(valid.shape)
+
+    # Pairs inside each cell, both directions
+    p = pos[inside]
+    d = p[:, :, None, :] - p[:, None, :, :] # (C, M, M, 2)
+    # Both directions: the distances of the slots j > i only
+    upper = np.triu(np.ones(d.shape[1:3], dtype=bool), 1)
+    fr, e, virial, n_pairs = _cell_pairs(d, pairs(inside, inside), table, distances, upper)
+    forces[inside] = np.einsum("cij,cijk->cik", fr, d)
+    energy[inside] = e.sum(axis=2)
+    virial *= 0.5
+
+    # Pairs with the neighbouring cells, once
+    for k in range(len(cells.OFFSETS)):
+        c = inside if moving is valid else np.flatnonzero(active | active[cells.neighbours[:, k]])
+        nb = cells.neighbours[c, k]
+        d = pos[c][:, :, None, :] - (pos[nb] + cells.shifts[c, None, k])[:, None, :, :]
+        fr, e, v, m = _cell_pairs(d, pairs(c, nb), table, distances)
+        virial += v
+        n_pairs += m
+
+        # nb is a permutation of the cells for a fixed offset: no scatter-add
+        forces[c] += np.einsum("cij,cijk->cik", fr, d)
+        forces[nb] -= np.einsum("cij,cijk->cjk", fr, d)
+        energy[c] += e.sum(axis=2)
+        energy[nb] += e.sum(axis=1)
+
+    # Back from the cell slots to the atoms
+    atoms = slots[valid]
+    out_forces = np.zeros((n, 2))
+    out_forces[atoms] = forces[valid]
+    out_energy = np.zeros(n)
+    out_energy[atoms] = energy[valid]
+
+    # Each pair contributes to the energy of both its atoms
+    return out_forces, out_energy, 0.5 * out_energy.sum(), virial, n_pairs
@@ -0,0 +1,27 @@
+# Names of the options offered in the parameters panel, without their
+# implementations: the panel imports this module only, so that the window
+# opens without loading the engine, the trajectory writers or the loaders.
+# Each list is the source of truth of the table of the module that implements
+# the options, which checks its keys against it with check_table at import.
+
+# Keys of Engine.FORCE_BACKENDS, "auto" lets the AutoTuner pick one
+FORCE_BACKENDS = ["dense", "table", "cells"]
+
+# Keys of engine.potentials.POTENTIALS
+POTENTIALS = ["LJ", "WCA", "Morse", "soft"]
+
+# Thermostats of the equilibration, the production also runs without
+THERMOSTATS = ["berendsen", "langevin", "nose_hoover"]
+
+# Extensions of assets.trajectory.TRAJECTORY_FORMATS
+TRAJECTORY_FORMATS = [".xyz", ".extxyz", ".dcd", ".dtrj"]
+
+# Extensions of assets.loaders.LOADERS
+LOADERS = [".xyz", ".extxyz", ".npz"]
+
+
+def check_table(names, table, table_name):
+    """Raises ImportError if the keys of an implementation table differ from the names offered in the panel."""
+    if list(table) != list(names):
+        raise ImportError(f"{table_name} has {list(table)}, engine.choices offers {list(names)}: "
+                          f"update both together")
@@ -0,0 +1,574 @@
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+import numpy as np # type: ignore
+from engine.system import System
+from engine.profiler import Profiler
+from engine.snapshot import FrameBuffer
+from engine.observables import Observables
+from engine.potentials import potential_from_params
+from engine.pair_table import PairTable
+from engine.cell_list import bin_atoms, _cell_pairs
+from engine.shared_buffers import _SharedBlock
+from assets.loaders import load_configuration
+
+
+# Columns of the global per-atom block, rows in atom ID order
+POSITIONS = slice(0, 2)
+VELOCITIES = slice(2, 4)
+ACCELERATIONS = slice(4, 6)
+FORCES = slice(6, 8)
+IMAGES = slice(8, 10)
+ENERGY = 10
+MASSES = 11
+N_COLUMNS = 12
+
+# Row of a migrating atom: id, mass, positions, velocities, accelerations, images
+MIGRANT_COLUMNS = 10
+
+# Values reduced over the workers after each step
+REDUCED = ["kinetic_ene", "potential_ene", "virial", "force_norm_total", "acc_norm_total",
+           "vel_norm_total", "max_force", "n_owned", "n_pairs", "n_migrated"]
+R = {key: k for k, key in enumerate(REDUCED)}
+
+
+# ----------------------
+#  Local kernel
+# ----------------------
+
+def slab_forces(owned, halo, x0, cell_width, m, n_y, boxsize, table):
+    """Forces, energies and virial on the atoms of one slab, from the atoms of the slab and of its halo.
+
+    The slab [x0, x0 + m * cell_width) is cut into m x n_y cells at least one cutoff wide, padded with one column of halo cells on each side; the halo atoms are given at their position next to the slab (periodic shift in x already applied). Only y is periodic here, through the known shift of the neighbouring cells.
+    Every neighbouring cell is visited (full shell), so the forces on the owned atoms need no communication back to the neighbouring slabs; the energy and virial of each pair are split between its two atoms.
+
+    Returns:
+        tuple: forces (n_owned, 2), per-atom energy (n_owned,), energy, virial and number of evaluated pairs.
+    """
+    n = len(owned)
+    positions = np.concatenate([owned, halo])
+
+    cx = np.concatenate([
+        np.clip(((owned[:, 0] - x0) / cell_width).astype(np.intp), 0, m - 1) + 1,
+        np.where(halo[:, 0] < x0, 0, m + 1),
+    ])
+    cy = np.clip((positions[:, 1] * (n_y / boxsize)).astype(np.intp), 0, n_y - 1)
+    slots = bin_atoms(cx * n_y + cy, (m + 2) * n_y)
+    valid = slots >= 0
+    pos = positions[np.where(valid, slots, 0)] # (C, M, 2)
+
+    # Cells of the slab, without the halo columns
+    cells = np.arange(n_y, (m + 1) * n_y)
+    ccx, ccy = np.divmod(cells, n_y)
+    own = pos[cells]
+    own_valid = valid[cells]
+
+    forces = np.zeros(own.shape)
+    energy = np.zeros(own.shape[:2])
+    virial, n_pairs = 0.0, 0
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nb = (ccx + dx) * n_y + (ccy + dy) % n_y
+            other = pos[nb]
+            other[..., 1] += boxsize * ((ccy + dy) // n_y)[:, None]
+
+            d = own[:, :, None, :] - other[:, None, :, :]
+            fr, e, v, k = _cell_pairs(d, own_valid[:, :, None] & valid[nb][:, None, :], table)
+            forces += np.einsum("cij,cijk->cik", fr, d)
+            energy += e.sum(axis=2)
+            virial += v
+            n_pairs += k
+
+    # Slots of the slab cells only hold owned atoms
+    atoms = slots[cells][own_valid]
+    out_forces = np.zeros((n, 2))
+    out_forces[atoms] = forces[own_valid]
+    out_energy = np.zeros(n)
+    out_energy[atoms] = energy[own_valid]
+    return out_forces, out_energy, 0.5 * out_energy.sum(), 0.5 * virial, n_pairs
+
+
+# ----------------------
+#  Worker
+# ----------------------
+
+class DomainWorker():
+    """One slab of the periodic box, owned and stepped by a worker process of a DomainEngine.
+
+    The worker keeps the per-atom arrays of the atoms inside its slab. At each step it integrates them, sends the atoms that left the slab to the neighbouring slab (migration), publishes the atoms within one cutoff of its edges for the neighbouring slabs (halo), and computes the forces on its atoms with slab_forces. Both exchanges go through shared memory, between two barriers of all the workers.
+
+    Attributes:
+        rank (int): Index of the slab, from x = 0.
+        x0 (float): Left edge of the slab.
+        width (float): Width of the slab, boxsize / n_workers.
+        ids (numpy.ndarray): Atom IDs of the owned atoms.
+
+    Methods:
+        start(record): Computes the forces of the initial positions.
+        run_once(dt, record): Velocity-Verlet step.
+        equilibrate(dt, T_target, tau, record): Velocity-Verlet step followed by a Berendsen rescaling at the global temperature.
+        minimize(dt, record): Steepest descent step along the normalised forces.
+    """
+    def __init__(self, rank, n_workers, params, names, barrier):
+        self.rank = rank
+        self.n_workers = n_workers
+        self.barrier = barrier
+        self.boxsize = params["boxsize"]
+        self.n_total = params["n_atoms"]
+
+        self.table = PairTable(potential_from_params(params), params.get("table_points", 8192))
+        self.cutoff = self.table.cutoff
+        self.width = self.boxsize / n_workers
+        self.x0 = rank * self.width
+        self.m = max(int(self.width // self.cutoff), 1)
+        self.cell_width = self.width / self.m
+        self.n_y = int(self.boxsize // self.cutoff)
+
+        self.atoms = _SharedBlock(0, (self.n_total, N_COLUMNS), names["atoms"])
+        self.reduced = _SharedBlock(0, (n_workers, len(REDUCED)), names["reduced"])
+        self.edges = [_SharedBlock(2, (2, names["capacity"], 2), name) for name in names["edges"]]
+        self.migrants = [_SharedBlock(2, (2, names["migrant_capacity"], MIGRANT_COLUMNS), name)
+                         for name in names["migrants"]]
+        self.left = (rank - 1) % n_workers
+        self.right = (rank + 1) % n_workers
+
+        # Owned atoms, from the initial state
+        data = self.atoms.data
+        self.ids = np.flatnonzero(self._owner(data[:, 0]) == rank)
+        self.positions = data[self.ids, POSITIONS].copy()
+        self.velocities = data[self.ids, VELOCITIES].copy()
+        self.images = data[self.ids, IMAGES].astype(np.int64)
+        self.masses = data[self.ids, MASSES].copy()
+        self.accelerations = np.zeros_like(self.positions)
+        self.forces = np.zeros_like(self.positions)
+        self.energy = np.zeros(len(self.ids))
+        self.energy_total = 0.0
+        self.virial = 0.0
+        self.n_pairs = 0
+        self.n_migrated = 0
+
+    def _owner(self, x):
+        return np.minimum((x / self.width).astype(np.intp), self.n_workers - 1)
+
+    def close(self):
+        for block in [self.atoms, self.reduced] + self.edges + self.migrants:
+            block.close()
+
+    # ----------------------
+    #  Exchanges
+    # ----------------------
+
+    def _migrate(self):
+        owner = self._owner(self.positions[:, 0])
+        gone = owner != self.rank
+        to_left = gone & (owner == self.left)
+        to_right = gone & ~to_left
+        if np.any(owner[to_right] != self.right):
+            raise RuntimeError("An atom moved by more than one slab in one step, "
+                               "the time step is too large")
+
+        outbox = self.migrants[self.rank]
+        for side, mask in enumerate([to_left, to_right]):
+            count = int(mask.sum())
+            if count > outbox.data.shape[1]:
+                raise RuntimeError(f"{count} atoms left slab {self.rank} in one step, "
+                                   f"more than the migration buffer")
+            outbox.data[side, :count] = np.column_stack([
+                self.ids[mask], self.masses[mask], self.positions[mask],
+                self.velocities[mask], self.accelerations[mask], self.images[mask],
+            ])
+            outbox.header[side] = count
+        self.barrier.wait()
+
+        # From the left neighbour going right, and from the right one going left
+        left, right = self.migrants[self.left], self.migrants[self.right]
+        arrived = np.concatenate([left.data[1, :left.header[1]],
+                                  right.data[0, :right.header[0]]])
+        self.n_migrated = int(gone.sum())
+        if self.n_migrated or len(arrived):
+            keep = ~gone
+            self.ids = np.concatenate([self.ids[keep], arrived[:, 0].astype(np.intp)])
+            self.masses = np.concatenate([self.masses[keep], arrived[:, 1]])
+            self.positions = np.concatenate([self.positions[keep], arrived[:, 2:4]])
+            self.velocities = np.concatenate([self.velocities[keep], arrived[:, 4:6]])
+            self.accelerations = np.concatenate([self.accelerations[keep], arrived[:, 6:8]])
+            self.images = np.concatenate([self.images[keep], arrived[:, 8:10].astype(np.int64)])
+
+    def _halo(self):
+        x = self.positions[:, 0]
+        edges = self.edges[self.rank]
+        for side, mask in enumerate([x < self.x0 + self.cutoff,
+                                     x >= self.x0 + self.width - self.cutoff]):
+            count = int(mask.sum())
+            if count > edges.data.shape[1]:
+                raise RuntimeError(f"Slab {self.rank} holds {count} edge atoms, "
+                                   f"more than the halo buffer")
+            edges.data[side, :count] = self.positions[mask]
+            edges.header[side] = count
+        self.barrier.wait()
+
+        # Right edge of the left neighbour and left edge of the right one,
+        # moved next to this slab across the periodic boundary
+        left, right = self.edges[self.left], self.edges[self.right]
+        from_left = left.data[1, :left.header[1]].copy()
+        from_right = right.data[0, :right.header[0]].copy()
+        if self.rank == 0:
+            from_left[:, 0] -= self.boxsize
+        if self.rank == self.n_workers - 1:
+            from_right[:, 0] += self.boxsize
+        return np.concatenate([from_left, from_right])
+
+    def _forces(self):
+        self._migrate()
+        halo = self._halo()
+        self.forces, self.energy, self.energy_total, self.virial, self.n_pairs = slab_forces(
+            self.positions, halo, self.x0, self.cell_width, self.m, self.n_y,
+            self.boxsize, self.table)
+        self.accelerations = self.forces / self.masses[:, None]
+
+    def _wrap(self):
+        shift = np.floor(self.positions / self.boxsize)
+        self.positions -= self.boxsize * shift
+        self.images += shift.astype(np.int64)
+
+    # ----------------------
+    #  Steps
+    # ----------------------
+
+    def _publish(self, record, max_force=0.0):
+        data = self.atoms.data
+        ids = self.ids
+        # Disjoint rows for each worker, the viewer needs the positions at every step
+        data[ids, POSITIONS] = self.positions
+        if record:
+            data[ids, VELOCITIES] = self.velocities
+            data[ids, ACCELERATIONS] = self.accelerations
+            data[ids, FORCES] = self.forces
+            data[ids, IMAGES] = self.images
+            data[ids, ENERGY] = self.energy
+
+        row = self.reduced.data[self.rank]
+        row[R["n_owned"]] = len(ids)
+        row[R["n_pairs"]] = self.n_pairs
+        row[R["n_migrated"]] = self.n_migrated
+        row[R["max_force"]] = max_force
+        if record:
+            v2 = np.einsum("ij,ij->i", self.velocities, self.velocities)
+            f2 = np.einsum("ij,ij->i", self.forces, self.forces)
+            a2 = np.einsum("ij,ij->i", self.accelerations, self.accelerations)
+            row[R["kinetic_ene"]] = 0.5 * np.dot(self.masses, v2)
+            row[R["potential_ene"]] = self.energy_total
+            row[R["virial"]] = self.virial
+            row[R["vel_norm_total"]] = np.sqrt(v2).sum()
+            row[R["force_norm_total"]] = np.sqrt(f2).sum()
+            row[R["acc_norm_total"]] = np.sqrt(a2).sum()
+
+    def start(self, record):
+        self._forces()
+        self._publish(record)
+
+    def _verlet(self, dt):
+        self.velocities += 0.5 * dt * self.accelerations
+        self.positions += dt * self.velocities
+        self._wrap()
+        self._forces()
+        self.velocities += 0.5 * dt * self.accelerations
+
+    def run_once(self, dt, record):
+        self._verlet(dt)
+        self._publish(record)
+
+    def equilibrate(self, dt, T_target, tau, record):
+        self._verlet(dt)
+
+        # Global temperature: every worker adds its kinetic energy
+        kinetic = self.reduced.data[:, R["kinetic_ene"]]
+        kinetic[self.rank] = 0.5 * np.dot(self.masses,
+                                          np.einsum("ij,ij->i", self.velocities, self.velocities))
+        self.barrier.wait()
+        T = kinetic.sum() / self.n_total # 2 DOF per atom
+        # Nobody writes the kinetic energies again before reading them
+        self.barrier.wait()
+
+        if T > 0:
+            self.velocities *= np.sqrt(1 + dt / tau * (T_target / T - 1))
+        self._publish(record)
+
+    def minimize(self, dt, record):
+        norm = np.linalg.norm(self.forces, axis=1, keepdims=True)
+        max_force = float(norm.max(initial=0.0))
+        norm[norm == 0] = 1
+
+        self.positions += dt * self.forces / norm
+        self._wrap()
+        self._forces()
+        self._publish(record, max_force)
+
+
+def _worker_main(rank, n_workers, params, names, barrier, conn):
+    """Entry point of a worker process: runs the step commands of the DomainEngine."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s | %(levelname)s | slab {rank} | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    worker = None
+    try:
+        worker = DomainWorker(rank, n_workers, params, names, barrier)
+        while True:
+            command, args = conn.recv()
+            if command == "stop":
+                break
+            try:
+                getattr(worker, command)(*args)
+                conn.send(("done",))
+            except threading.BrokenBarrierError:
+                conn.send(("error", "Another worker failed"))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if worker is not None:
+            worker.close()
+
+
+# ----------------------
+#  Engine
+# ----------------------
+
+class DomainEngine():
+    """DomainEngine class running one system split into slabs over several worker processes.
+
+    The periodic box is cut along x into one slab per worker (see DomainWorker), each slab at least one cutoff wide. The workers own the per-atom arrays of their atoms, exchange migrating and halo atoms with their neighbours through shared memory, and step in parallel, so the throughput grows with the number of cores.
+    The workers also write the state of their atoms into a shared block in atom ID order (the positions at every step, the other arrays on recorded steps) and their partial sums of the observables, which this class reduces. system, recorder, snapshot, profiler and analyses are then used exactly like those of an Engine, by the GUI and the recorder.
+    Minimisation, Berendsen equilibration and velocity-Verlet production are available, with the tabulated potential of params["potential"] and params["cutoff"] (force_backend is ignored, every worker uses a cell grid).
+
+    Attributes:
+        params (dict): A dictionary containing simulation parameters such as the number of atoms and box size.
+        recorder (MDRecorder): The recorder, fed with the gathered state on recorded steps.
+        n_workers (int): Number of slabs and worker processes, params["domain_workers"].
+        system (System): Masses and species, and views on the gathered per-atom arrays in atom ID order.
+        potential (PairPotential): Pair potential used by the workers.
+        profiler (Profiler): Timings of the steps seen from this process, pair evaluation and migration counters.
+        snapshot (FrameBuffer): Latest positions, published after each step for the viewer.
+        step_count (int): Number of steps done by the engine.
+        observables (Observables): Global observables of the last recorded step, reduced over the workers.
+        analyses (dict): Analysis stages run on the gathered positions at the end of the steps they want.
+        loads (numpy.ndarray): Number of atoms owned by each worker after the last step.
+
+    Methods:
+        minimize_step(dt, conv_crit): Steepest descent step, returns True once converged.
+        equilibrate_step(step, dt, T_target, tau): Velocity-Verlet step with a Berendsen thermostat.
+        run_once(dt): Velocity-Verlet step.
+        add_analysis(name, stage): Registers an analysis stage.
+        set_params(changes): Applies parameter changes between two steps, the box excepted.
+        get_stats(): Returns the profiler timings and counters.
+        stop(): Stops the worker processes and releases the shared memory.
+    """
+    def __init__(self, params, recorder, n_workers=None):
+        self.params = params
+        self.recorder = recorder
+        self.n_workers = n_workers or params.get("domain_workers") or os.cpu_count()
+
+        self.profiler = Profiler(params.get("enable_profiling", False))
+        self.snapshot = FrameBuffer()
+        self.step_count = 0
+        self.observables = None
+        self.analyses = {}
+
+        self.system = self._initial_system()
+        n = len(self.system.masses)
+        self.params["n_atoms"] = n
+
+        self.potential = potential_from_params(params)
+        box, cutoff = params["boxsize"], self.potential.cutoff
+        if box / self.n_workers < cutoff or box < 3 * cutoff:
+            raise ValueError(f"{self.n_workers} slabs at least one cutoff ({cutoff}) wide "
+                             f"and 3 cutoffs along y do not fit in a box of {box}")
+
+        # Gathered state in atom ID order, the initial one read by the workers
+        self.atoms = _SharedBlock(0, (n, N_COLUMNS))
+        data = self.atoms.data
+        data[:, POSITIONS] = self.system.positions
+        data[:, VELOCITIES] = self.system.velocities
+        data[:, MASSES] = self.system.masses
+        self.system.positions = data[:, POSITIONS]
+        self.system.velocities = data[:, VELOCITIES]
+        self.system.accelerations = data[:, ACCELERATIONS]
+        self.system.forces = data[:, FORCES]
+        self.system.images = data[:, IMAGES]
+        self.system.ene_pot_LJ = data[:, ENERGY]
+        self.reduced = _SharedBlock(0, (self.n_workers, len(REDUCED)))
+
+        # Halo and migration buffers of each worker, room for uneven slabs
+        capacity = 2 * n // self.n_workers + 1024
+        migrant_capacity = capacity // 16 + 64
+        self.edges = [_SharedBlock(2, (2, capacity, 2)) for _ in range(self.n_workers)]
+        self.migrants = [_SharedBlock(2, (2, migrant_capacity, MIGRANT_COLUMNS))
+                         for _ in range(self.n_workers)]
+        names = {
+            "atoms": self.atoms.name,
+            "reduced": self.reduced.name,
+            "edges": [block.name for block in self.edges],
+            "migrants": [block.name for block in self.migrants],
+            "capacity": capacity,
+            "migrant_capacity": migrant_capacity,
+        }
+
+        context = multiprocessing.get_context("spawn")
+        self.barrier = context.Barrier(self.n_workers)
+        self.conns, self.processes = [], []
+        for rank in range(self.n_workers):
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(rank, self.n_workers, dict(params), names, self.barrier, child_conn),
+                daemon=True,
+            )
+            process.start()
+            self.conns.append(conn)
+            self.processes.append(process)
+        logging.info(f"{n} atoms split into {self.n_workers} slabs")
+
+        try:
+            self._command("start", record=True)
+        except RuntimeError:
+            self.stop()
+            raise
+        self.loads = self.reduced.data[:, R["n_owned"]].astype(np.int64)
+        self.snapshot.publish(self.system.positions, self.step_count)
+
+    def _initial_system(self):
+        # Same initial state as an Engine: configuration file or random carbon atoms
+        init_file = self.params.get("init_file")
+        if init_file:
+            configuration = load_configuration(init_file)
+            if configuration.get("bonds") is not None and len(configuration["bonds"]):
+                raise ValueError("The domain decomposition does not handle bonds")
+            if configuration.get("frozen") is not None and np.any(configuration["frozen"]):
+                raise ValueError("The domain decomposition does not handle frozen atoms")
+            if configuration["boxsize"]:
+                self.params["boxsize"] = configuration["boxsize"]
+            system = System.from_arrays(configuration["species"], configuration["positions"],
+                                        configuration["velocities"])
+        else:
+            n = self.params["n_atoms"]
+            positions = np.random.uniform(0, self.params["boxsize"], size=(n, 2))
+            system = System.from_arrays(np.full(n, "C"), positions)
+        system.positions %= self.params["boxsize"]
+        return system
+
+    def _command(self, command, *args, record=False):
+        for conn in self.conns:
+            conn.send((command, args + (record,)))
+
+        errors = []
+        for conn in self.conns:
+            try:
+                message, *details = conn.recv()
+            except (EOFError, ConnectionError):
+                message, details = "error", ["A worker process exited"]
+            if message == "error":
+                # Releases the workers waiting for the failed one
+                self.barrier.abort()
+                errors.append(details[0])
+        if errors:
+            raise RuntimeError(f"Domain worker failed:\n{errors[0]}")
+
+    # ----------------------
+    #  Steps
+    # ----------------------
+
+    def _step(self, command, *args):
+        record = self.recorder.wants(self.step_count)
+        with self.profiler.section("domain_step"):
+            self._command(command, *args, record=record)
+
+        reduced = self.reduced.data
+        totals = reduced.sum(axis=0)
+        self.loads = reduced[:, R["n_owned"]].astype(np.int64)
+        self.profiler.count("pair_evaluations", int(totals[R["n_pairs"]]))
+        self.profiler.count("migrations", int(totals[R["n_migrated"]]))
+
+        if record:
+            with self.profiler.section("observables"):
+                self.update_observables(totals)
+            with self.profiler.section("record"):
+                self.recorder.record(self)
+
+        self.step_count += 1
+        self.profiler.step()
+        self.snapshot.publish(self.system.positions, self.step_count)
+
+        for stage in self.analyses.values():
+            if stage.wants(self.step_count):
+                with self.profiler.section("analysis"):
+                    stage.update(self)
+        return reduced[:, R["max_force"]].max()
+
+    def minimize_step(self, dt, conv_crit):
+        max_force = self._step("minimize", dt)
+        if max_force < conv_crit:
+            logging.info("Minimisation converged!")
+            return True
+
+    def equilibrate_step(self, step, dt, T_target, tau, respa_k=1, thermostat="berendsen"):
+        if respa_k > 1:
+            raise ValueError("RESPA is not available with the domain decomposition")
+        if thermostat != "berendsen":
+            raise ValueError(f"The {thermostat} thermostat is not available with the domain decomposition")
+        self._step("equilibrate", dt, T_target, tau)
+
+    def run_once(self, dt):
+        self._step("run_once", dt)
+
+    def update_observables(self, totals):
+        obs = self.observables if self.observables is not None else Observables()
+        for key in ["kinetic_ene", "potential_ene", "virial", "force_norm_total",
+                    "acc_norm_total", "vel_norm_total"]:
+            setattr(obs, key, float(totals[R[key]]))
+        obs.n_dof = self.system.n_dof()
+        obs.area = self.params["boxsize"] ** 2
+        obs._derive()
+
+        self.observables = obs
+        self.system.ene_pot_LJ_total = obs.potential_ene
+        self.system.virial = obs.virial
+        self.system.kinetic_ene = obs.kinetic_ene
+        self.system.total_ene = obs.total_ene
+        return obs
+
+    def add_analysis(self, name, stage):
+        self.analyses[name] = stage
+
+    def set_params(self, changes):
+        # The slabs, halos and cells of the workers are cut for one box
+        if changes.get("boxsize", self.params["boxsize"]) != self.params["boxsize"]:
+            raise ValueError("The box cannot be rescaled with the domain decomposition")
+        self.params.update(changes)
+
+    def get_stats(self):
+        return self.profiler.stats()
+
+    def stop(self):
+        if not self.conns:
+            return
+
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(("stop", ()))
+                except (BrokenPipeError, OSError):
+                    pass
+        for conn, process in zip(self.conns, self.processes):
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.conns, self.processes = [], []
+
+        for block in [self.atoms, self.reduced] + self.edges + self.migrants:
+            block.close()
@@ -1,6 +1,19 @@
 import numpy as np # type: ignore
+from engine import choices
 from engine.system import System
 from engine.atom import Atom
+from engine.profiler import Profiler
+from engine.snapshot import FrameBuffer
+from engine.observables import compute_observables, kinetic_energy
+from engine.potentials import potential_from_params
+from engine.pair_table import PairTable, table_forces
+from engine.cell_list import CellList, cell_forces
+from engine.ordering import morton_order
+from engine.respa import Respa
+from engine.thermostats import Langevin, NoseHooverChain
+from engine.autotune import AutoTuner
+from engine.bonds import Constraints, harmonic_bond_forces, measure_bonds, molecule_labels
+from assets.loaders import load_configuration
 import logging
 
 
@@ -13,6 +26,20 @@ class Engine():
         system (System): An instance of the System class that holds the state of the atom system.
         params (dict): A dictionary containing simulation parameters such as the number of atoms and box size.
         recorder (Recorder): An instance of the Recorder class used to log simulation data.
+        force_backend (str): The key of FORCE_BACKENDS used by calc_forces, "dense" by default, chosen by the autotuner with params["force_backend"] = "auto".
+        autotuner (AutoTuner): Times the backends and picks the fastest in tune_backend, None unless params["force_backend"] is "auto".
+        potential (PairPotential): Pair potential selected by params["potential"] ("LJ" by default) and params["cutoff"].
+        pair_table (PairTable): The potential tabulated in r^2, used by the tabulated backends.
+        cell_list (CellList): Grid of cells one cutoff wide (params["cell_side"] cells per side at most), used by the "cells" backend.
+        respa (Respa): Multiple time step integrator of run_respa, created at its first use from params["respa_split"] and params["respa_width"].
+        thermostat (Langevin or NoseHooverChain): Thermostat of run_thermostat, created at its first use (chain length params["nhc_length"]).
+        constraints (Constraints): SHAKE/RATTLE solver of the bonds when params["constrain_bonds"] (default True), None without bonds or for flexible bonds of stiffness params["bond_stiffness"].
+        reorder_every (int): Sort the atoms along a Morton curve every reorder_every steps (params["reorder_every"]), 0 to never reorder them.
+        profiler (Profiler): Hot-path timers and counters, enabled by params["enable_profiling"].
+        snapshot (FrameBuffer): Double-buffered latest positions in atom ID order, published after each step for the viewer.
+        step_count (int): Number of steps (minimisation, equilibration or production) done by the engine.
+        observables (Observables): Global observables of the last recorded step, computed in one fused pass.
+        analyses (dict): Analysis stages (e.g. RDFAccumulator) run at the end of the steps they want.
     
     Methods:
         __init__(params, recorder):
@@ -20,9 +47,33 @@ class Engine():
     
         add_atoms(n, type):
             Adds a specified number of atoms of a given type to the system.
+
+        load_atoms(configuration):
+            Builds the system in bulk from a configuration read by assets.loaders (XYZ, extended XYZ or NPZ file), with its bonds if any.
+
+        set_bonds(bonds, lengths):
+            Sets the bonded topology, rigid (SHAKE/RATTLE) or flexible (harmonic) depending on params["constrain_bonds"].
+
+        set_frozen(frozen):
+            Freezes the atoms flagged in atom ID order: they keep their positions, and the pairs of two frozen atoms are not evaluated.
     
         run_once(dt):
             Executes a single time step of the simulation.
+
+        run_respa(dt, k):
+            Executes one RESPA step: k inner steps of dt with the short-range forces, the long-range forces once.
+
+        run_thermostat(dt, name, T_target, tau):
+            Executes one step with a thermostat fused into the integrator, "langevin" (BAOAB) or "nose_hoover" (chain).
+
+        flush_thermostat():
+            Applies the pending half step of the Nosé-Hoover chain to the velocities, at the end of a phase or before another integrator.
+
+        set_params(changes):
+            Applies parameter changes between two steps of a running simulation, rescaling the box if params["boxsize"] changes.
+
+        rescale_box(boxsize):
+            Scales the box and the positions (the molecule centres with bonds) to a new box size, and rebuilds what depends on the box. Raises ValueError, before any change, for a box under twice the cutoff, or under 3 cutoffs with the cells backend in use. The unwrapped positions are scaled too and the per-atom frames of the recorder restart.
     
         set_init_pos(n):
             Sets the initial positions of the atoms randomly within the defined box size.
@@ -30,17 +81,26 @@ class Engine():
         minimize_step(dt, conv_crit):
             Performs a minimization step to reduce forces acting on the atoms.
     
-        equilibrate_step(step, dt, T_target, tau):
-            Equilibrates the system by adjusting velocities based on the target temperature.
+        equilibrate_step(step, dt, T_target, tau, respa_k, thermostat):
+            Equilibrates the system by adjusting velocities based on the target temperature, with the Berendsen thermostat or run_thermostat.
     
         calc_kinetic_ene():
             Computes and returns the total kinetic energy of the system.
     
         calc_LJ():
             Calculates the Lennard-Jones forces and potential between all atoms.
+
+        calc_table():
+            Calculates the forces and potential of any tabulated pair potential, by blocks of atoms.
+
+        calc_cells():
+            Calculates the forces and potential of any tabulated pair potential, with a cell list.
     
         calc_forces():
-            Updates the forces acting on the atoms based on the Lennard-Jones potential.
+            Updates the forces acting on the atoms with the kernel selected in FORCE_BACKENDS.
+
+        tune_backend():
+            Selects the fastest force kernel for the workload with params["force_backend"] = "auto", from the on-disk cache when it is known.
     
         calc_total_ene():
             Calculates the total energy of the system, combining kinetic and potential energies.
@@ -50,6 +110,12 @@ class Engine():
     
         compute_temperature():
             Computes the temperature of the system based on the kinetic energy.
+
+        update_observables():
+            Computes kinetic/total energy, temperature, norms and virial pressure in one pass.
+
+        add_analysis(name, stage):
+            Registers an analysis stage, updated at the end of each step it wants.
     
         update_acc():
             Updates the accelerations of the atoms.
@@ -59,21 +125,138 @@ class Engine():
     
         update_pos(dt):
             Updates the positions of the atoms based on their velocities and accelerations.
+
+        wrap_positions():
+            Wraps the positions into the periodic box and counts the crossings in system.images.
+
+        reorder_atoms():
+            Sorts all the per-atom arrays along a Morton curve, so that atoms close in space are close in memory, the mobile atoms first.
+
+        get_stats():
+            Returns the profiler timings and counters (force, integration, record, render...).
     """
+    # Force kernels selectable through params["force_backend"]
+    # "dense" (calc_LJ) is the reference every other backend is checked against
+    FORCE_BACKENDS = {
+        "dense": "calc_LJ",
+        "table": "calc_table",
+        "cells": "calc_cells",
+    }
+    choices.check_table(choices.FORCE_BACKENDS, FORCE_BACKENDS, "Engine.FORCE_BACKENDS")
+
     def __init__(self, params, recorder):
         self.system = System()
         self.params = params
         self.recorder = recorder
 
-        n_atoms = self.params["n_atoms"]
-        self.add_atoms(n=n_atoms, type="C")
+        # A configuration file replaces the random placement, and gives the
+        # number of atoms and possibly the box size
+        init_file = self.params.get("init_file")
+        configuration = load_configuration(init_file) if init_file else None
+        if configuration is not None and configuration["boxsize"]:
+            self.params["boxsize"] = configuration["boxsize"]
+
+        self.force_backend = self.params.get("force_backend", "dense")
+        self.autotuner = None
+        if self.force_backend == "auto":
+            # Cell list until the first tune_backend
+            self.force_backend = "cells"
+            self.autotuner = AutoTuner(self, self.params.get("autotune_cache"))
+        if self.force_backend not in self.FORCE_BACKENDS:
+            raise ValueError(f"{self.force_backend} not in FORCE_BACKENDS")
+
+        self.potential = self.make_potential()
+        if self.force_backend == "dense" and self.potential.name != "LJ":
+            raise ValueError("The dense backend only computes Lennard-Jones, "
+                             "use a tabulated backend for other potentials")
+        self.pair_table = PairTable(self.potential,
+                                    self.params.get("table_points", 8192))
+        self.cell_list = CellList(self.params["boxsize"], self.potential.cutoff,
+                                  self.params.get("cell_side"))
+        self.reorder_every = self.params.get("reorder_every", 0)
+        self.respa = None
+        self.thermostat = None
+        self.constraints = None
+
+        self.profiler = Profiler(self.params.get("enable_profiling", False))
+        self.snapshot = FrameBuffer()
+        self.step_count = 0
+        self.observables = None
+        self.analyses = {}
+        self._keep_pairs = False
+
+        if configuration is not None:
+            self.load_atoms(configuration)
+        else:
+            n_atoms = self.params["n_atoms"]
+            self.add_atoms(n=n_atoms, type="C")
+
+        # Initial frame, visible before the first step
+        self.snapshot.publish(self.system.positions, self.step_count)
 
     def add_atoms(self, n, type):
         positions = self.set_init_pos(n)
         for i in range(n):
             self.system.add_atom(Atom(type, positions[i]))
 
+    def load_atoms(self, configuration):
+        self.system = System.from_arrays(configuration["species"],
+                                         configuration["positions"],
+                                         configuration["velocities"])
+        self.params["n_atoms"] = len(self.system.masses)
+        self.wrap_positions()
+        logging.info(f"{self.params['n_atoms']} atoms loaded")
+
+        # Frozen first: the constraints are built for the mobile atoms
+        if configuration.get("frozen") is not None and np.any(configuration["frozen"]):
+            self.set_frozen(configuration["frozen"])
+        if configuration.get("bonds") is not None and len(configuration["bonds"]):
+            self.set_bonds(configuration["bonds"], configuration.get("bond_lengths"))
+
+    def set_bonds(self, bonds, lengths=None):
+        # Bonds are atom ID pairs, their lengths those of the configuration if not given
+        system = self.system
+        system.bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+        system._bond_rows = None
+        if lengths is None:
+            lengths = measure_bonds(system.by_id(system.positions), system.bonds,
+                                    self.params["boxsize"])
+        system.bond_lengths = np.asarray(lengths, dtype=float)
+
+        if self.params.get("constrain_bonds", True):
+            if (~system.by_id(system.mobile))[system.bonds].all(axis=1).any():
+                raise ValueError("A bond between two frozen atoms cannot be constrained")
+            system.n_constraints = len(system.bonds)
+            self.constraints = Constraints(self, self.params.get("shake_tolerance", 1e-8))
+        else:
+            system.n_constraints = 0
+            self.constraints = None
+        logging.info(f"{len(system.bonds)} bonds, "
+                     f"{'rigid' if self.constraints is not None else 'flexible'}")
+
+    def set_frozen(self, frozen):
+        # Flags in atom ID order, like the bonds
+        system = self.system
+        frozen = np.asarray(frozen, dtype=bool).reshape(-1)
+        if len(frozen) != len(system.masses):
+            raise ValueError(f"{len(frozen)} frozen flags for {len(system.masses)} atoms")
+        if self.constraints is not None and frozen[system.bonds].all(axis=1).any():
+            raise ValueError("A bond between two frozen atoms cannot be constrained")
+        system.mobile = ~frozen[system.ids]
+
+        # At rest for good, and in the last rows
+        still = ~system.mobile
+        system.velocities[still] = 0.0
+        system.accelerations[still] = 0.0
+        system.forces[still] = 0.0
+        if still.any():
+            system.reorder(np.argsort(still, kind="stable"))
+        if self.constraints is not None:
+            self.constraints = Constraints(self, self.constraints.tolerance)
+        logging.info(f"{int(still.sum())} frozen atoms")
+
     def run_once(self, dt):
+        self.flush_thermostat()
 
         # 1) Compute forces at t
         self.calc_forces()
@@ -96,12 +279,182 @@ class Engine():
 
         # Record energies
         # self = engine
-        self.recorder.record(self)
+        self._record()
+
+        self._end_step()
+
+    def run_respa(self, dt, k):
+        self.flush_thermostat()
+        # Outer step of k * dt, the long-range forces are evaluated once
+        self.get_respa().step(dt, k)
+
+        self._record()
+
+        self._end_step()
+
+    def get_respa(self):
+        if len(self.system.bonds):
+            raise ValueError("RESPA only splits the pair potential, it does not run with bonds")
+        if not self.system.mobile.all():
+            raise ValueError("RESPA does not run with frozen atoms")
+        if self.force_backend == "dense" and not self.params.get("cutoff"):
+            # The split tables are cut at the potential cutoff, the dense kernel is not
+            raise ValueError("RESPA needs the cutoff of the force kernel: "
+                             "set a cutoff or use a tabulated backend")
+        if self.respa is None:
+            self.respa = Respa(self,
+                               self.params.get("respa_split", 2.0),
+                               self.params.get("respa_width", 0.5))
+        return self.respa
+
+    def run_thermostat(self, dt, name, T_target, tau):
+        thermostat = self.get_thermostat(name, T_target, tau)
+        thermostat.step(dt)
+
+        record = self.recorder.wants(self.step_count)
+        if record:
+            with self.profiler.section("observables"):
+                self.update_observables()
+
+        # The chain needs the kinetic energy, one reduction shared with the observables
+        if isinstance(thermostat, NoseHooverChain):
+            thermostat.couple(self.observables.kinetic_ene if record
+                              else self.calc_kinetic_ene())
+
+        if record:
+            with self.profiler.section("record"):
+                self.recorder.record(self)
+
+        self._end_step()
+
+    def get_thermostat(self, name, T_target, tau):
+        if self.thermostat is None or self.thermostat.name != name:
+            self.flush_thermostat()
+            if name == "langevin":
+                self.thermostat = Langevin(self, T_target, tau)
+            elif name == "nose_hoover":
+                self.thermostat = NoseHooverChain(self, T_target, tau,
+                                                  self.params.get("nhc_length", 3))
+            else:
+                raise ValueError(f"Unknown thermostat {name}")
+        self.thermostat.T = T_target
+        self.thermostat.tau = tau
+        return self.thermostat
+
+    def flush_thermostat(self):
+        # The chain leaves the trailing half step of its last step pending
+        if isinstance(self.thermostat, NoseHooverChain):
+            self.thermostat.flush()
+
+    def _record(self):
+        # Observables are only computed on the steps the recorder keeps
+        if not self.recorder.wants(self.step_count):
+            return
+
+        with self.profiler.section("observables"):
+            self.update_observables()
+
+        with self.profiler.section("record"):
+            self.recorder.record(self)
+
+    def _end_step(self):
+        self.step_count += 1
+        self.profiler.step()
+
+        # Latest frame for the viewer, independent of what the recorder keeps
+        self.snapshot.publish(self.system.by_id(self.system.positions), self.step_count)
+
+        for stage in self.analyses.values():
+            if stage.wants(self.step_count):
+                with self.profiler.section("analysis"):
+                    stage.update(self)
+
+        # After the analyses, which may reuse the pair distances of this step
+        if self.reorder_every and self.step_count % self.reorder_every == 0:
+            with self.profiler.section("reorder"):
+                self.reorder_atoms()
+
+    def add_analysis(self, name, stage):
+        self.analyses[name] = stage
+
+    # ----------------------
+    #  Steering
+    # ----------------------
+
+    def set_params(self, changes):
+        # dt, temperature and tau are read at each step, only the box needs work
+        changes = dict(changes)
+        boxsize = changes.pop("boxsize", self.params["boxsize"])
+        if boxsize != self.params["boxsize"]:
+            self.rescale_box(boxsize)
+        self.params.update(changes)
+
+    def rescale_box(self, boxsize):
+        # Checked before anything moves, the run goes on in the old box
+        cutoff = self.potential.cutoff
+        if boxsize < 2 * cutoff:
+            raise ValueError(f"The box must be at least twice the cutoff ({cutoff}) wide")
+        if self.force_backend == "cells" and boxsize // cutoff < 3:
+            raise ValueError(f"The cells backend needs a box of at least 3 cutoffs ({3 * cutoff})")
+
+        system = self.system
+        scale = boxsize / self.params["boxsize"]
+
+        with self.profiler.section("integration"):
+            if len(system.bonds):
+                # Whole molecules move with their centre, the bonds keep their lengths
+                system.positions += (scale - 1) * self._molecule_centres()
+            else:
+                system.positions *= scale
+            self.params["boxsize"] = boxsize
+            self.wrap_positions()
+
+        # The image counts are kept: the unwrapped positions are scaled with the box
+        # (the molecule centres with bonds), frames of the old box unwrap with another
+        # box size, so the per-atom frames and what derives from them (MSD) restart
+        self.recorder.reset_frames()
+
+        # Neighbour structures cut for the old box
+        self.cell_list = CellList(boxsize, self.potential.cutoff, self.params.get("cell_side"))
+        self.respa = None
+        for stage in self.analyses.values():
+            if hasattr(stage, "set_box"):
+                stage.set_box(boxsize)
+
+        # The density changed, and with it possibly the fastest kernel
+        self.tune_backend()
+
+        # Forces of the new positions, for the integrators that start from the last ones
+        self.calc_forces()
+        self.update_acc()
+        self.snapshot.publish(system.by_id(system.positions), self.step_count)
+        logging.info(f"Box rescaled to {boxsize}")
+
+    def _molecule_centres(self):
+        # Centre of mass of the molecule of each row, from the minimum-image
+        # offsets of its atoms to one of them
+        system = self.system
+        box = self.params["boxsize"]
+        n = len(system.masses)
+        rows = np.empty_like(system.ids)
+        rows[system.ids] = np.arange(n)
+        root = rows[molecule_labels(system.bonds, n)[system.ids]]
+
+        d = system.positions - system.positions[root]
+        d -= box * np.round(d / box)
+        total = np.bincount(root, system.masses, minlength=n)[root]
+        centres = system.positions[root].copy()
+        for axis in range(2):
+            centres[:, axis] += np.bincount(root, system.masses * d[:, axis], minlength=n)[root] / total
+        return centres
 
     # ----------------------
     #  Initialisation
     # ----------------------
 
+    def make_potential(self):
+        return potential_from_params(self.params)
+
     def set_init_pos(self, n):
         return np.random.uniform(low=0,
                                  high=self.params["boxsize"],
@@ -121,6 +474,7 @@ class Engine():
     # ----------------------
 
     def minimize_step(self, dt, conv_crit):
+        self.flush_thermostat()
         # Calc atom forces
         self.calc_forces()
         F = self.system.forces # (N,2)
@@ -135,52 +489,89 @@ class Engine():
         # Avoid movement scales difference between atoms
         F_normalised = F / norm
 
-        # Update positions
-        self.system.positions += dt*F_normalised
+        with self.profiler.section("integration"):
+            old_positions = self.system.positions.copy() if self.constraints is not None else None
+
+            # Update positions
+            self.system.positions += dt*F_normalised
 
-        # Ensure periodicity
-        self.system.positions %= self.params["boxsize"]
+        # Bonds back to their lengths, the velocities are left alone
+        if self.constraints is not None:
+            self.constraints.shake(old_positions)
+
+        with self.profiler.section("integration"):
+            # Ensure periodicity
+            self.wrap_positions()
 
         # Record the atoms positions for visualisation
-        self.recorder.record(self)
+        self._record()
+
+        self._end_step()
 
         # Stop if converged upon criterion
         if np.max(norm) < conv_crit:
             logging.info("Minimisation converged!")
             return True
 
-    def equilibrate_step(self, step, dt, T_target, tau):
-        if step == 1:
-            self.calc_forces()
-            self.update_acc()
+    def equilibrate_step(self, step, dt, T_target, tau, respa_k=1, thermostat="berendsen"):
+        if thermostat != "berendsen":
+            if respa_k > 1:
+                raise ValueError("RESPA only runs with the Berendsen thermostat")
+            self.run_thermostat(dt, thermostat, T_target, tau)
+            return
 
-        # 1) Update positions
-        self.update_pos(dt)
+        self.flush_thermostat()
+        if respa_k > 1:
+            # One RESPA step, the thermostat then couples over its k * dt
+            self.get_respa().step(dt, respa_k)
+            dt = respa_k * dt
+        else:
+            if step == 1:
+                self.calc_forces()
+                self.update_acc()
 
-        # 2) Compute forces at new positions
-        self.calc_forces()
-        new_acc = self.system.forces / self.system.masses[:,None]
+            # 1) Update positions
+            self.update_pos(dt)
 
-        # 3) Update velocities
-        self.update_vel(new_acc, dt)
+            # 2) Compute forces at new positions
+            self.calc_forces()
+            new_acc = self.system.forces / self.system.masses[:,None]
 
-        # 4) Replace accelerations
-        self.system.accelerations = new_acc
+            # 3) Update velocities
+            self.update_vel(new_acc, dt)
+
+            # 4) Replace accelerations
+            self.system.accelerations = new_acc
 
         # ---- THERMOSTAT BERENDSEN ----
-        T = self.compute_temperature()
+        # On recorded steps the fused observables also give the temperature
+        record = self.recorder.wants(self.step_count)
+        if record:
+            with self.profiler.section("observables"):
+                T = self.update_observables().temperature
+        else:
+            T = self.compute_temperature()
 
         # Avoid division by zero if T = 0
         if T == 0:
+            self._end_step()
             return
 
         lambda_T = np.sqrt(1 + dt/tau * (T_target/T - 1))
 
         # Scale velocities
-        self.system.velocities *= lambda_T
+        with self.profiler.section("integration"):
+            self.system.velocities *= lambda_T
 
         # Record the atoms positions for visualisation
-        self.recorder.record(self)
+        if record:
+            self.observables.scale_velocities(lambda_T)
+            self.system.kinetic_ene = self.observables.kinetic_ene
+            self.system.total_ene = self.observables.total_ene
+            with self.profiler.section("record"):
+                self.recorder.record(self)
+
+        self._end_step()
 
     # ----------------------
     #  Calculs
@@ -188,28 +579,51 @@ class Engine():
 
     def calc_kinetic_ene(self):
         """Compute the total kinetic energy """
-        m = self.system.masses # (N,)
-        v2 = np.sum(self.system.velocities**2, axis=1) # (N,)
-        self.system.kinetic_ene = 0.5 * np.sum(m * v2)
+        self.system.kinetic_ene = kinetic_energy(self.system.masses,
+                                                 self.system.velocities)
         return self.system.kinetic_ene
 
     def calc_LJ(self):
         """
-        Lennard-Jones force and potential between all atoms.
+        Lennard-Jones force and potential between all atoms, but the pairs
+        of two frozen atoms.
         """
 
         sigma = 1.0      # size parameter
         epsilon = 1.0    # interaction strength
 
+        box = self.params["boxsize"]
+
+        # Rows of the mobile atoms only, against all the atoms
+        n = len(self.system.masses)
+        m = self.system.n_mobile()
+
         # Compute pairwise interactions
-        # Vector from atom i to atom j, shape (N,N,2)
-        r_vec = self.system.positions[:, None, :] - \
+        # Vector from atom i to atom j, shape (M,N,2)
+        r_vec = self.system.positions[:m, None, :] - \
                 self.system.positions[None, :, :]
 
+        # Minimum image convention: closest periodic copy of each atom
+        r_vec -= box * np.round(r_vec / box)
+
         # Distance between the two atoms (norm of the vector)
         r = np.linalg.norm(r_vec, axis = 2)
         r[r == 0] = np.inf
 
+        self.profiler.count("pair_evaluations", m * (n - 1))
+
+        # Optional cutoff, truncated like the tabulated potentials (no shift)
+        cutoff = self.params.get("cutoff")
+
+        # Reused by the analyses sampling this step (e.g. g(r)), all the pairs only
+        if self._keep_pairs and m == n:
+            self.system.pair_distances = r.copy() if cutoff else r
+        else:
+            self.system.pair_distances = None
+
+        if cutoff:
+            r[r >= cutoff] = np.inf
+
         # ----------------------------------------
         # 1) Lennard-Jones potential energy
         # ----------------------------------------
@@ -217,10 +631,13 @@ class Engine():
         sr12 = sr6 * sr6
 
         ene =  4 * epsilon * (sr12 - sr6)
-        # Potential energy for each atom
-        self.system.ene_pot_LJ = np.sum(ene, axis=1)
+        # Potential energy for each atom, the frozen ones from their mobile partners
+        energy = np.zeros(n)
+        energy[:m] = np.sum(ene, axis=1)
+        energy[m:] = np.sum(ene[:, m:], axis=0)
+        self.system.ene_pot_LJ = energy
         # Total potential energy
-        self.system.ene_pot_LJ_total = 0.5 * np.sum(ene)
+        self.system.ene_pot_LJ_total = 0.5 * np.sum(energy)
 
         # ----------------------------------------
         # 2) Lennard-Jones force magnitude
@@ -228,7 +645,12 @@ class Engine():
         # ----------------------------------------
         # Derivative of LJ potential:
         # F(r) = 24 * epsilon * (2*(sigma/r)^12 - (sigma/r)^6) / r
-        F = 24 * epsilon * (2*sr12 - sr6) / r
+        # r * F(r) is the pair virial, summed once per pair
+        pair_virial = 24 * epsilon * (2*sr12 - sr6)
+        # Mobile-frozen pairs are only seen once
+        self.system.virial = 0.5 * (np.sum(pair_virial) + np.sum(pair_virial[:, m:]))
+
+        F = pair_virial / r
         F = F[:, :, None]
 
         # Force vector (direction = unit vector of r_vec)
@@ -237,11 +659,113 @@ class Engine():
         # Equal and opposite forces
         # For each component of each atom, we sum the partial force
         # from all interactions (N, 2) # N atoms ; x, y components
-        return f_vec.sum(axis=1)
+        forces = np.zeros((n, 2))
+        forces[:m] = f_vec.sum(axis=1)
+        return forces
+
+    def calc_table(self):
+        """
+        Forces and potential of the tabulated pair potential, for all the
+        pairs within the cutoff, by blocks of atoms.
+        """
+        distances = self._pair_list()
+        forces, ene, ene_total, virial, n_pairs = table_forces(
+            self.system.positions,
+            self.params["boxsize"],
+            self.pair_table,
+            self.params.get("block_size", 1024),
+            self._frozen_from(),
+            distances,
+        )
+
+        self.system.ene_pot_LJ = ene
+        self.system.ene_pot_LJ_total = ene_total
+        self.system.virial = virial
+        self._keep_pair_list(distances)
+
+        self.profiler.count("pair_evaluations", n_pairs)
+        return forces
+
+    def calc_cells(self):
+        """
+        Forces and potential of the tabulated pair potential, for the pairs
+        of neighbouring cells only.
+        """
+        distances = self._pair_list()
+        forces, ene, ene_total, virial, n_pairs = cell_forces(
+            self.system.positions,
+            self.params["boxsize"],
+            self.pair_table,
+            self.cell_list,
+            self._frozen_from(),
+            distances,
+        )
+
+        self.system.ene_pot_LJ = ene
+        self.system.ene_pot_LJ_total = ene_total
+        self.system.virial = virial
+        self._keep_pair_list(distances)
+
+        # The cells are rebuilt at every evaluation
+        self.profiler.count("neighbour_rebuilds")
+        self.profiler.count("pair_evaluations", n_pairs)
+        return forces
+
+    def _pair_list(self):
+        # List filled by the tabulated kernels with the distances within the cutoff,
+        # when an analysis samples this step and all the pairs are evaluated
+        if self._keep_pairs and self._frozen_from() is None:
+            return []
+        return None
+
+    def _keep_pair_list(self, distances):
+        # Each pair once, only those within pair_cutoff
+        if distances is None:
+            self.system.pair_distances = None
+        else:
+            self.system.pair_distances = np.concatenate(distances) if distances else np.zeros(0)
+            self.system.pair_cutoff = self.pair_table.cutoff
+
+    def _frozen_from(self):
+        # First frozen row, None without frozen atoms
+        n_mobile = self.system.n_mobile()
+        return n_mobile if n_mobile < len(self.system.masses) else None
 
     def calc_forces(self):
-        # Compute Lennard-Jones forces
-        self.system.forces = self.calc_LJ()
+        # Compute Lennard-Jones forces with the selected backend
+        kernel = getattr(self, self.FORCE_BACKENDS[self.force_backend])
+
+        # Keep the pair distances if an analysis samples the coming step
+        self._keep_pairs = any(stage.wants(self.step_count + 1)
+                               for stage in self.analyses.values())
+
+        with self.profiler.section("force"):
+            self.system.forces = kernel()
+
+            # Flexible bonds add their springs to the pair forces
+            if len(self.system.bonds) and self.constraints is None:
+                self.add_bond_forces()
+
+            # Frozen atoms are held in place
+            frozen_from = self._frozen_from()
+            if frozen_from is not None:
+                self.system.forces[frozen_from:] = 0.0
+
+    def tune_backend(self):
+        # Only with params["force_backend"] = "auto"
+        if self.autotuner is not None:
+            with self.profiler.section("tuning"):
+                self.autotuner.tune()
+
+    def add_bond_forces(self):
+        system = self.system
+        forces, energy, total, virial = harmonic_bond_forces(
+            system.positions, system.bond_rows(), system.bond_lengths,
+            self.params.get("bond_stiffness", 500.0), self.params["boxsize"])
+        system.forces += forces
+        system.ene_pot_LJ = system.ene_pot_LJ + energy
+        system.ene_pot_LJ_total += total
+        system.virial += virial
 
     def calc_total_ene(self):
         K_ene = self.calc_kinetic_ene()
@@ -254,12 +778,18 @@ class Engine():
                                     self.system.masses[:, None]
 
     def compute_temperature(self):
-        v2 = np.sum(self.system.velocities**2, axis=1)
-        kinetic = 0.5 * np.sum(self.system.masses * v2)
-        N = len(self.system.masses)
-        dof = 2 * N    # 2D = 2 DOF per atom
+        kinetic = kinetic_energy(self.system.masses, self.system.velocities)
+        dof = self.system.n_dof()    # 2D = 2 DOF per atom, minus the constraints
         return kinetic / (0.5 * dof)
 
+    def update_observables(self):
+        self.observables = compute_observables(self.system,
+                                               self.params["boxsize"],
+                                               out=self.observables)
+        self.system.kinetic_ene = self.observables.kinetic_ene
+        self.system.total_ene = self.observables.total_ene
+        return self.observables
+
     # ----------------------
     #  Update positions / velocities
     # ----------------------
@@ -269,14 +799,58 @@ class Engine():
         self.system.masses[:,None]
 
     def update_vel(self, new_acc, dt):
-        self.system.velocities += 0.5 * (
-            self.system.accelerations + new_acc
-        ) * dt
+        with self.profiler.section("integration"):
+            # Mobile rows only, the frozen atoms are the last ones
+            m = self.system.n_mobile()
+            self.system.velocities[:m] += 0.5 * (
+                self.system.accelerations[:m] + new_acc[:m]
+            ) * dt
+
+        # Velocities tangent to the rigid bonds
+        if self.constraints is not None:
+            self.constraints.rattle(dt)
 
     def update_pos(self, dt):
-        self.system.positions += (
-            self.system.velocities * dt + \
-            0.5 * self.system.accelerations * dt * dt
-        )
+        with self.profiler.section("integration"):
+            old_positions = self.system.positions.copy() if self.constraints is not None else None
+
+            m = self.system.n_mobile()
+            self.system.positions[:m] += (
+                self.system.velocities[:m] * dt + \
+                0.5 * self.system.accelerations[:m] * dt * dt
+            )
+
+        # Rigid bonds back to their lengths, with the half kick of the constraint forces
+        if self.constraints is not None:
+            self.constraints.shake(old_positions, dt)
+
+        with self.profiler.section("integration"):
+            self.wrap_positions()
+
+    def wrap_positions(self):
+        # Same as positions %= boxsize, counting the crossings for unwrapping
+        box = self.params["boxsize"]
+        shift = np.floor(self.system.positions / box)
+        self.system.positions -= box * shift
+        self.system.images += shift.astype(np.int64)
+
+        # Pair distances of the previous positions are stale
+        self.system.pair_distances = None
+
+    def reorder_atoms(self):
+        # Atoms drift apart in memory as they move: sort them back along the
+        # Morton curve, the atom IDs keep track of the permutation
+        order = morton_order(self.system.positions, self.params["boxsize"])
+        # Stable partition, the mobile atoms first in Morton order
+        mobile = self.system.mobile
+        if not mobile.all():
+            order = order[np.argsort(~mobile[order], kind="stable")]
+        self.system.reorder(order)
+        self.profiler.count("reorders")
+
+    # ----------------------
+    #  Profiling
+    # ----------------------
 
-        self.system.positions %= self.params["boxsize"]
\ No newline at end of file
+    def get_stats(self):
+        return self.profiler.stats()
\ No newline at end of file
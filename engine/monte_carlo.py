@@ -0,0 +1,198 @@
+import numpy as np # type: ignore
+from engine.cell_list import CellList
+
+
+class MonteCarlo():
+    """Metropolis Monte Carlo sampling of the positions of an Engine's System, with single-atom displacements.
+
+    The energy change of a trial move only involves the moved atom and its neighbours: it is computed from the atoms of the 3x3 cells around it, through the same PairTable as the tabulated force backends (so with the potential cutoff), and the total energy is updated incrementally. The dense backend must then have the same explicit cutoff, so that MC and MD sample the same potential.
+    Moves are made in parallel with a checkerboard of cells: the cells of one colour of a 2x2 colouring are at least one cell (one cutoff) apart, so one atom of each of them can be moved at the same time without interacting with another moved atom. Moves leaving their cell are rejected, and the grid is randomly shifted before each pass, which keeps detailed balance.
+    The maximum displacement is tuned after each sweep towards the target acceptance ratio, so the sampling is meant for equilibration.
+
+    Attributes:
+        engine (Engine): The engine whose System, pair table, recorder and profiler are used.
+        target_acceptance (float): Acceptance ratio targeted by the step size tuning.
+        max_step (float): Maximum displacement along each axis of a trial move.
+        cells (CellList): Checkerboard cells, an even number of cells per side, None for boxes smaller than 4 cutoffs (moves are then sequential).
+        n_trials (int): Number of trial moves since the creation.
+        n_accepted (int): Number of accepted moves since the creation.
+        acceptance (float): Acceptance ratio of the last sweep.
+
+    Methods:
+        sweep(T): Makes about one trial move per atom at temperature T, then records and ends the step like an Engine step.
+        draw_velocities(T): Draws Maxwell-Boltzmann velocities at temperature T, without net momentum.
+        reset_cells(): Rebuilds the checkerboard and the total energy, after a rescaling of the box.
+    """
+    def __init__(self, engine, T, target_acceptance=0.5, max_step=0.1, seed=None):
+        if len(engine.system.bonds):
+            raise ValueError("Single-atom Monte Carlo moves do not handle bonds")
+        if not engine.system.mobile.all():
+            raise ValueError("Single-atom Monte Carlo moves do not handle frozen atoms")
+        if engine.force_backend == "dense" and not engine.params.get("cutoff"):
+            # The moves see the table cut at the potential cutoff, the dense kernel no cutoff
+            raise ValueError("Monte Carlo needs the cutoff of the force kernel: "
+                             "set a cutoff or use a tabulated backend")
+        self.engine = engine
+        self.target_acceptance = target_acceptance
+        self.max_step = max_step
+        self.rng = np.random.default_rng(seed)
+
+        self.n_trials = 0
+        self.n_accepted = 0
+        self.acceptance = 0.0
+
+        self.reset_cells()
+        self.draw_velocities(T)
+
+    def reset_cells(self):
+        engine = self.engine
+        box = engine.params["boxsize"]
+        table = engine.pair_table
+
+        # Even number of cells for the 2x2 colouring, at least 4 for distinct neighbours
+        n_side = 2 * int(box // table.cutoff // 2)
+        self.cells = CellList(box, table.cutoff, n_side) if n_side >= 4 else None
+        if self.cells is not None:
+            n = self.cells.n_side
+            cx, cy = np.divmod(np.arange(self.cells.n_cells), n)
+            self.around = np.stack([((cx + dx) % n) * n + (cy + dy) % n
+                                    for dx in (-1, 0, 1) for dy in (-1, 0, 1)], axis=1)
+            self.colours = [np.flatnonzero((cx % 2 == a) & (cy % 2 == b))
+                            for a in (0, 1) for b in (0, 1)]
+
+        # Full evaluation once, then incremental updates
+        engine.calc_forces()
+        self.energy = engine.system.ene_pot_LJ_total
+
+    def draw_velocities(self, T):
+        # Positions and momenta are independent in the canonical ensemble
+        system = self.engine.system
+        sigma = np.sqrt(T / system.masses)[:, None]
+        velocities = self.rng.normal(size=system.velocities.shape) * sigma
+        momentum = (system.masses[:, None] * velocities).sum(axis=0)
+        velocities -= momentum / system.masses.sum()
+        system.velocities = velocities
+
+    # ----------------------
+    #  Trial moves
+    # ----------------------
+
+    def _energies(self, x, neighbours, valid):
+        # Energy of atoms at x with their neighbours, (A, 2) and (A, K)
+        box = self.engine.params["boxsize"]
+        table = self.engine.pair_table
+
+        d = x[:, None, :] - self.engine.system.positions[neighbours]
+        d -= box * np.round(d / box)
+        s = np.einsum("akj,akj->ak", d, d)
+
+        mask = valid & (s < table.s_max)
+        energy = np.zeros_like(s)
+        energy[mask] = table.evaluate(s[mask])[0]
+        return energy.sum(axis=1)
+
+    def _metropolis(self, atoms, new, neighbours, valid, T, inside=True):
+        old = self.engine.system.positions[atoms]
+        dE = self._energies(new, neighbours, valid) - self._energies(old, neighbours, valid)
+
+        if T > 0:
+            accept = self.rng.random(len(atoms)) < np.exp(np.minimum(-dE / T, 0.0))
+        else:
+            accept = dE <= 0
+        accept &= inside
+
+        self.engine.system.positions[atoms[accept]] = new[accept]
+        self.energy += dE[accept].sum()
+        return int(accept.sum())
+
+    def _checkerboard_pass(self, T):
+        system = self.engine.system
+        box = self.engine.params["boxsize"]
+        cells = self.cells
+
+        # Random grid origin, atoms binned in the shifted frame
+        origin = self.rng.uniform(0, box / cells.n_side, size=2)
+        shifted = (system.positions - origin) % box
+        slots = cells.build(shifted)
+        counts = cells.counts()
+
+        # One random atom in each occupied cell of one colour
+        colour = self.colours[self.rng.integers(len(self.colours))]
+        colour = colour[counts[colour] > 0]
+        rank = (self.rng.random(len(colour)) * counts[colour]).astype(np.intp)
+        atoms = slots[colour, rank]
+
+        neighbours = slots[self.around[colour]].reshape(len(colour), -1)
+        valid = (neighbours >= 0) & (neighbours != atoms[:, None])
+        neighbours = np.where(valid, neighbours, 0)
+
+        step = self.rng.uniform(-self.max_step, self.max_step, size=(len(atoms), 2))
+        new = system.positions[atoms] + step
+
+        # Moves leaving their cell are rejected
+        new_shifted = shifted[atoms] + step
+        cell_size = box / cells.n_side
+        inside = np.all(np.floor(new_shifted / cell_size) ==
+                        np.floor(shifted[atoms] / cell_size), axis=1)
+
+        accepted = self._metropolis(atoms, new, neighbours, valid, T, inside)
+        return len(atoms), accepted
+
+    def _sequential_pass(self, T):
+        # Small boxes: one atom against all the others
+        system = self.engine.system
+        n = len(system.masses)
+        atom = self.rng.integers(n, size=1)
+        neighbours = np.arange(n)[None, :]
+        valid = neighbours != atom[:, None]
+
+        step = self.rng.uniform(-self.max_step, self.max_step, size=(1, 2))
+        new = system.positions[atom] + step
+        return 1, self._metropolis(atom, new, neighbours, valid, T)
+
+    def _tune(self):
+        # Larger steps if too many moves are accepted, smaller otherwise
+        ratio = self.acceptance / self.target_acceptance
+        self.max_step *= np.clip(ratio, 0.8, 1.25)
+
+        box = self.engine.params["boxsize"]
+        largest = 0.5 * box / self.cells.n_side if self.cells is not None else 0.5 * box
+        self.max_step = float(np.clip(self.max_step, 1e-5, largest))
+
+    # ----------------------
+    #  Sweep
+    # ----------------------
+
+    def sweep(self, T):
+        engine = self.engine
+        n = len(engine.system.masses)
+
+        engine.flush_thermostat()
+        trials, accepted = 0, 0
+        with engine.profiler.section("monte_carlo"):
+            while trials < n:
+                if self.cells is not None:
+                    t, a = self._checkerboard_pass(T)
+                else:
+                    t, a = self._sequential_pass(T)
+                trials += t
+                accepted += a
+
+            # Moved atoms may have left the box
+            engine.wrap_positions()
+
+        self.n_trials += trials
+        self.n_accepted += accepted
+        self.acceptance = accepted / max(trials, 1)
+        self._tune()
+
+        if engine.recorder.wants(engine.step_count):
+            # Exact energies, forces and virial for the recorded observables
+            engine.calc_forces()
+            self.energy = engine.system.ene_pot_LJ_total
+            engine._record()
+        else:
+            engine.system.ene_pot_LJ_total = self.energy
+
+        engine._end_step()
+        return self.acceptance
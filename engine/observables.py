@@ -0,0 +1,85 @@
+import numpy as np # type: ignore
+
+
+def kinetic_energy(masses, velocities):
+    """Total kinetic energy 0.5 * sum(m v^2), without (N, 2) temporaries."""
+    v2 = np.einsum("ij,ij->i", velocities, velocities) # (N,)
+    return 0.5 * np.dot(masses, v2)
+
+
+class Observables():
+    """Class holding the global observables of one step, filled by compute_observables().
+
+    Temperature uses kB = 1 and the degrees of freedom of System.n_dof (2 per atom minus the constraints), as Engine.compute_temperature. The pressure is the 2D virial pressure P = (n_dof T / 2 + W / 2) / A, where W is the pair virial sum(r_ij . f_ij) accumulated by the force kernel (and the constraints).
+
+    Attributes:
+        kinetic_ene (float): Total kinetic energy.
+        temperature (float): Instantaneous temperature.
+        potential_ene (float): Total potential energy.
+        total_ene (float): Kinetic plus potential energy.
+        force_norm_total (float): Sum of the force norms of all atoms.
+        acc_norm_total (float): Sum of the acceleration norms of all atoms.
+        vel_norm_total (float): Sum of the velocity norms of all atoms.
+        virial (float): Pair virial W from the force kernel.
+        pressure (float): Virial pressure.
+        n_dof (int): Number of degrees of freedom used for the temperature.
+        area (float): Area of the periodic box.
+
+    Methods:
+        scale_velocities(factor): Updates the velocity-dependent observables after velocities were multiplied by factor.
+    """
+    def __init__(self):
+        self.kinetic_ene = 0.0
+        self.temperature = 0.0
+        self.potential_ene = 0.0
+        self.total_ene = 0.0
+        self.force_norm_total = 0.0
+        self.acc_norm_total = 0.0
+        self.vel_norm_total = 0.0
+        self.virial = 0.0
+        self.pressure = 0.0
+        self.n_dof = 0
+        self.area = 1.0
+
+    def scale_velocities(self, factor):
+        # Avoids a second pass over the velocities after a thermostat rescaling
+        self.kinetic_ene *= factor * factor
+        self.vel_norm_total *= abs(factor)
+        self._derive()
+
+    def _derive(self):
+        self.temperature = self.kinetic_ene / (0.5 * self.n_dof) if self.n_dof else 0.0
+        self.total_ene = self.kinetic_ene + self.potential_ene
+        self.pressure = (0.5 * self.n_dof * self.temperature + 0.5 * self.virial) / self.area
+
+
+def compute_observables(system, boxsize, out=None):
+    """Compute every global observable of the system in one pass over each per-atom array.
+
+    Args:
+        system (System): The system of atoms, after the force kernel has run.
+        boxsize (float): Side of the periodic box.
+        out (Observables, optional): Instance to fill instead of creating a new one.
+
+    Returns:
+        Observables: The filled observables.
+    """
+    obs = out if out is not None else Observables()
+
+    # Squared norms per atom, each array is read once
+    v2 = np.einsum("ij,ij->i", system.velocities, system.velocities)
+    f2 = np.einsum("ij,ij->i", system.forces, system.forces)
+    a2 = np.einsum("ij,ij->i", system.accelerations, system.accelerations)
+
+    obs.kinetic_ene = 0.5 * np.dot(system.masses, v2)
+    obs.vel_norm_total = np.sqrt(v2).sum()
+    obs.force_norm_total = np.sqrt(f2).sum()
+    obs.acc_norm_total = np.sqrt(a2).sum()
+
+    obs.potential_ene = system.ene_pot_LJ_total
+    obs.virial = system.virial
+    obs.n_dof = system.n_dof()
+    obs.area = boxsize * boxsize
+    obs._derive()
+
+    return obs
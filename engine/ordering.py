@@ -0,0 +1,32 @@
+import numpy as np # type: ignore
+
+
+def _spread_bits(x):
+    # Inserts a 0 bit between each of the 16 low bits of x
+    x = x & 0x0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+    return x
+
+
+def morton_codes(positions, boxsize, bits=16):
+    """Z-order (Morton) code of each position, on a grid of 2^bits cells per side.
+
+    The bits of the x and y cell indices are interleaved, so atoms close in space get close codes.
+
+    Returns:
+        numpy.ndarray: uint64 array of shape (N,).
+    """
+    bits = min(bits, 16)
+    side = 1 << bits
+    cells = (positions * (side / boxsize)).astype(np.int64)
+    np.clip(cells, 0, side - 1, out=cells)
+    cells = cells.astype(np.uint64)
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1))
+
+
+def morton_order(positions, boxsize, bits=16):
+    """Permutation sorting the atoms along the Morton curve, for System.reorder()."""
+    return np.argsort(morton_codes(positions, boxsize, bits), kind="stable")
@@ -0,0 +1,135 @@
+import numpy as np # type: ignore
+
+
+class PairTable():
+    """Pair potential sampled once on a grid in s = r^2, evaluated by cubic Hermite interpolation.
+
+    Two quantities are tabulated: the energy V and F(r)/r, so that the force on atom i from atom j is simply (F/r)(s) * r_ij, without square roots or divisions per pair. Every potential then costs the same to evaluate.
+    Each interval holds the 4 coefficients of both cubics in one row, so an evaluation is a single gather followed by two Horner schemes.
+    Pairs closer than r_min are clamped to the values at r_min; pairs beyond the cutoff must be filtered out by the caller.
+
+    Attributes:
+        potential (PairPotential): The tabulated potential.
+        cutoff (float): Cutoff distance of the potential.
+        s_min (float): r_min^2, start of the grid.
+        s_max (float): cutoff^2, end of the grid.
+        n_points (int): Number of grid points.
+        coefficients (numpy.ndarray): Array of shape (n_points - 1, 8) with the cubic coefficients of V and F/r on each interval.
+
+    Methods:
+        evaluate(s): Returns V and F/r for an array of squared distances.
+    """
+    def __init__(self, potential, n_points=8192):
+        self.potential = potential
+        self.cutoff = potential.cutoff
+        self.n_points = n_points
+
+        self.s_min = potential.r_min ** 2
+        self.s_max = potential.cutoff ** 2
+        self.ds = (self.s_max - self.s_min) / (n_points - 1)
+        self.inv_ds = 1.0 / self.ds
+
+        s = np.linspace(self.s_min, self.s_max, n_points)
+        r = np.sqrt(s)
+
+        # Values and derivatives with respect to s at the grid points
+        # dV/ds = dV/dr / (2 r) = -(F/r) / 2
+        energy = self._energy(r)
+        fr = self._force(r) / r
+        d_energy = -0.5 * fr
+
+        # d(F/r)/ds by central differences, relative step
+        h = 1e-6 * s
+        fr_plus = self._force(np.sqrt(s + h)) / np.sqrt(s + h)
+        fr_minus = self._force(np.sqrt(s - h)) / np.sqrt(s - h)
+        d_fr = (fr_plus - fr_minus) / (2 * h)
+
+        self.coefficients = np.hstack([
+            self._hermite(energy, d_energy),
+            self._hermite(fr, d_fr),
+        ])
+
+    def _energy(self, r):
+        e = self.potential.energy(r)
+        if self.potential.shift:
+            e = e - self.potential.energy(np.array(self.cutoff))
+        return e
+
+    def _force(self, r):
+        return self.potential.force(r)
+
+    def _hermite(self, y, dy):
+        # Cubic y0 + c1 t + c2 t^2 + c3 t^3 on each interval, t in [0, 1]
+        y0, y1 = y[:-1], y[1:]
+        m0, m1 = dy[:-1] * self.ds, dy[1:] * self.ds
+        return np.stack([
+            y0,
+            m0,
+            3 * (y1 - y0) - 2 * m0 - m1,
+            2 * (y0 - y1) + m0 + m1,
+        ], axis=1)
+
+    def evaluate(self, s):
+        x = (s - self.s_min) * self.inv_ds
+        np.clip(x, 0.0, self.n_points - 1.000001, out=x)
+        k = x.astype(np.intp)
+        t = x - k
+
+        c = self.coefficients[k] # (M, 8), one gather
+        energy = ((c[:, 3] * t + c[:, 2]) * t + c[:, 1]) * t + c[:, 0]
+        fr = ((c[:, 7] * t + c[:, 6]) * t + c[:, 5]) * t + c[:, 4]
+        return energy, fr
+
+
+def table_forces(positions, boxsize, table, block_size=1024, n_mobile=None, distances=None):
+    """Forces, energies and virial of all pairs within the cutoff, evaluated through a PairTable.
+
+    Rows are processed in blocks of block_size atoms, so the memory is O(block_size * N) instead of O(N^2). Distances use the minimum image convention.
+    With n_mobile, the rows from n_mobile on are frozen atoms: only the mobile rows are evaluated, against all the atoms, so the pairs of two frozen atoms are skipped. The frozen atoms get the energy of their pairs with mobile atoms, and no force.
+    With a distances list, the distances of the evaluated pairs within the cutoff are appended to it, each pair once.
+
+    Returns:
+        tuple: forces (N, 2), per-atom energy (N,), total energy, virial and number of evaluated pairs.
+    """
+    n = len(positions)
+    m = n if n_mobile is None else n_mobile
+    forces = np.zeros((n, 2))
+    energy = np.zeros(n)
+    virial = 0.0
+    n_pairs = 0
+
+    for start in range(0, m, block_size):
+        stop = min(start + block_size, m)
+
+        # Vector from atom i to atom j, minimum image
+        d = positions[start:stop, None, :] - positions[None, :, :]
+        d -= boxsize * np.round(d / boxsize)
+        s = np.einsum("ijk,ijk->ij", d, d)
+
+        # Within the cutoff, excluding the atom itself (s = 0)
+        mask = (s < table.s_max) & (s > 0)
+        e_pairs, fr_pairs = table.evaluate(s[mask])
+        n_pairs += len(e_pairs)
+
+        fr = np.zeros_like(s)
+        fr[mask] = fr_pairs
+        e = np.zeros_like(s)
+        e[mask] = e_pairs
+
+        forces[start:stop] = np.einsum("ij,ijk->ik", fr, d)
+        energy[start:stop] = e.sum(axis=1)
+        # r . f = (F/r) r^2
+        virial += np.dot(fr_pairs, s[mask])
+
+        if distances is not None:
+            # Each pair once, from its lower row (the frozen rows are not evaluated)
+            once = mask & (np.arange(n)[None, :] > np.arange(start, stop)[:, None])
+            distances.append(np.sqrt(s[once]))
+
+        if m < n:
+            # Pairs with the frozen atoms are only visited from the mobile side
+            energy[m:] += e[:, m:].sum(axis=0)
+            virial += np.einsum("ij,ij->", fr[:, m:], s[:, m:])
+
+    # Every pair was visited twice
+    return forces, energy, 0.5 * energy.sum(), 0.5 * virial, n_pairs
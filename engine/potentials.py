@@ -0,0 +1,119 @@
+import numpy as np # type: ignore
+from engine import choices
+
+
+class PairPotential():
+    """Class describing an isotropic pair potential V(r), to be tabulated by PairTable.
+
+    Attributes:
+        name (str): Name of the potential.
+        energy (callable): V(r), vectorised over a numpy array of distances.
+        force (callable): F(r) = -dV/dr, vectorised. Central finite differences of energy if not provided.
+        cutoff (float): Distance beyond which the interaction is zero.
+        r_min (float): Smallest tabulated distance, closer pairs feel the force at r_min.
+        shift (bool): If True, the energy is shifted to be zero at the cutoff.
+
+    Methods:
+        energy_at(r): Returns V(r), shifted if requested, and 0 beyond the cutoff.
+        force_at(r): Returns F(r), and 0 beyond the cutoff.
+    """
+    def __init__(self, energy, force=None, cutoff=2.5, r_min=0.3, shift=False, name="custom"):
+        self.name = name
+        self.energy = energy
+        self.force = force if force is not None else self._numerical_force
+        self.cutoff = cutoff
+        self.r_min = r_min
+        self.shift = shift
+
+        if not 0 < r_min < cutoff:
+            raise ValueError(f"r_min ({r_min}) must be between 0 and the cutoff ({cutoff})")
+
+    def _numerical_force(self, r):
+        h = 1e-6 * np.maximum(r, 1.0)
+        return -(self.energy(r + h) - self.energy(r - h)) / (2 * h)
+
+    def energy_at(self, r):
+        r = np.asarray(r, dtype=float)
+        e = self.energy(r)
+        if self.shift:
+            e = e - self.energy(np.array(self.cutoff))
+        return np.where(r < self.cutoff, e, 0.0)
+
+    def force_at(self, r):
+        r = np.asarray(r, dtype=float)
+        return np.where(r < self.cutoff, self.force(r), 0.0)
+
+
+# ----------------------
+#  Library
+# ----------------------
+
+def lennard_jones(sigma=1.0, epsilon=1.0, cutoff=2.5, shift=False):
+    def energy(r):
+        sr6 = (sigma / r) ** 6
+        return 4 * epsilon * (sr6 * sr6 - sr6)
+
+    def force(r):
+        sr6 = (sigma / r) ** 6
+        return 24 * epsilon * (2 * sr6 * sr6 - sr6) / r
+
+    return PairPotential(energy, force, cutoff=cutoff, r_min=0.3 * sigma,
+                         shift=shift, name="LJ")
+
+
+def wca(sigma=1.0, epsilon=1.0, cutoff=None):
+    """Purely repulsive Lennard-Jones, cut and shifted at its minimum 2^(1/6) sigma.
+
+    The cutoff is part of the definition of the potential, the argument is ignored.
+    """
+    lj = lennard_jones(sigma, epsilon)
+    return PairPotential(lambda r: lj.energy(r) + epsilon, lj.force,
+                         cutoff=2 ** (1 / 6) * sigma, r_min=0.3 * sigma, name="WCA")
+
+
+def morse(depth=1.0, width=2.0, r_eq=2 ** (1 / 6), cutoff=2.5, shift=False):
+    def energy(r):
+        x = np.exp(-width * (r - r_eq))
+        return depth * (x * x - 2 * x)
+
+    def force(r):
+        x = np.exp(-width * (r - r_eq))
+        return 2 * depth * width * (x * x - x)
+
+    return PairPotential(energy, force, cutoff=cutoff, r_min=0.3 * r_eq,
+                         shift=shift, name="Morse")
+
+
+def soft_sphere(sigma=1.0, epsilon=1.0, n=12, cutoff=2.5, shift=False):
+    def energy(r):
+        return epsilon * (sigma / r) ** n
+
+    def force(r):
+        return n * epsilon * (sigma / r) ** n / r
+
+    return PairPotential(energy, force, cutoff=cutoff, r_min=0.3 * sigma,
+                         shift=shift, name="soft")
+
+
+POTENTIALS = {
+    "LJ": lennard_jones,
+    "WCA": wca,
+    "Morse": morse,
+    "soft": soft_sphere,
+}
+choices.check_table(choices.POTENTIALS, POTENTIALS, "POTENTIALS")
+
+
+def get_potential(name, **kwargs):
+    if name not in POTENTIALS:
+        raise ValueError(f"{name} not in POTENTIALS")
+    return POTENTIALS[name](**kwargs)
+
+
+def potential_from_params(params):
+    # A cutoff of 0 or None keeps the default cutoff of the potential
+    name = params.get("potential", "LJ")
+    cutoff = params.get("cutoff")
+    if cutoff:
+        return get_potential(name, cutoff=cutoff)
+    return get_potential(name)
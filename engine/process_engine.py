@@ -0,0 +1,297 @@
+import logging
+import multiprocessing
+import traceback
+from engine.md_engine import Engine
+from engine.monte_carlo import MonteCarlo
+from engine.replica_exchange import ReplicaExchange
+from engine.profiler import Profiler
+from engine.shared_buffers import SharedFrameBuffer, SharedSeries
+from assets.recorder import MDRecorder, STAT_KEYS
+from assets.trajectory import open_trajectory
+
+
+class PhaseRunner():
+    """PhaseRunner class stepping an Engine through the selected phases, without Qt timer.
+
+    Same phases and stopping rules as MainWindow.minimization/equilibration/production, for an engine running outside of the GUI event loop.
+
+    Attributes:
+        engine (Engine): The engine to step.
+        params (dict): The MD parameters (enable_*, *_n_steps, *_dt...).
+        phases (list): Phases to run, among "min", "eq" and "prod".
+        phase_index (int): Index of the current phase.
+        step (int): Step counter inside the current phase.
+        monte_carlo (MonteCarlo): Monte Carlo sampler of the equilibration phase, when params["eq_method"] is "mc".
+        replicas (ReplicaExchange): Parallel tempering of the equilibration phase, when params["eq_method"] is "pt". Its processes cannot be started from a daemon process such as the one of EngineProcess.
+
+    Methods:
+        step_once(): Runs one step of the current phase, returns False once all the phases are completed.
+        set_params(changes): Updates the parameters used by the next steps, through Engine.set_params.
+    """
+    def __init__(self, engine, params):
+        self.engine = engine
+        self.params = params
+
+        self.phases = [phase for phase, key in
+                       [("min", "enable_min"), ("eq", "enable_eq"), ("prod", "enable_prod")]
+                       if params.get(key)]
+        self.phase_index = 0
+        self.step = 0
+        self.monte_carlo = None
+        self.replicas = None
+        if self.phases:
+            self._start_phase()
+
+    def set_params(self, changes):
+        # The engine first, the box is rescaled only if it differs from its own
+        self.engine.set_params(changes)
+        self.params.update(changes)
+        if "boxsize" in changes and self.monte_carlo is not None:
+            self.monte_carlo.reset_cells()
+
+    def _next_phase(self):
+        self.engine.flush_thermostat()
+        self.phase_index += 1
+        self.step = 0
+        if self.phase_index < len(self.phases):
+            self._start_phase()
+            # Stats are reported per phase
+            self.engine.profiler.reset()
+            self.engine.recorder.reset_stats()
+        else:
+            logging.info("All selected phases completed")
+
+    def _start_phase(self):
+        phase = self.phases[self.phase_index]
+        logging.info(f"Starting phase {phase}...")
+        self.engine.tune_backend()
+        if phase == "eq" and self.params.get("eq_method") == "mc":
+            self.monte_carlo = MonteCarlo(self.engine, self.params["temperature"],
+                                          self.params.get("mc_acceptance", 0.5))
+        elif phase == "eq" and self.params.get("eq_method") == "pt":
+            self.replicas = ReplicaExchange(self.engine, self.params)
+
+    def step_once(self):
+        if self.phase_index >= len(self.phases):
+            return False
+
+        phase = self.phases[self.phase_index]
+        p = self.params
+        self.step += 1
+
+        if (self.step % 1000) == 0:
+            logging.info(f"Phase {phase} step {self.step}")
+            if self.engine.profiler.enabled:
+                logging.info(self.engine.profiler.summary())
+
+        if phase == "min":
+            converged = self.engine.minimize_step(p["mini_dt"], p["mini_conv_crit"])
+            done = converged or self.step >= p["mini_n_steps"]
+        elif phase == "eq" and self.replicas is not None:
+            # One round of exchange_every steps of every replica
+            self.replicas.run_round()
+            self.step += self.replicas.exchange_every - 1
+            done = self.step >= p["eq_n_steps"]
+            if done:
+                self.replicas.finish(self.engine)
+                self.replicas = None
+        elif phase == "eq" and self.monte_carlo is not None:
+            self.monte_carlo.sweep(p["temperature"])
+            done = self.step >= p["eq_n_steps"]
+        elif phase == "eq":
+            self.engine.equilibrate_step(self.step, p["eq_dt"], p["temperature"], p["eq_tau"],
+                                         p.get("eq_respa_k", 1), p.get("eq_thermostat", "berendsen"))
+            done = self.step >= p["eq_n_steps"]
+        elif p.get("prod_thermostat", "none") != "none":
+            self.engine.run_thermostat(p["prod_dt"], p["prod_thermostat"], p["temperature"],
+                                       p["prod_tau"])
+            done = self.step >= p["prod_n_steps"]
+        elif p.get("prod_respa_k", 1) > 1:
+            self.engine.run_respa(p["prod_dt"], p["prod_respa_k"])
+            done = self.step >= p["prod_n_steps"]
+        else:
+            self.engine.run_once(p["prod_dt"])
+            done = self.step >= p["prod_n_steps"]
+
+        if done:
+            self._next_phase()
+        return True
+
+
+class SharedRecorder(MDRecorder):
+    """MDRecorder that also appends the scalar series of each record to a SharedSeries.
+
+    Per-atom frames are not kept (frame_stride = 0): the GUI reads the positions from the shared frame buffer.
+    """
+    def __init__(self, series, stride=1):
+        super().__init__(stride=stride, frame_stride=0)
+        self.series = series
+
+    def record(self, engine):
+        super().record(engine)
+        self.series.append([getattr(self, key)[-1] for key in self.series.keys])
+
+
+def _engine_main(conn, params, frame_name, series_name, capacity):
+    """Entry point of the engine process: steps the phases and answers the control pipe."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | engine | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+    series = SharedSeries(STAT_KEYS, capacity, name=series_name)
+    recorder = SharedRecorder(series, stride=params.get("record_stride", 1))
+    engine = Engine(params, recorder)
+
+    # Publish the frames into shared memory instead of the local FrameBuffer
+    frame = SharedFrameBuffer(len(engine.system.masses), name=frame_name)
+    engine.snapshot = frame
+    frame.publish(engine.system.by_id(engine.system.positions), engine.step_count)
+
+    # Trajectory export from the engine process, by its own writer thread
+    if params.get("trajectory_file"):
+        recorder.add_writer(open_trajectory(params["trajectory_file"],
+                                            engine.system.by_id(engine.system.species),
+                                            params["boxsize"],
+                                            params.get("trajectory_every", 1),
+                                            params.get("trajectory_precision", 1e-4)))
+    conn.send(("ready", engine.system.by_id(engine.system.species)))
+
+    runner = PhaseRunner(engine, params)
+    running = False
+    try:
+        while True:
+            try:
+                # Block on the pipe while idle, only peek at it while running
+                if conn.poll(0 if running else 0.05):
+                    command, *args = conn.recv()
+                    if command == "run":
+                        running = True
+                    elif command == "pause":
+                        running = False
+                    elif command == "set":
+                        runner.set_params(args[0])
+                    elif command == "stop":
+                        break
+
+                if running and not runner.step_once():
+                    running = False
+                    recorder.close_writers()
+                    conn.send(("finished", engine.step_count))
+            except (EOFError, KeyboardInterrupt):
+                break
+            except Exception:
+                # Reported to the GUI, the run does not go on from a failed step
+                conn.send(("error", traceback.format_exc()))
+                break
+    finally:
+        recorder.close_writers()
+        frame.close()
+        series.close()
+
+
+class _SystemView():
+    """Read-only stand-in for the System of the engine process, with what the views need."""
+    def __init__(self):
+        self.species = None
+
+    def by_id(self, array):
+        # Species are received in atom ID order
+        return array
+
+
+class EngineProcess():
+    """EngineProcess class running an Engine and its phases in a separate process.
+
+    Physics and Qt painting then run on different cores instead of competing for the GIL. The engine process publishes the positions and step counter into a SharedFrameBuffer and the recorded scalars into a SharedSeries; the AtomsView and GraphViews map them zero-copy through the same attributes as a local Engine (snapshot, system.species, recorder, profiler, analyses).
+    Commands go over a control pipe: ("run",), ("pause",), ("set", changes) and ("stop",). The engine process answers ("ready", species), ("finished", steps) or ("error", traceback), after which it exits.
+
+    Attributes:
+        params (dict): The MD parameters sent to the engine process.
+        snapshot (SharedFrameBuffer): Latest positions published by the engine process.
+        recorder (SharedSeries): Recorded scalar series, as attributes named like the MDRecorder lists.
+        system (_SystemView): Species of the atoms, received once the engine process is ready.
+        profiler (Profiler): Render timings of the GUI side, its step count follows the engine process.
+        analyses (dict): Always empty, analyses run inside the engine process only.
+        finished (bool): True once the engine process completed all its phases.
+
+    Methods:
+        start(): Starts the engine process and its phases.
+        set_params(changes): Sends parameter changes to the running engine.
+        pause(): Pauses the phases.
+        poll(): Handles the messages of the engine process, returns finished. Raises RuntimeError when the engine process failed or exited before finishing.
+        stop(): Stops the engine process and releases the shared memory.
+    """
+    def __init__(self, params, capacity=20000):
+        self.params = dict(params)
+        n_atoms = self.params["n_atoms"]
+
+        self.snapshot = SharedFrameBuffer(n_atoms)
+        self.recorder = SharedSeries(STAT_KEYS, capacity)
+        self.system = _SystemView()
+        self.profiler = Profiler(self.params.get("enable_profiling", False))
+        self.analyses = {}
+        self.finished = False
+
+        # spawn: a fork of the Qt application is not safe
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_engine_main,
+            args=(child_conn, self.params, self.snapshot.name, self.recorder.name, capacity),
+            daemon=True,
+        )
+
+    def start(self):
+        self.process.start()
+        self.conn.send(("run",))
+
+    def set_params(self, changes):
+        # Nothing listens on the pipe once stopped or finished
+        if self.conn.closed or self.finished or not self.process.is_alive():
+            raise RuntimeError("The engine process is not running")
+        self.params.update(changes)
+        self.conn.send(("set", changes))
+
+    def pause(self):
+        self.conn.send(("pause",))
+
+    def poll(self):
+        while self.conn.poll():
+            try:
+                message, *args = self.conn.recv()
+            except (EOFError, ConnectionError):
+                message, args = "error", ["The engine process exited"]
+            if message == "ready":
+                self.system.species = args[0]
+            elif message == "finished":
+                logging.info(f"Engine process finished after {args[0]} steps")
+                self.finished = True
+            elif message == "error":
+                raise RuntimeError(f"Engine process failed:\n{args[0]}")
+
+        # Killed without a word, e.g. out of memory
+        if not self.finished and not self.process.is_alive():
+            raise RuntimeError(f"The engine process exited with code {self.process.exitcode}")
+
+        # Steps done by the engine process, for the steps/s of the overlay
+        self.profiler.n_steps = self.snapshot.step
+        return self.finished
+
+    def stop(self):
+        if self.conn.closed:
+            return
+
+        if self.process.is_alive():
+            try:
+                self.conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+
+        self.conn.close()
+        self.snapshot.close()
+        self.recorder.close()
@@ -0,0 +1,103 @@
+import time
+from contextlib import nullcontext
+
+
+# Shared no-op context returned when the profiler is off
+_NULL_SECTION = nullcontext()
+
+
+class _Section():
+    """Context manager adding its wall-clock duration to a Profiler timing."""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        timings = self.profiler.timings
+        timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        calls = self.profiler.calls
+        calls[self.name] = calls.get(self.name, 0) + 1
+        return False
+
+
+class Profiler():
+    """Profiler class collecting hot-path timers and counters of a simulation.
+
+    When disabled, section() returns a shared no-op context and count()/step() return immediately, so the instrumentation left in the engine costs nothing.
+
+    Attributes:
+        enabled (bool): Whether timings and counters are collected.
+        timings (dict): Total wall-clock seconds spent in each named section.
+        calls (dict): Number of calls of each named section.
+        counters (dict): Integer counters (pair evaluations, neighbour rebuilds, rendered frames...).
+        n_steps (int): Number of simulation steps since the last reset.
+
+    Methods:
+        reset(): Clears every timing and counter and restarts the wall clock.
+        section(name): Returns a context manager timing the enclosed block under name.
+        count(name, n): Adds n to the counter name.
+        step(): Counts one simulation step.
+        stats(): Returns a dictionary with the timings, counters, steps/s and FPS.
+        summary(): Returns a one-line text summary of stats(), for logging.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.timings = {}
+        self.calls = {}
+        self.counters = {
+            "pair_evaluations": 0,
+            "neighbour_rebuilds": 0,
+            "frames": 0,
+        }
+        self.n_steps = 0
+        self.start_time = time.perf_counter()
+
+    def section(self, name):
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def step(self):
+        if not self.enabled:
+            return
+        self.n_steps += 1
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time
+        steps = max(self.n_steps, 1)
+        return {
+            "enabled": self.enabled,
+            "elapsed_s": elapsed,
+            "steps": self.n_steps,
+            "steps_per_s": self.n_steps / elapsed if elapsed > 0 else 0.0,
+            "fps": self.counters["frames"] / elapsed if elapsed > 0 else 0.0,
+            "time_s": dict(self.timings),
+            "time_per_step_ms": {name: 1e3 * t / steps
+                                 for name, t in self.timings.items()},
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+
+    def summary(self):
+        stats = self.stats()
+        per_step = ", ".join(f"{name} {t:.3f} ms"
+                             for name, t in stats["time_per_step_ms"].items())
+        counters = ", ".join(f"{name} {n}"
+                             for name, n in stats["counters"].items())
+        return (f"{stats['steps_per_s']:.1f} steps/s, {stats['fps']:.1f} FPS"
+                f" | per step: {per_step} | {counters}")
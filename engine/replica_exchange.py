@@ -0,0 +1,256 @@
+import logging
+import multiprocessing
+import traceback
+import numpy as np # type: ignore
+from engine.md_engine import Engine
+from engine.monte_carlo import MonteCarlo
+from engine.thermostats import NoseHooverChain
+from engine.shared_buffers import SharedFrameBuffer
+from assets.recorder import MDRecorder
+
+
+def temperature_ladder(T_min, T_max, n):
+    """n temperatures in geometric progression from T_min to T_max, which gives similar swap acceptances when the heat capacity is constant."""
+    if n == 1:
+        return np.array([float(T_min)])
+    return T_min * (T_max / T_min) ** (np.arange(n) / (n - 1))
+
+
+def _replica_main(rank, params, state, moves, frame_name, conn):
+    """Entry point of a replica process: steps its own Engine at the temperature it is given."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s | %(levelname)s | replica {rank} | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    frame = None
+    try:
+        # Every replica starts from the configuration of the main engine
+        params = dict(params, n_atoms=0, init_file="")
+        engine = Engine(params, MDRecorder(stride=10**9, frame_stride=0))
+        engine.load_atoms(state)
+        # Same workload as the main engine, its choice is in the cache
+        engine.tune_backend()
+        frame = SharedFrameBuffer(len(engine.system.masses), name=frame_name)
+        engine.snapshot = frame
+
+        monte_carlo = None
+        T = None
+        step = 0
+        while True:
+            command, *args = conn.recv()
+            if command == "stop":
+                break
+            try:
+                if command == "run":
+                    n_steps, T_new = args
+                    if moves == "mc" and monte_carlo is None:
+                        monte_carlo = MonteCarlo(engine, T_new, params.get("mc_acceptance", 0.5))
+                    elif moves == "md" and T is not None and T_new != T:
+                        # New temperature label: velocities rescaled to it
+                        engine.flush_thermostat()
+                        engine.system.velocities *= np.sqrt(T_new / T)
+                        if isinstance(engine.thermostat, NoseHooverChain):
+                            engine.thermostat.couple(engine.calc_kinetic_ene())
+                    T = T_new
+
+                    for _ in range(n_steps):
+                        step += 1
+                        if monte_carlo is not None:
+                            monte_carlo.sweep(T)
+                        else:
+                            engine.equilibrate_step(step, params["eq_dt"], T, params["eq_tau"],
+                                                    thermostat=params.get("eq_thermostat", "berendsen"))
+                    conn.send(("energy", engine.system.ene_pot_LJ_total))
+
+                elif command == "state":
+                    if monte_carlo is not None:
+                        monte_carlo.draw_velocities(T)
+                    engine.flush_thermostat()
+                    system = engine.system
+                    conn.send(("state", system.by_id(system.positions),
+                               system.by_id(system.velocities), system.by_id(system.images)))
+            except Exception:
+                conn.send(("error", traceback.format_exc()))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if frame is not None:
+            frame.close()
+
+
+class ReplicaExchange():
+    """Parallel tempering: copies of an Engine's system run at a ladder of temperatures in parallel processes, and exchange their temperatures.
+
+    The ladder and the exchanges are set by params["pt_replicas"], params["pt_max_temperature"], params["pt_exchange_every"] and params["pt_moves"].
+    Each replica process steps its own Engine for exchange_every steps, with Engine.equilibrate_step and the thermostat of params["eq_thermostat"] (moves "md") or Metropolis sweeps of MonteCarlo (moves "mc"), then reports its potential energy U. Swaps between neighbouring temperatures T_i < T_j, alternately the even and the odd pairs, are accepted with the Metropolis probability min(1, exp((1/T_i - 1/T_j) (U_a - U_b))), a and b being the replicas at T_i and T_j.
+    Only the temperature labels are exchanged, the configurations stay in their processes (the velocities of MD replicas are rescaled to their new temperature). Hot replicas cross the energy barriers and pass their configurations down the ladder, so the replica at the target temperature leaves metastable states much faster than a single system.
+    The swap rule assumes canonical sampling: it is exact with Monte Carlo moves and the Langevin or Nosé-Hoover thermostats, and approximate with the Berendsen thermostat.
+
+    Attributes:
+        temperatures (numpy.ndarray): Temperature ladder, ascending, the first one being the target temperature.
+        exchange_every (int): Steps of each replica between two exchange attempts.
+        moves (str): Sampling of the replicas, "md" or "mc".
+        replica_at (numpy.ndarray): Index of the replica currently at each temperature.
+        energies (numpy.ndarray): Potential energy of each replica at the last exchange.
+        attempts (numpy.ndarray): Number of swap attempts of each neighbouring pair of temperatures.
+        accepted (numpy.ndarray): Number of accepted swaps of each pair.
+        rounds (int): Number of completed rounds of exchange_every steps.
+        frames (list): SharedFrameBuffer of the positions of each replica.
+
+    Methods:
+        poll(): Attempts the swaps and starts the next round once every replica finished the current one, returns True if it did.
+        run_round(): Same, waiting for the replicas.
+        acceptance(): Returns the acceptance ratio of each pair of neighbouring temperatures.
+        summary(): Returns the acceptance ratios as one line of text, for logging.
+        read_target(out): Returns the latest positions of the replica at the target temperature.
+        finish(engine): Copies the configuration at the target temperature into engine, then stops the replicas.
+        stop(): Stops the replica processes and releases the shared memory.
+    """
+    def __init__(self, engine, params, seed=None):
+        T_target = params["temperature"]
+        self.temperatures = temperature_ladder(T_target,
+                                               params.get("pt_max_temperature", 2 * T_target),
+                                               params.get("pt_replicas", 4))
+        self.exchange_every = max(params.get("pt_exchange_every", 10), 1)
+        self.moves = params.get("pt_moves", "md")
+        self.rng = np.random.default_rng(seed)
+
+        n = len(self.temperatures)
+        self.replica_at = np.arange(n)
+        self.energies = np.zeros(n)
+        self.attempts = np.zeros(n - 1, dtype=np.int64)
+        self.accepted = np.zeros(n - 1, dtype=np.int64)
+        self.rounds = 0
+
+        system = engine.system
+        state = {
+            "species": system.by_id(system.species),
+            "positions": system.by_id(system.positions),
+            "velocities": system.by_id(system.velocities),
+            "bonds": system.bonds,
+            "bond_lengths": system.bond_lengths,
+            "frozen": ~system.by_id(system.mobile),
+        }
+        n_atoms = len(system.masses)
+        self.frames = [SharedFrameBuffer(n_atoms) for _ in range(n)]
+
+        # spawn: a fork of the Qt application is not safe
+        context = multiprocessing.get_context("spawn")
+        self.conns, self.processes = [], []
+        for rank in range(n):
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_replica_main,
+                args=(rank, dict(params), state, self.moves, self.frames[rank].name, child_conn),
+                daemon=True,
+            )
+            process.start()
+            self.conns.append(conn)
+            self.processes.append(process)
+        logging.info("Replica exchange at T = "
+                     + ", ".join(f"{T:.4g}" for T in self.temperatures))
+        self._send_round()
+
+    def _send_round(self):
+        temperature_of = np.empty_like(self.temperatures)
+        temperature_of[self.replica_at] = self.temperatures
+        for conn, T in zip(self.conns, temperature_of):
+            conn.send(("run", self.exchange_every, float(T)))
+
+    def _receive(self, conn, expected):
+        try:
+            message, *args = conn.recv()
+        except (EOFError, ConnectionError):
+            message, args = "error", ["A replica process exited"]
+        if message == "error":
+            raise RuntimeError(f"Replica failed:\n{args[0]}")
+        if message != expected:
+            raise RuntimeError(f"Unexpected message {message} from a replica")
+        return args
+
+    # ----------------------
+    #  Exchanges
+    # ----------------------
+
+    def _exchange(self):
+        # Even pairs on even rounds, odd pairs on odd rounds
+        beta = 1.0 / self.temperatures
+        for i in range(self.rounds % 2, len(self.temperatures) - 1, 2):
+            a, b = self.replica_at[i], self.replica_at[i + 1]
+            delta = (beta[i] - beta[i + 1]) * (self.energies[a] - self.energies[b])
+            self.attempts[i] += 1
+            if delta >= 0 or self.rng.random() < np.exp(delta):
+                self.replica_at[i], self.replica_at[i + 1] = b, a
+                self.accepted[i] += 1
+
+    def poll(self):
+        if not all(conn.poll() for conn in self.conns):
+            return False
+        self._complete_round()
+        return True
+
+    def run_round(self):
+        self._complete_round()
+
+    def _complete_round(self):
+        for k, conn in enumerate(self.conns):
+            self.energies[k] = self._receive(conn, "energy")[0]
+        self._exchange()
+        self.rounds += 1
+        self._send_round()
+
+    def acceptance(self):
+        return self.accepted / np.maximum(self.attempts, 1)
+
+    def summary(self):
+        return "Swap acceptance: " + ", ".join(
+            f"{T1:.4g}-{T2:.4g}: {ratio:.2f}"
+            for T1, T2, ratio in zip(self.temperatures[:-1], self.temperatures[1:],
+                                     self.acceptance()))
+
+    def read_target(self, out=None):
+        return self.frames[self.replica_at[0]].read(out)
+
+    # ----------------------
+    #  End
+    # ----------------------
+
+    def finish(self, engine):
+        # The round in progress is completed without exchange
+        for conn in self.conns:
+            self._receive(conn, "energy")
+        conn = self.conns[self.replica_at[0]]
+        conn.send(("state",))
+        positions, velocities, images = self._receive(conn, "state")
+        self.stop()
+
+        # Rows of the engine may be in another order than the atom IDs
+        system = engine.system
+        system.positions = positions[system.ids]
+        system.velocities = velocities[system.ids]
+        # The replica started from the configuration of the engine with no crossings
+        system.images = system.images + images[system.ids]
+        engine.calc_forces()
+        engine.update_acc()
+        logging.info(self.summary())
+
+    def stop(self):
+        if not self.conns:
+            return
+
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+        for conn, process in zip(self.conns, self.processes):
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.conns, self.processes = [], []
+
+        for frame in self.frames:
+            frame.close()
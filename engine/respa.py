@@ -0,0 +1,167 @@
+import numpy as np # type: ignore
+from engine.potentials import PairPotential
+from engine.pair_table import PairTable
+from engine.cell_list import CellList, cell_forces
+
+
+# ----------------------
+#  Force splitting
+# ----------------------
+
+def _switch(r, r_in, r_out):
+    # S = 1 below r_in, 0 beyond r_out, smoothstep in between, and dS/dr
+    t = np.clip((r - r_in) / (r_out - r_in), 0.0, 1.0)
+    s = 1 - t * t * (3 - 2 * t)
+    ds = -6 * t * (1 - t) / (r_out - r_in)
+    return s, ds
+
+
+def split_potential(potential, r_split, width=0.5):
+    """Splits a pair potential into a short-range and a long-range part, V = V_fast + V_slow.
+
+    V_fast = S(r) V(r), with a switching function S going smoothly from 1 at r_split - width to 0 at r_split, and V_slow = (1 - S(r)) V(r). Both parts and their forces are continuous, so each can be integrated with its own time step. V_fast is cut at r_split; the shift of the potential, if any, goes to V_slow.
+
+    Returns:
+        tuple: fast and slow PairPotential.
+    """
+    r_in = r_split - width
+    if not potential.r_min < r_in < r_split < potential.cutoff:
+        raise ValueError(f"The switching region [{r_in}, {r_split}] must lie between "
+                         f"r_min ({potential.r_min}) and the cutoff ({potential.cutoff})")
+
+    def fast_energy(r):
+        s, _ = _switch(r, r_in, r_split)
+        return s * potential.energy(r)
+
+    def fast_force(r):
+        s, ds = _switch(r, r_in, r_split)
+        return s * potential.force(r) - ds * potential.energy(r)
+
+    def slow_energy(r):
+        s, _ = _switch(r, r_in, r_split)
+        return (1 - s) * potential.energy(r)
+
+    def slow_force(r):
+        s, ds = _switch(r, r_in, r_split)
+        return (1 - s) * potential.force(r) + ds * potential.energy(r)
+
+    fast = PairPotential(fast_energy, fast_force, cutoff=r_split, r_min=potential.r_min,
+                         name=f"{potential.name} (fast)")
+    slow = PairPotential(slow_energy, slow_force, cutoff=potential.cutoff,
+                         r_min=potential.r_min, shift=potential.shift,
+                         name=f"{potential.name} (slow)")
+    return fast, slow
+
+
+# ----------------------
+#  Integrator
+# ----------------------
+
+class Respa():
+    """Reversible multiple time step integrator (r-RESPA, Tuckerman, Berne and Martyna 1992) for an Engine's System.
+
+    The pair potential is split by split_potential into a fast short-range group and a slow long-range group, each tabulated and evaluated with its own cell list (whatever the force backend of the engine). One outer step of k inner steps of dt is the symmetric Trotter splitting
+
+        half kick with the slow forces over k dt
+        k velocity-Verlet steps of dt with the fast forces
+        half kick with the new slow forces over k dt
+
+    so the slow forces are evaluated once per k inner steps. The scheme is time-reversible and symplectic like velocity Verlet, which it reduces to for k = 1.
+    The forces of both groups at the current positions are kept in system.extra between outer steps, so each outer step costs k fast and 1 slow evaluation. They are recomputed when the engine made another kind of step in between.
+
+    Attributes:
+        engine (Engine): The engine whose System, potential and profiler are used.
+        r_split (float): Cutoff of the fast group, end of the switching region.
+        width (float): Width of the switching region.
+        fast (PairTable): Tabulated short-range part of the potential.
+        slow (PairTable): Tabulated long-range part of the potential.
+        fast_cells (CellList): Cells one r_split wide, for the fast group.
+        slow_cells (CellList): Cells one cutoff wide, for the slow group.
+        slow_evaluations (int): Number of evaluations of the slow group.
+
+    Methods:
+        step(dt, k): Makes one outer step, k inner steps of dt, and leaves the total forces, energies and virial in the System.
+    """
+    def __init__(self, engine, r_split, width=0.5):
+        self.engine = engine
+        self.r_split = r_split
+        self.width = width
+
+        n_points = engine.params.get("table_points", 8192)
+        fast, slow = split_potential(engine.potential, r_split, width)
+        self.fast = PairTable(fast, n_points)
+        self.slow = PairTable(slow, n_points)
+
+        box = engine.params["boxsize"]
+        self.fast_cells = CellList(box, fast.cutoff)
+        self.slow_cells = CellList(box, slow.cutoff)
+
+        self.slow_evaluations = 0
+        # Engine step at which the cached forces are those of the positions
+        self._next_step = None
+        self._terms = {}
+
+    def _group(self, name, table, cells):
+        # Forces of one group, cached in system.extra with their energy and virial
+        engine = self.engine
+        system = engine.system
+        with engine.profiler.section(f"force_{name}"):
+            forces, energy, total, virial, n_pairs = cell_forces(
+                system.positions, engine.params["boxsize"], table, cells)
+        engine.profiler.count("pair_evaluations", n_pairs)
+
+        system.extra[f"respa_{name}"] = forces
+        self._terms[name] = (energy, total, virial)
+        return forces
+
+    def _fast(self):
+        return self._group("fast", self.fast, self.fast_cells)
+
+    def _slow(self):
+        self.slow_evaluations += 1
+        return self._group("slow", self.slow, self.slow_cells)
+
+    def _cached(self):
+        system = self.engine.system
+        return (self._next_step == self.engine.step_count and
+                len(system.extra.get("respa_fast", ())) == len(system.masses))
+
+    def step(self, dt, k):
+        engine = self.engine
+        system = engine.system
+
+        if self._cached():
+            fast, slow = system.extra["respa_fast"], system.extra["respa_slow"]
+        else:
+            fast, slow = self._fast(), self._slow()
+
+        inv_m = 1.0 / system.masses[:, None]
+        outer = k * dt
+
+        with engine.profiler.section("integration"):
+            system.velocities += 0.5 * outer * slow * inv_m
+
+        for _ in range(k):
+            with engine.profiler.section("integration"):
+                system.velocities += 0.5 * dt * fast * inv_m
+                system.positions += dt * system.velocities
+                engine.wrap_positions()
+            fast = self._fast()
+            with engine.profiler.section("integration"):
+                system.velocities += 0.5 * dt * fast * inv_m
+
+        slow = self._slow()
+        with engine.profiler.section("integration"):
+            system.velocities += 0.5 * outer * slow * inv_m
+
+        # Totals at the new positions, for the observables and the recorder
+        (e_fast, t_fast, v_fast), (e_slow, t_slow, v_slow) = self._terms["fast"], self._terms["slow"]
+        system.forces = fast + slow
+        system.accelerations = system.forces * inv_m
+        system.ene_pot_LJ = e_fast + e_slow
+        system.ene_pot_LJ_total = t_fast + t_slow
+        system.virial = v_fast + v_slow
+        system.pair_distances = None
+
+        # The engine ends this step next, the cache is valid for the one after
+        self._next_step = engine.step_count + 1
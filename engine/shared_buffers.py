@@ -0,0 +1,131 @@
+import time
+from multiprocessing import shared_memory
+import numpy as np # type: ignore
+
+
+class _SharedBlock():
+    """A named shared memory block holding an int64 header followed by a float64 array."""
+    def __init__(self, n_header, shape, name=None):
+        n_bytes = 8 * n_header + 8 * int(np.prod(shape))
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=n_bytes)
+        self.owner = create
+
+        self.header = np.ndarray((n_header,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray(shape, dtype=np.float64, buffer=self.shm.buf,
+                               offset=8 * n_header)
+        if create:
+            self.header[:] = 0
+            self.data[...] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        # Views on the buffer must be released before closing it
+        self.header = None
+        self.data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views still held elsewhere (e.g. by a plot): the mapping is
+            # released with them, the name can still be unlinked
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedFrameBuffer():
+    """Latest atom positions in shared memory, protected by a sequence lock.
+
+    Same publish()/read()/step interface as FrameBuffer, so the AtomsView reads it the same way when the engine runs in another process.
+    The writer makes the sequence number odd, writes the frame, then makes it even again. Readers copy the frame and retry if the sequence number was odd or changed meanwhile, so they never keep a half-updated frame and never block the writer.
+
+    Header: [sequence, step].
+
+    Methods:
+        publish(positions, step): Writes a new frame (engine process only).
+        read(out): Returns a consistent copy of the latest frame and its step number.
+        close(): Releases the shared memory, and unlinks it in the creating process.
+    """
+    def __init__(self, n_atoms, name=None):
+        self.block = _SharedBlock(2, (n_atoms, 2), name)
+        self.name = self.block.name
+
+    @property
+    def step(self):
+        return int(self.block.header[1])
+
+    def publish(self, positions, step):
+        header = self.block.header
+        header[0] += 1 # odd: write in progress
+        np.copyto(self.block.data, positions)
+        header[1] = step
+        header[0] += 1 # even: frame complete
+
+    def read(self, out=None):
+        header, data = self.block.header, self.block.data
+        if out is None or out.shape != data.shape:
+            out = np.empty_like(data)
+
+        while True:
+            seq = header[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            np.copyto(out, data)
+            step = int(header[1])
+            if header[0] == seq:
+                return out, step
+
+    def close(self):
+        self.block.close()
+
+
+class SharedSeries():
+    """Ring buffer of recorded scalar series in shared memory, read zero-copy by the GraphViews.
+
+    Each row holds the values of all the keys at one record. Series are exposed as attributes (e.g. series.temperature), like the lists of MDRecorder; they are views on the shared buffer until the ring wraps around.
+
+    Header: [count].
+
+    Methods:
+        append(values): Writes one row (engine process only).
+        series(key): Returns the recorded values of key, oldest first.
+        close(): Releases the shared memory, and unlinks it in the creating process.
+    """
+    def __init__(self, keys, capacity=20000, name=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.capacity = capacity
+        self.block = _SharedBlock(1, (capacity, len(self.keys)), name)
+        self.name = self.block.name
+
+        # Streaming statistics are kept by the engine process only
+        self.stats = {}
+
+    @property
+    def count(self):
+        return int(self.block.header[0])
+
+    def append(self, values):
+        count = self.block.header[0]
+        self.block.data[count % self.capacity] = values
+        self.block.header[0] = count + 1
+
+    def series(self, key):
+        count = self.count
+        column = self.block.data[:, self.index[key]]
+        if count <= self.capacity:
+            return column[:count]
+        start = count % self.capacity
+        return np.concatenate([column[start:], column[:start]])
+
+    def __getattr__(self, key):
+        if key != "index" and key in self.__dict__.get("index", {}):
+            return self.series(key)
+        raise AttributeError(key)
+
+    def close(self):
+        self.block.close()
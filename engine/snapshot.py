@@ -0,0 +1,47 @@
+import threading
+import numpy as np # type: ignore
+
+
+class FrameBuffer():
+    """Double-buffered snapshot of the latest atom positions published by the Engine.
+
+    The engine writes each new frame into the back buffer and then swaps the front and back buffers under a lock. Readers copy the front buffer under the same lock, so they never see a half-updated frame, even when the engine runs in another thread.
+
+    Attributes:
+        step (int): Step number of the latest published frame, -1 before the first one.
+
+    Methods:
+        publish(positions, step): Copies positions into the back buffer and makes it the front buffer.
+        read(out): Returns a copy of the latest frame and its step number.
+    """
+    def __init__(self):
+        self._buffers = [np.zeros((0, 2)), np.zeros((0, 2))]
+        self._steps = [-1, -1]
+        self._front = 0
+        self._lock = threading.Lock()
+
+    @property
+    def step(self):
+        return self._steps[self._front]
+
+    def publish(self, positions, step):
+        # Single writer: the back buffer is never read, no lock needed to fill it
+        back = 1 - self._front
+        buffer = self._buffers[back]
+        if buffer.shape != positions.shape:
+            buffer = np.empty_like(positions)
+            self._buffers[back] = buffer
+        np.copyto(buffer, positions)
+
+        with self._lock:
+            self._steps[back] = step
+            self._front = back
+
+    def read(self, out=None):
+        with self._lock:
+            front = self._buffers[self._front]
+            if out is None or out.shape != front.shape:
+                out = front.copy()
+            else:
+                np.copyto(out, front)
+            return out, self._steps[self._front]
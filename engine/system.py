@@ -1,4 +1,5 @@
 import numpy as np #type: ignore
+from engine.atom import ATOM_DICT
 
 
 class System():
@@ -13,14 +14,32 @@ class System():
         accelerations (numpy.ndarray): An array of shape (n, 2) representing the accelerations of the atoms.
         forces (numpy.ndarray): An array of shape (n, 2) representing the forces acting on the atoms.
         masses (numpy.ndarray): An array of shape (n,) representing the masses of the atoms.
+        species (numpy.ndarray): An array of shape (n,) with the type of each atom (keys of ATOM_DICT).
+        images (numpy.ndarray): An integer array of shape (n, 2) counting the periodic box crossings of each atom, unwrapped positions are positions + images * boxsize.
+        ids (numpy.ndarray): An integer array of shape (n,) with the stable ID of the atom stored in each row, i.e. its index when it was added.
+        reordered (bool): True once the rows were permuted by reorder(), the per-atom arrays are then not in ID order anymore.
+        extra (dict): Additional per-atom arrays kept by other components (e.g. the cached force groups of the RESPA integrator), permuted by reorder() with the others.
+        bonds (numpy.ndarray): An integer array of shape (m, 2) with the atom IDs of each bond, not permuted by reorder().
+        bond_lengths (numpy.ndarray): An array of shape (m,) with the length of each bond.
+        n_constraints (int): Number of bonds held rigid by the engine, each removes one degree of freedom.
+        mobile (numpy.ndarray): A boolean array of shape (n,), False for the frozen atoms, which the engine keeps in the last rows.
         ene_pot_LJ (float): The potential energy calculated using the Lennard-Jones potential.
         ene_pot_LJ_total (float): The total Lennard-Jones potential energy of the system.
         kinetic_ene (float): The kinetic energy of the system.
         potentiel_ene (float): The potential energy of the system.
+        virial (float): The pair virial sum(r_ij . f_ij) accumulated by the force kernel.
+        pair_distances (numpy.ndarray): Minimum-image pair distances of the current positions, kept by the force kernel on steps sampled by an analysis, None otherwise: the (N, N) matrix of the dense kernel, or the pairs within pair_cutoff, each once, of the tabulated ones.
+        pair_cutoff (float): Distance up to which a list of pair_distances is complete.
         total_ene (float): The total energy of the system.
     
     Methods:
         add_atom(atom): Adds an atom to the system and updates its properties.
+        from_arrays(species, positions, velocities): Builds a system in bulk from per-atom arrays, without Atom objects.
+        reorder(order): Permutes all the per-atom arrays, e.g. along a space-filling curve for cache locality.
+        by_id(array): Returns a per-atom array indexed by stable atom ID.
+        bond_rows(): Returns the rows of the bonded atoms, shape (m, 2).
+        n_mobile(): Returns the number of mobile atoms, stored in the first rows by the engine.
+        n_dof(): Returns the number of degrees of freedom, 2 per mobile atom minus the constraints.
     """
     def __init__(self, atoms = None):
         
@@ -32,10 +51,23 @@ class System():
         self.accelerations = np.zeros((0, 2))
         self.forces = np.zeros((0, 2))
         self.masses = np.zeros((0,))
+        self.species = np.zeros((0,), dtype="U2")
+        self.images = np.zeros((0, 2), dtype=np.int64)
+        self.ids = np.zeros((0,), dtype=np.int64)
+        self.reordered = False
+        self.extra = {}
+        self.bonds = np.zeros((0, 2), dtype=np.int64)
+        self.bond_lengths = np.zeros((0,))
+        self.n_constraints = 0
+        self._bond_rows = None
+        self.mobile = np.zeros((0,), dtype=bool)
         self.ene_pot_LJ = 0
         self.ene_pot_LJ_total = 0
         self.kinetic_ene = 0
         self.potentiel_ene = 0
+        self.virial = 0
+        self.pair_distances = None
+        self.pair_cutoff = np.inf
         self.total_ene = 0
 
 
@@ -47,4 +79,82 @@ class System():
         self.velocities = np.vstack((self.velocities, np.zeros((1, 2))))
         self.accelerations = np.vstack((self.accelerations, np.zeros((1, 2))))
         self.forces = np.vstack((self.forces, np.zeros((1, 2))))
-        self.masses = np.append(self.masses, atom.mass)
\ No newline at end of file
+        self.masses = np.append(self.masses, atom.mass)
+        self.species = np.append(self.species, atom.type)
+        self.images = np.vstack((self.images, np.zeros((1, 2), dtype=np.int64)))
+        self.ids = np.append(self.ids, len(self.ids))
+        self.mobile = np.append(self.mobile, True)
+
+    @classmethod
+    def from_arrays(cls, species, positions, velocities=None):
+        species = np.asarray(species, dtype="U2")
+        n = len(species)
+
+        # Masses looked up once per species, not once per atom
+        names, codes = np.unique(species, return_inverse=True)
+        unknown = [name for name in names if name not in ATOM_DICT]
+        if unknown:
+            raise ValueError(f"{', '.join(unknown)} not in ATOM_DICT")
+
+        system = cls()
+        system.positions = np.array(positions, dtype=float).reshape(n, 2)
+        system.velocities = np.zeros((n, 2)) if velocities is None else \
+                            np.array(velocities, dtype=float).reshape(n, 2)
+        system.accelerations = np.zeros((n, 2))
+        system.forces = np.zeros((n, 2))
+        system.masses = np.array([ATOM_DICT[name][0] for name in names])[codes.ravel()]
+        system.species = species
+        system.images = np.zeros((n, 2), dtype=np.int64)
+        system.ids = np.arange(n, dtype=np.int64)
+        system.mobile = np.ones(n, dtype=bool)
+        return system
+
+    def reorder(self, order):
+        # Row k of every per-atom array becomes the former row order[k]
+        self.positions = self.positions[order]
+        self.velocities = self.velocities[order]
+        self.accelerations = self.accelerations[order]
+        self.forces = self.forces[order]
+        self.masses = self.masses[order]
+        self.species = self.species[order]
+        self.images = self.images[order]
+        self.ids = self.ids[order]
+        self.mobile = self.mobile[order]
+        for name, array in self.extra.items():
+            self.extra[name] = array[order]
+        if np.ndim(self.ene_pot_LJ) == 1:
+            self.ene_pot_LJ = self.ene_pot_LJ[order]
+        if len(self.atoms) == len(order):
+            self.atoms = [self.atoms[i] for i in order]
+
+        self.pair_distances = None
+        self.reordered = True
+        self._bond_rows = None
+
+    def by_id(self, array):
+        # Same array while the rows are still in ID order, no copy
+        if not self.reordered:
+            return array
+        out = np.empty_like(array)
+        out[self.ids] = array
+        return out
+
+    def bond_rows(self):
+        # Bonds hold atom IDs, their rows change with each reorder
+        if self._bond_rows is None:
+            if self.reordered:
+                rows = np.empty_like(self.ids)
+                rows[self.ids] = np.arange(len(self.ids))
+                self._bond_rows = rows[self.bonds]
+            else:
+                self._bond_rows = self.bonds
+        return self._bond_rows
+
+    def n_mobile(self):
+        return int(np.count_nonzero(self.mobile))
+
+    def n_dof(self):
+        return 2 * self.n_mobile() - self.n_constraints # 2D = 2 DOF per mobile atom
+
+    def unwrapped_positions(self, boxsize):
+        return self.positions + self.images * boxsize
\ No newline at end of file
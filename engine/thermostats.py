@@ -0,0 +1,224 @@
+import numpy as np # type: ignore
+from engine.observables import kinetic_energy
+# Thermostats selectable through params["eq_thermostat"] and params["prod_thermostat"]
+# "berendsen" is the velocity rescaling of Engine.equilibrate_step, "none" plain velocity Verlet
+from engine.choices import THERMOSTATS
+
+
+class Langevin():
+    """Langevin dynamics integrated with the BAOAB splitting (Leimkuhler and Matthews 2013).
+
+    One step of dt is a half kick B, a half drift A, the exact Ornstein-Uhlenbeck update O of the velocities, v = c1 v + c2 sqrt(T / m) R with c1 = exp(-dt / tau), a half drift and a half kick with the new forces. O is fused with the drifts, so the thermostat adds no pass over the velocities, and needs no kinetic energy. BAOAB samples the canonical configurations with a small error even at large dt.
+    The Gaussian numbers R are drawn batch steps at a time, in one call of the generator. With rigid bonds, SHAKE follows the drifts and RATTLE the last kick.
+
+    Attributes:
+        engine (Engine): The engine whose System, forces and profiler are used.
+        T (float): Target temperature.
+        tau (float): Relaxation time of the velocities, the inverse of the friction.
+        batch (int): Number of steps of random numbers drawn at once.
+        rng (numpy.random.Generator): Source of the random numbers.
+
+    Methods:
+        step(dt): Makes one BAOAB step and leaves the forces and accelerations at the new positions in the System.
+    """
+    name = "langevin"
+
+    def __init__(self, engine, T, tau, batch=32, seed=None):
+        self.engine = engine
+        self.T = T
+        self.tau = tau
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+
+        self._noise = None
+        self._next_noise = 0
+        # Noise amplitude c2 sqrt(T / m) per atom, and what it was computed for
+        self._sigma = None
+        self._sigma_key = None
+        # Engine step at which the accelerations are those of the positions
+        self._next_step = None
+
+    def _draw(self, shape):
+        # One (N, 2) slice of the batch per step
+        if self._noise is None or self._noise.shape[1:] != shape or self._next_noise == self.batch:
+            self._noise = self.rng.standard_normal((self.batch,) + shape)
+            self._next_noise = 0
+        noise = self._noise[self._next_noise]
+        self._next_noise += 1
+        return noise
+
+    def _amplitude(self, c2):
+        # Masses and mobility flags are replaced, not modified, when the atoms are reordered
+        system = self.engine.system
+        masses = system.masses
+        key = (id(masses), id(system.mobile), len(masses), self.T, c2)
+        if key != self._sigma_key:
+            # No noise on the frozen atoms, which stay at rest
+            self._sigma = (c2 * np.sqrt(self.T / masses) * system.mobile)[:, None]
+            self._sigma_key = key
+        return self._sigma
+
+    def step(self, dt):
+        engine = self.engine
+        system = engine.system
+        if self._next_step != engine.step_count:
+            engine.calc_forces()
+            engine.update_acc()
+
+        c1 = np.exp(-dt / self.tau)
+        c2 = np.sqrt(1 - c1 * c1)
+        noise = self._draw(system.velocities.shape)
+        sigma = self._amplitude(c2)
+
+        constraints = engine.constraints
+        with engine.profiler.section("integration"):
+            old_positions = system.positions.copy() if constraints is not None else None
+
+            # B, then A O A: the drifts use the velocities before and after O
+            v_half = system.velocities + 0.5 * dt * system.accelerations
+            system.velocities = c1 * v_half + sigma * noise
+            system.positions += 0.5 * dt * (v_half + system.velocities)
+
+        # The constraint forces take the noise along the rigid bonds out
+        if constraints is not None:
+            constraints.shake(old_positions, dt)
+        with engine.profiler.section("integration"):
+            engine.wrap_positions()
+
+        engine.calc_forces()
+        engine.update_acc()
+        with engine.profiler.section("integration"):
+            system.velocities += 0.5 * dt * system.accelerations
+        if constraints is not None:
+            constraints.rattle(dt)
+
+        # The engine ends this step next, the forces are valid for the one after
+        self._next_step = engine.step_count + 1
+
+
+class NoseHooverChain():
+    """Nosé-Hoover chain thermostat (Martyna, Klein and Tuckerman 1992) around velocity-Verlet steps.
+
+    A chain of length thermostats of positions xi and velocities v_xi is coupled to the kinetic energy K: v_xi[0] is driven by 2K - n_dof T, each following one by the kinetic energy of the previous one, with masses Q[0] = n_dof T tau^2 and Q[j] = T tau^2. The dynamics is deterministic and samples the canonical ensemble.
+    Each step is the symmetric splitting N(dt/2) B A B N(dt/2). The chain only needs K and scales all the velocities by one factor, so the N half steps are scalar updates: the trailing one is merged with the leading one of the next step, and their scaling is fused into its first kick. K is computed once per step, from the observables on recorded steps. With rigid bonds, SHAKE follows the drift and RATTLE the last kick.
+
+    Attributes:
+        engine (Engine): The engine whose System, forces and profiler are used.
+        T (float): Target temperature.
+        tau (float): Period of the thermostat oscillations.
+        xi (numpy.ndarray): Positions of the chain thermostats.
+        v_xi (numpy.ndarray): Velocities of the chain thermostats.
+        kinetic (float): Kinetic energy at the end of the last step, before its trailing half step.
+
+    Methods:
+        step(dt): Makes one velocity-Verlet step with the chain, and leaves the forces and accelerations at the new positions in the System.
+        couple(kinetic): Gives the kinetic energy at the end of the step to the chain, called by the engine after each step.
+        flush(): Applies the trailing half step of the last step to the velocities, called by the engine when another integrator takes over or the phase ends.
+        energy(): Returns the energy of the chain, conserved with that of the System.
+    """
+    name = "nose_hoover"
+
+    def __init__(self, engine, T, tau, length=3):
+        self.engine = engine
+        self.T = T
+        self.tau = tau
+        self.xi = np.zeros(max(length, 1))
+        self.v_xi = np.zeros(max(length, 1))
+        self.kinetic = None
+
+        # Time step of the trailing half step not applied yet
+        self._pending = 0.0
+        self._next_step = None
+
+    def _n_dof(self):
+        return self.engine.system.n_dof()
+
+    def _masses(self):
+        Q = np.full(len(self.xi), self.T * self.tau ** 2)
+        Q[0] *= self._n_dof()
+        return Q
+
+    def _half_step(self, K, dt):
+        # Chain update over dt, returns the scaling of the particle velocities
+        T, Q, v = self.T, self._masses(), self.v_xi
+        n, M = self._n_dof(), len(v)
+        h, q = dt / 2, dt / 4
+
+        def force(j, K):
+            if j == 0:
+                return (2 * K - n * T) / Q[0]
+            return (Q[j - 1] * v[j - 1] ** 2 - T) / Q[j]
+
+        v[M - 1] += h * force(M - 1, K)
+        for j in range(M - 2, -1, -1):
+            v[j] *= np.exp(-q * v[j + 1])
+            v[j] += h * force(j, K)
+            v[j] *= np.exp(-q * v[j + 1])
+
+        scale = np.exp(-dt * v[0])
+        K *= scale * scale
+        self.xi += dt * v
+
+        for j in range(M - 1):
+            v[j] *= np.exp(-q * v[j + 1])
+            v[j] += h * force(j, K)
+            v[j] *= np.exp(-q * v[j + 1])
+        v[M - 1] += h * force(M - 1, K)
+        return scale, K
+
+    def couple(self, kinetic):
+        self.kinetic = kinetic
+
+    def flush(self):
+        # Only owed if nothing else moved the atoms since the last step
+        engine = self.engine
+        if self._pending and self._next_step == engine.step_count and self.kinetic is not None:
+            scale, self.kinetic = self._half_step(self.kinetic, self._pending)
+            with engine.profiler.section("integration"):
+                engine.system.velocities *= scale
+        # A following step of the chain goes on with its leading half step only
+        self._pending = 0.0
+
+    def step(self, dt):
+        engine = self.engine
+        system = engine.system
+
+        if self._next_step != engine.step_count:
+            # Another kind of step came in between: fresh start
+            engine.calc_forces()
+            engine.update_acc()
+            self.kinetic = kinetic_energy(system.masses, system.velocities)
+            self._pending = 0.0
+
+        # Trailing half step of the last step, then leading half step of this one
+        scale, K = 1.0, self.kinetic
+        for h in (self._pending, 0.5 * dt):
+            if h:
+                s, K = self._half_step(K, h)
+                scale *= s
+
+        constraints = engine.constraints
+        with engine.profiler.section("integration"):
+            old_positions = system.positions.copy() if constraints is not None else None
+            system.velocities *= scale
+            system.velocities += 0.5 * dt * system.accelerations
+            system.positions += dt * system.velocities
+
+        if constraints is not None:
+            constraints.shake(old_positions, dt)
+        with engine.profiler.section("integration"):
+            engine.wrap_positions()
+
+        engine.calc_forces()
+        engine.update_acc()
+        with engine.profiler.section("integration"):
+            system.velocities += 0.5 * dt * system.accelerations
+        if constraints is not None:
+            constraints.rattle(dt)
+
+        self._pending = 0.5 * dt
+        self._next_step = engine.step_count + 1
+
+    def energy(self):
+        Q = self._masses()
+        return 0.5 * np.dot(Q, self.v_xi ** 2) + self.T * (self._n_dof() * self.xi[0] + self.xi[1:].sum())
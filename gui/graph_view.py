@@ -5,11 +5,17 @@ class GraphView():
     """GraphView class for visualizing data in a graphical plot.
     
     This class initializes a plot with specified titles for the x and y axes, and provides a method to update the plot with new data.
+    The plot widget is only built the first time the graph is shown, so unused graphs cost nothing at startup; until then update does nothing.
+    When the recorder keeps streaming statistics for the key, the running mean and its block-averaged error are drawn as a line and a band.
     
     Attributes:
         name (str): The title of the graph.
-        plot (pg.PlotWidget): The plot widget used for rendering the graph.
+        x_axis (str): The label of the x-axis.
+        y_axis (str): The label of the y-axis.
+        plot (pg.PlotWidget): The plot widget used for rendering the graph, None until build() is called.
         curve: The curve object representing the data series in the plot.
+        mean_line (pg.InfiniteLine): Horizontal line at the running mean.
+        error_band (pg.LinearRegionItem): Horizontal band mean +/- error.
     
     Args:
         name (str): The name of the graph.
@@ -17,36 +23,69 @@ class GraphView():
         y_axis (str, optional): The label for the y-axis. Defaults to None.
     
     Methods:
+        build():
+            Builds the plot widget on first call, and returns it.
+
         update(engine, key):
             Updates the plot with new data from the specified engine and key.
     """
     def __init__(self, name, x_axis=None, y_axis=None):
         
         self.name = name
+        self.x_axis = x_axis
+        self.y_axis = y_axis
+
+        # Widgets are built by build(), the first time the graph is shown
+        self.plot = None
+        self.curve = None
+        self.error_band = None
+        self.mean_line = None
+
+    def build(self):
+        if self.plot is not None:
+            return self.plot
 
         # Create plot
         self.plot = pg.PlotWidget()
-        self.plot.setTitle(name)
+        self.plot.setTitle(self.name)
 
         # Creat curve
         self.curve = self.plot.plot(pen='y')
 
+        # Running mean +/- error, hidden until there are statistics
+        self.error_band = pg.LinearRegionItem(orientation="horizontal",
+                                              movable=False,
+                                              brush=(0, 200, 255, 50),
+                                              pen=pg.mkPen(None))
+        self.mean_line = pg.InfiniteLine(angle=0, movable=False,
+                                         pen=pg.mkPen((0, 200, 255), style=pg.QtCore.Qt.DashLine))
+        self.plot.addItem(self.error_band)
+        self.plot.addItem(self.mean_line)
+        self.error_band.hide()
+        self.mean_line.hide()
+
         # Axis labels
         ## Axis style
         axis_style = {"color": "white", "font-size": "16px"}
 
-        if x_axis:
-            self.plot.setLabel("bottom", x_axis, **axis_style)
+        if self.x_axis:
+            self.plot.setLabel("bottom", self.x_axis, **axis_style)
         
-        if y_axis:
-            self.plot.setLabel("left", y_axis, **axis_style)
+        if self.y_axis:
+            self.plot.setLabel("left", self.y_axis, **axis_style)
 
         # Background grid
         self.plot.showGrid(x=True, y=True)
 
+        return self.plot
+
 
     def update(self, engine, key):
         
+        # Never shown, nothing to draw
+        if self.plot is None:
+            return
+
         data = getattr(engine.recorder, key, None)
 
         if data is None:
@@ -54,3 +93,40 @@ class GraphView():
 
         self.curve.setData(data)
 
+        stats = getattr(engine.recorder, "stats", {}).get(key)
+        if stats is None or stats.n < 2:
+            self.error_band.hide()
+            self.mean_line.hide()
+            self.plot.setTitle(self.name)
+            return
+
+        mean, err = stats.mean, stats.error()
+        self.mean_line.setValue(mean)
+        self.error_band.setRegion((mean - err, mean + err))
+        self.mean_line.show()
+        self.error_band.show()
+        self.plot.setTitle(f"{self.name}: {mean:.5g} \u00b1 {err:.2g}")
+
+
+class AnalysisView(GraphView):
+    """AnalysisView class plotting the result of an engine analysis stage, e.g. the live g(r).
+
+    The stage is looked up by key in engine.analyses, and its result() must return the x and y arrays.
+
+    Methods:
+        update(window, key):
+            Updates the plot with the current result of the analysis stage named key.
+    """
+    def update(self, window, key):
+
+        if self.plot is None:
+            return
+
+        engine = getattr(window, "engine", None)
+        stage = engine.analyses.get(key) if engine is not None else None
+
+        if stage is None:
+            return
+
+        x, y = stage.result()
+        self.curve.setData(x, y)
@@ -70,7 +70,8 @@ class GraphsPanel(QWidget):
             )
 
     def _display_graph_onclick(self, state, graph_name):
-        graph = self.graph_manager.graphs[graph_name].plot
+        # The plot widget is built the first time the graph is selected
+        graph = self.graph_manager.graphs[graph_name].build()
         graph.setMinimumSize(300, 200)
 
         if state == 2:
@@ -1,10 +1,10 @@
 import logging
+import os
 from PyQt5.QtCore import QSize, Qt
 from PyQt5.QtWidgets import QMainWindow, QSplitter, QMessageBox
 from gui.params_panel import ParamsPanel
 from gui.graphs_panel import GraphsPanel
 from gui.atoms_panel import AtomsPanel
-from engine.md_engine import Engine
 from assets.recorder import MDRecorder
 from pyqtgraph.Qt import QtCore # type: ignore
 
@@ -24,17 +24,21 @@ class MainWindow(QMainWindow):
         md_params (dict): Dictionary containing parameters for the molecular dynamics simulation.
         phases (list): List of phases to be executed during the simulation.
         phase_index (int): Index of the current phase being executed.
+        monte_carlo (MonteCarlo): Monte Carlo sampler of the equilibration phase, when its method is "mc".
     
     Methods:
         __init__(): Initializes the main window, sets up the GUI, and connects buttons to their respective functions.
         _check_params_wrapper(): Validates the parameters entered by the user and displays a message box with the results.
+        _apply_params(): Pushes the validated ParamsPanel.LIVE_PARAMS changes into the running engine, between two of its steps.
         _start_md(): Starts the molecular dynamics simulation after validating parameters.
         set_fonction(fonction): Sets a function to be called at regular intervals using a timer.
         _stop_md(): Stops the molecular dynamics simulation and resets the recorder.
-        update_all(): Updates the visualization of atoms and graphs.
+        _start_process_md(): Starts the simulation in a separate engine process, read through shared memory.
+        process_update(): Renders the latest shared frame and series of the engine process.
+        update_all(): Updates the visualization of atoms and graphs, timed as "render" by the engine profiler.
         minimization(): Performs a minimization step in the simulation.
-        equilibration(): Performs an equilibration step in the simulation.
-        production(): Runs a production step in the simulation.
+        equilibration(): Performs an equilibration step (MD with the Berendsen, Langevin or Nosé-Hoover thermostat) or Monte Carlo sweep in the simulation.
+        production(): Runs a production step in the simulation, thermostatted if prod_thermostat is set.
         run_md(): Initiates the molecular dynamics simulation phases based on user-selected options.
         start_phase(phase_name): Starts the specified phase of the simulation.
         next_phase(): Advances to the next phase of the simulation, if available.
@@ -42,8 +46,8 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        # Load style
-        with open("gui/style.qss", "r") as f:
+        # Load style, next to this file whatever the working directory
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.qss"), "r") as f:
             self.setStyleSheet(f.read())
 
         self.setWindowTitle("DynAtom")
@@ -71,6 +75,7 @@ class MainWindow(QMainWindow):
         # self.params_panel.params_valid.connect(self._params_valid)
         # self.params_panel.params_invalid.connect(self._params_invalid)
         self.params_panel.check_btn.clicked.connect(self._check_params_wrapper)
+        self.params_panel.apply_btn.clicked.connect(self._apply_params)
 
         # ------------------
         #  Atom dynamic panel
@@ -104,15 +109,30 @@ class MainWindow(QMainWindow):
         self.step = 0
 
 
+    def _show_errors(self, errors):
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Warning)
+        msg.setWindowTitle("Parameter Error")
+        msg.setText("Please correct the following errors:")
+        msg.setInformativeText("\n".join(errors))
+        msg.exec_()
+
+    def _show_failure(self, error):
+        # First line in the box, the traceback behind "Show Details"
+        summary, _, details = error.partition("\n")
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Critical)
+        msg.setWindowTitle("Engine Error")
+        msg.setText(summary)
+        if details:
+            msg.setInformativeText(details.strip().splitlines()[-1])
+            msg.setDetailedText(details)
+        msg.exec_()
+
     def _check_params_wrapper(self):
         values, errors = self.params_panel._check_params()
         if errors:
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Warning)
-            msg.setWindowTitle("Parameter Error")
-            msg.setText("Please correct the following errors:")
-            msg.setInformativeText("\n".join(errors))
-            msg.exec_()
+            self._show_errors(errors)
             return None, errors
 
         else:
@@ -123,6 +143,48 @@ class MainWindow(QMainWindow):
             msg.exec_()
             return values, None
 
+    def _apply_params(self):
+        if getattr(self, "engine", None) is None or not getattr(self, "md_params", None):
+            logging.warning("No simulation to apply the parameters to")
+            return
+
+        values, errors = self.params_panel._check_params()
+        if errors:
+            self._show_errors(errors)
+            return
+
+        changes = {key: values[key] for key in self.params_panel.LIVE_PARAMS
+                   if key in values and values[key] != self.md_params.get(key)}
+        later = [key for key, value in values.items()
+                 if key not in self.params_panel.LIVE_PARAMS and value != self.md_params.get(key)]
+        if later:
+            logging.warning(f"Only applied at the next start: {', '.join(later)}")
+        if not changes:
+            return
+
+        if getattr(self, "replicas", None) is not None:
+            self._show_errors(["The replicas of parallel tempering keep their parameters, "
+                               "apply the changes after the equilibration"])
+            return
+        if "boxsize" in changes and self.md_params["trajectory_file"]:
+            self._show_errors(["The box cannot be rescaled while a trajectory is exported"])
+            return
+
+        # Timer callbacks run one at a time: the engine is between two steps
+        try:
+            self.engine.set_params(changes)
+        except (ValueError, RuntimeError) as error:
+            self._show_errors([str(error)])
+            return
+        self.md_params.update(changes)
+        logging.info(f"Parameters applied: {changes}")
+
+        if "boxsize" in changes:
+            self.atoms_panel.view.add_box(changes["boxsize"])
+            if getattr(self, "monte_carlo", None) is not None:
+                self.monte_carlo.reset_cells()
+            self.update_all()
+
     def _start_md(self):
 
         values, errors = self._check_params_wrapper()
@@ -136,12 +198,97 @@ class MainWindow(QMainWindow):
             logging.info(f"MD parameters are: {values}")
             self.md_params = values
 
-        self.engine = Engine(self.md_params, self.recorder)
+        # Only one engine process at a time
+        self._stop_engine_process()
+        self._close_trajectories()
+
+        # Atom count and box of the configuration file, before building the views
+        if self.md_params["init_file"]:
+            from assets.loaders import peek_configuration
+            n_atoms, boxsize = peek_configuration(self.md_params["init_file"])
+            self.md_params["n_atoms"] = n_atoms
+            if boxsize:
+                self.md_params["boxsize"] = boxsize
+            # The panel shows what runs, Apply compares against it
+            self.params_panel.n_atoms.setText(str(n_atoms))
+            self.params_panel.boxsize.setText(str(self.md_params["boxsize"]))
+
+        self.atoms_panel.view.add_box(self.md_params["boxsize"])
+        self.atoms_panel.view.set_render_threshold(values["render_threshold"])
+
+        if self.md_params["engine_process"]:
+            self._start_process_md()
+            return
 
-        self.atoms_panel.view.add_box(values["boxsize"])
+        # Fresh recorder, per-atom frames kept every frame_stride records
+        self.recorder = MDRecorder(stride=self.md_params["record_stride"],
+                                   frame_stride=self.md_params["frame_stride"])
+        if self.md_params["domain_workers"]:
+            # Slabs of the box stepped by worker processes
+            from engine.domain import DomainEngine
+            self.engine = DomainEngine(self.md_params, self.recorder)
+        else:
+            from engine.md_engine import Engine
+            self.engine = Engine(self.md_params, self.recorder)
+
+        # Trajectory export, written by a background thread
+        if self.md_params["trajectory_file"]:
+            from assets.trajectory import open_trajectory
+            system = self.engine.system
+            self.recorder.add_writer(open_trajectory(self.md_params["trajectory_file"],
+                                                     system.by_id(system.species),
+                                                     self.md_params["boxsize"],
+                                                     self.md_params["trajectory_every"],
+                                                     self.md_params["trajectory_precision"]))
+
+        # Live g(r), sampled every rdf_every steps
+        if self.md_params["rdf_every"] > 0:
+            from analysis.rdf import RDFAccumulator
+            # The tabulated kernels only keep the pairs within the cutoff
+            r_max = None
+            if self.md_params["force_backend"] != "dense" and not self.md_params["domain_workers"]:
+                r_max = min(0.5 * self.md_params["boxsize"], self.engine.potential.cutoff)
+            self.engine.add_analysis("rdf", RDFAccumulator(self.md_params["boxsize"], r_max=r_max,
+                                                           every=self.md_params["rdf_every"]))
 
         self.run_md()
 
+    def _start_process_md(self):
+        # The GUI only renders, the phases run in the engine process
+        from engine.process_engine import EngineProcess
+        self.engine = EngineProcess(self.md_params)
+        self.recorder = self.engine.recorder
+        self.engine.start()
+        self.set_fonction(self.process_update)
+
+    def process_update(self):
+        try:
+            finished = self.engine.poll()
+        except RuntimeError as error:
+            # The last frame stays on screen, nothing more will come
+            self.timer.stop()
+            logging.error(str(error))
+            self._show_failure(str(error))
+            return
+        self.update_all()
+
+        if finished:
+            self.timer.stop()
+
+    def _stop_engine_process(self):
+        # EngineProcess and DomainEngine have worker processes to stop
+        stop = getattr(getattr(self, "engine", None), "stop", None)
+        if stop is not None:
+            stop()
+        if getattr(self, "replicas", None) is not None:
+            self.replicas.stop()
+            self.replicas = None
+
+    def _close_trajectories(self):
+        # Flush the trajectory files before dropping the recorder
+        if isinstance(self.recorder, MDRecorder):
+            self.recorder.close_writers()
+
     def set_fonction(self, fonction):
         if not hasattr(self, "timer"):
             self.timer = QtCore.QTimer()
@@ -159,11 +306,22 @@ class MainWindow(QMainWindow):
     def _stop_md(self):
         if hasattr(self, "timer"):
             self.timer.stop()
+        self._stop_engine_process()
+        self._close_trajectories()
+        # Nothing to apply parameters to until the next start
+        self.engine = None
         # reset recorder = reset atomview et graphview
         self.recorder = MDRecorder()
     def update_all(self):
-        self.atoms_panel.view.update_positions(self.engine)
-        self.graphs_panel.graph_manager.update_all(self)
+        profiler = self.engine.profiler
+        with profiler.section("render"):
+            self.atoms_panel.view.update_positions(self.engine)
+            self.graphs_panel.graph_manager.update_all(self)
+
+        profiler.count("frames")
+        # Refresh the overlay every 30 frames only
+        if profiler.enabled and profiler.counters["frames"] % 30 == 0:
+            self.atoms_panel.view.show_stats(profiler.stats())
 
     def minimization(self):
         keys = ["mini_n_steps", "mini_dt", "mini_conv_crit"]
@@ -172,6 +330,8 @@ class MainWindow(QMainWindow):
         self.step += 1
         if (self.step % 1000) == 0:
             logging.info(f"Minimisation step {self.step}")
+            if self.engine.profiler.enabled:
+                logging.info(self.engine.profiler.summary())
 
         converged  = self.engine.minimize_step(dt, conv_crit)
         self.update_all()
@@ -187,14 +347,28 @@ class MainWindow(QMainWindow):
             return
 
     def equilibration(self):
+        if self.md_params.get("eq_method") == "pt":
+            self.parallel_tempering()
+            return
+
         keys = ["eq_n_steps", "eq_dt", "temperature", "eq_tau"]
         n_steps, dt, T_target, tau = [self.md_params.get(k) for k in keys]
 
         self.step += 1
         if (self.step % 1000) == 0:
             logging.info(f"Equilibration step {self.step}")
-
-        self.engine.equilibrate_step(self.step, dt, T_target, tau)
+            if self.md_params.get("eq_method") == "mc":
+                logging.info(f"MC acceptance {self.monte_carlo.acceptance:.2f}, "
+                             f"max step {self.monte_carlo.max_step:.3g}")
+            if self.engine.profiler.enabled:
+                logging.info(self.engine.profiler.summary())
+
+        if self.md_params.get("eq_method") == "mc":
+            self.monte_carlo.sweep(T_target)
+        else:
+            self.engine.equilibrate_step(self.step, dt, T_target, tau,
+                                         self.md_params.get("eq_respa_k", 1),
+                                         self.md_params.get("eq_thermostat", "berendsen"))
         self.update_all()
 
         if self.step >= n_steps:
@@ -202,11 +376,37 @@ class MainWindow(QMainWindow):
             self.next_phase()
             return
 
+    def parallel_tempering(self):
+        # The replicas run on their own, a tick only collects finished rounds
+        if self.replicas.poll():
+            self.step += self.replicas.exchange_every
+            if self.replicas.rounds % 50 == 0:
+                logging.info(f"Parallel tempering step {self.step}, {self.replicas.summary()}")
+
+            # The viewer follows the replica at the target temperature
+            positions, _ = self.replicas.read_target()
+            self.engine.snapshot.publish(positions, self.engine.step_count + self.step)
+            self.update_all()
+
+        if self.step >= self.md_params["eq_n_steps"]:
+            self.replicas.finish(self.engine)
+            self.replicas = None
+            logging.info("Equilibration finished")
+            self.next_phase()
+
     def production(self):
         keys = ["prod_n_steps", "prod_dt"]
         n_steps, dt = [self.md_params.get(k) for k in keys]
 
-        self.engine.run_once(dt)
+        respa_k = self.md_params.get("prod_respa_k", 1)
+        thermostat = self.md_params.get("prod_thermostat", "none")
+        if thermostat != "none":
+            self.engine.run_thermostat(dt, thermostat, self.md_params["temperature"],
+                                       self.md_params["prod_tau"])
+        elif respa_k > 1:
+            self.engine.run_respa(dt, respa_k)
+        else:
+            self.engine.run_once(dt)
         self.update_all()
 
         if self.step >= n_steps:
@@ -251,22 +451,43 @@ class MainWindow(QMainWindow):
 
         elif phase_name == "eq":
             logging.info("Starting equilibration...")
+            if self.md_params.get("eq_method") == "mc":
+                from engine.monte_carlo import MonteCarlo
+                self.monte_carlo = MonteCarlo(self.engine, self.md_params["temperature"],
+                                              self.md_params["mc_acceptance"])
+            elif self.md_params.get("eq_method") == "pt":
+                from engine.replica_exchange import ReplicaExchange
+                self.replicas = ReplicaExchange(self.engine, self.md_params)
             self.timer.timeout.connect(self.equilibration)
 
         elif phase_name == "prod":
             logging.info("Starting production...")
             self.timer.timeout.connect(self.production)
 
+        # Fastest force kernel for the workload, with the "auto" backend
+        tune_backend = getattr(self.engine, "tune_backend", None)
+        if tune_backend is not None:
+            tune_backend()
+
+        # Stats are reported per phase
+        self.engine.profiler.reset()
+        self.recorder.reset_stats()
+
         self.step = 0
         self.timer.start(16)
 
     def next_phase(self):
+        # Velocities of the last step complete before the next phase or the end
+        flush_thermostat = getattr(self.engine, "flush_thermostat", None)
+        if flush_thermostat is not None:
+            flush_thermostat()
 
         self.phase_index += 1
 
         if self.phase_index >= len(self.phases):
             logging.info("All selected phases completed")
             self.timer.stop()
+            self.recorder.close_writers()
             return
 
         next_phase = self.phases[self.phase_index]
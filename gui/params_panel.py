@@ -1,9 +1,11 @@
+import os
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QLineEdit, QLabel, QGroupBox, QFormLayout,
     QCheckBox
 )
 from PyQt5.QtCore import pyqtSignal
+from engine.choices import FORCE_BACKENDS, POTENTIALS, THERMOSTATS, TRAJECTORY_FORMATS, LOADERS
 
 
 class ParamsPanel(QWidget):
@@ -18,6 +20,8 @@ class ParamsPanel(QWidget):
         params_min (dict): A dictionary of minimization parameters with their labels, default values, and expected types.
         params_eq (dict): A dictionary of equilibration parameters with their labels, default values, and expected types.
         params_prod (dict): A dictionary of production parameters with their labels, default values, and expected types.
+        param_choices (dict): The allowed values of the parameters restricted to a set of names.
+        LIVE_PARAMS (list): The parameters the Apply button pushes into a running simulation, the others wait for the next start.
     
     Methods:
         _add_parameters_box(param_name, params):
@@ -32,6 +36,9 @@ class ParamsPanel(QWidget):
         _update_visibility():
             Updates the visibility of the parameter sections based on the state of the corresponding checkboxes.
     """
+    # Read by the engine between two steps, see Engine.set_params
+    LIVE_PARAMS = ["temperature", "boxsize", "mini_dt", "eq_dt", "eq_tau", "prod_dt", "prod_tau"]
+
     def __init__(self):
         super().__init__()
 
@@ -47,11 +54,14 @@ class ParamsPanel(QWidget):
         self.start_btn = QPushButton("Start")
         self.stop_btn = QPushButton("Stop")
         self.check_btn = QPushButton("Check Parameters")
+        self.apply_btn = QPushButton("Apply")
+        self.apply_btn.setToolTip("Push the temperature, box size, time steps and taus into the running simulation")
 
         # Add buttons to layout
         self.button_layout.addWidget(self.start_btn)
         self.button_layout.addWidget(self.stop_btn)
         self.button_layout.addWidget(self.check_btn)
+        self.button_layout.addWidget(self.apply_btn)
 
         # Add the layout inside the box
         self.button_box.setLayout(self.button_layout)
@@ -63,13 +73,41 @@ class ParamsPanel(QWidget):
         # ----- Parameters -----
         # Define parameters
         self.params_general = {
-            "boxsize": ("Box size", 10, int),
+            "boxsize": ("Box size", 10, float),
             "temperature": ("Temperature", 300, int),
             "n_atoms": ("Number of Atoms", 50, int),
+            "init_file": ("Initial configuration (empty: random)", "", str),
+            "render_threshold": ("Density view above", 50000, int),
+            "record_stride": ("Record every", 1, int),
+            "frame_stride": ("Record frames every", 1, int),
+            "rdf_every": ("g(r) every", 10, int),
+            "force_backend": ("Force backend (auto: fastest)", "dense", str),
+            "potential": ("Potential", "LJ", str),
+            "cutoff": ("Cutoff (0: none)", 0, float),
+            "reorder_every": ("Reorder atoms every (0: never)", 100, int),
+            "respa_split": ("RESPA short-range cutoff", 2.0, float),
+            "respa_width": ("RESPA switching width", 0.5, float),
+            "bond_stiffness": ("Flexible bond stiffness", 500.0, float),
+            "trajectory_file": ("Trajectory file (.xyz, .extxyz, .dcd, .dtrj)", "", str),
+            "trajectory_every": ("Export every (records)", 10, int),
+            "trajectory_precision": (".dtrj precision (x box)", 1e-4, float),
 
             "enable_min": ("Compute Minimisation", None, bool),
             "enable_eq": ("Compute Equilibration", None, bool),
             "enable_prod": ("Compute Production", None, bool),
+            "enable_profiling": ("Profiling", False, bool),
+            "constrain_bonds": ("Rigid bonds (SHAKE/RATTLE)", True, bool),
+            "engine_process": ("Engine in separate process", False, bool),
+            "domain_workers": ("Domain decomposition workers (0: off)", 0, int),
+        }
+
+        self.param_choices = {
+            "force_backend": FORCE_BACKENDS + ["auto"],
+            "potential": POTENTIALS,
+            "eq_method": ["md", "mc", "pt"],
+            "pt_moves": ["md", "mc"],
+            "eq_thermostat": THERMOSTATS,
+            "prod_thermostat": ["none"] + THERMOSTATS[1:],
         }
 
         self.params_min = {
@@ -83,11 +121,23 @@ class ParamsPanel(QWidget):
             "eq_dt": ("Integration step", 1e-4, float),
             "temperature": ("Target temperature", 300, float),
             "eq_tau": ("Tau", 1e-3, float),
+            "eq_thermostat": ("Thermostat (berendsen, langevin, nose_hoover)", "berendsen", str),
+            "nhc_length": ("Nosé-Hoover chain length", 3, int),
+            "eq_method": ("Method (md, mc, pt)", "md", str),
+            "mc_acceptance": ("MC target acceptance", 0.5, float),
+            "eq_respa_k": ("RESPA inner steps (1: off)", 1, int),
+            "pt_replicas": ("Parallel tempering replicas", 4, int),
+            "pt_max_temperature": ("Highest replica temperature", 600, float),
+            "pt_exchange_every": ("Replica swaps every", 10, int),
+            "pt_moves": ("Replica moves (md, mc)", "md", str),
         }
 
         self.params_prod = {
             "prod_n_steps": ("Production steps", 1000, int),
             "prod_dt": ("Integration step", 1e-4, float),
+            "prod_respa_k": ("RESPA inner steps (1: off)", 1, int),
+            "prod_thermostat": ("Thermostat (none, langevin, nose_hoover)", "none", str),
+            "prod_tau": ("Thermostat tau", 1e-2, float),
         }
 
         # Iteratively add parameters
@@ -101,6 +151,10 @@ class ParamsPanel(QWidget):
         self.enable_eq.stateChanged.connect(self._update_visibility)
         self.enable_prod.stateChanged.connect(self._update_visibility)
 
+        # Enter in a live field applies it
+        for param in self.LIVE_PARAMS:
+            getattr(self, param).returnPressed.connect(self.apply_btn.click)
+
         # Flexible space at the end to up the boxes
         self.layout.addStretch()
 
@@ -126,7 +180,8 @@ class ParamsPanel(QWidget):
             
             if expected_type is bool:
                 widget = QCheckBox()
-                widget.setChecked(True)
+                # Checked unless a default is given
+                widget.setChecked(True if text is None else text)
             else:
                 widget = QLineEdit()
                 widget.setText(str(text))
@@ -168,8 +223,117 @@ class ParamsPanel(QWidget):
                                 value must be of type: {expected_type.__name__}")
                     value = None
 
+                choices = self.param_choices.get(param)
+                if choices is not None and value not in choices:
+                    errors.append(f"{label} must be one of: {', '.join(choices)}")
+
                 values[param] = value
 
+        # Loaded at the first check rather than with the window
+        from engine.potentials import potential_from_params
+        from engine.respa import split_potential
+        from assets.loaders import peek_bonds, peek_frozen
+
+        # Only the tabulated backends handle other potentials than LJ
+        if values.get("force_backend") == "dense" and values.get("potential") != "LJ":
+            errors.append("The dense backend only computes the LJ potential")
+
+        init_file = values.get("init_file")
+        if init_file and os.path.splitext(init_file)[1].lower() not in LOADERS:
+            errors.append(f"Initial configuration must end with one of: {', '.join(LOADERS)}")
+        elif init_file and not os.path.isfile(init_file):
+            errors.append(f"Initial configuration {init_file} not found")
+        elif init_file and (peek_bonds(init_file) or peek_frozen(init_file)):
+            # Only the pair forces of all the atoms are known to these methods
+            respa = any((values.get(k) or 1) > 1 for k in ("eq_respa_k", "prod_respa_k"))
+            mc = values.get("eq_method") == "mc" or \
+                 (values.get("eq_method") == "pt" and values.get("pt_moves") == "mc")
+            if respa or mc or values.get("domain_workers"):
+                errors.append("Configurations with bonds or frozen atoms run without Monte Carlo moves, "
+                              "RESPA and the domain decomposition")
+            if peek_bonds(init_file) and not values.get("constrain_bonds") \
+                    and (values.get("bond_stiffness") or 0) <= 0:
+                errors.append("The flexible bond stiffness must be positive")
+
+        trajectory = values.get("trajectory_file")
+        if trajectory and os.path.splitext(trajectory)[1].lower() not in TRAJECTORY_FORMATS:
+            errors.append(f"Trajectory file must end with one of: {', '.join(TRAJECTORY_FORMATS)}")
+
+        if trajectory and not 0 < (values.get("trajectory_precision") or 0) < 1:
+            errors.append(".dtrj precision must be between 0 and 1")
+
+        if values.get("eq_method") == "mc" and not 0 < (values.get("mc_acceptance") or 0) < 1:
+            errors.append("MC target acceptance must be between 0 and 1")
+
+        # The moves use the tabulated potential, cut at the potential cutoff
+        mc_moves = values.get("eq_method") == "mc" or \
+                   (values.get("eq_method") == "pt" and values.get("pt_moves") == "mc")
+        if mc_moves and values.get("force_backend") == "dense" and not values.get("cutoff"):
+            errors.append("Monte Carlo moves need the same cutoff as the force kernel: "
+                          "set a cutoff or use the table, cells or auto backend")
+
+        respa_k = [values.get(k) for k in ("eq_respa_k", "prod_respa_k")]
+        if any(k is not None and k < 1 for k in respa_k):
+            errors.append("RESPA inner steps must be at least 1")
+        elif any(k is not None and k > 1 for k in respa_k) and values.get("potential") in POTENTIALS:
+            try:
+                split_potential(potential_from_params(values), values.get("respa_split") or 0,
+                                values.get("respa_width") or 0)
+            except ValueError as error:
+                errors.append(f"RESPA: {error}")
+            # The fast and slow tables are cut at the potential cutoff
+            if values.get("force_backend") == "dense" and not values.get("cutoff"):
+                errors.append("RESPA needs the same cutoff as the force kernel: "
+                              "set a cutoff or use the table, cells or auto backend")
+
+        # The fused thermostats replace the whole integrator step, RESPA included
+        for phase in ("eq", "prod"):
+            if values.get(f"{phase}_thermostat") in ("langevin", "nose_hoover"):
+                if (values.get(f"{phase}_respa_k") or 1) > 1:
+                    errors.append("RESPA only runs with the Berendsen thermostat or without thermostat")
+                if (values.get(f"{phase}_tau") or 0) <= 0:
+                    errors.append("The thermostat tau must be positive")
+        if values.get("eq_thermostat") == "nose_hoover" and (values.get("nhc_length") or 0) < 1:
+            errors.append("The Nosé-Hoover chain needs at least 1 thermostat")
+
+        if values.get("eq_method") == "pt":
+            if (values.get("pt_replicas") or 0) < 2:
+                errors.append("Parallel tempering needs at least 2 replicas")
+            if (values.get("pt_max_temperature") or 0) <= (values.get("temperature") or 0):
+                errors.append("The highest replica temperature must be above the target temperature")
+            if (values.get("pt_exchange_every") or 0) < 1:
+                errors.append("Replica swaps must be at least 1 step apart")
+            if values.get("engine_process"):
+                errors.append("Parallel tempering runs its replicas in their own processes, "
+                              "untick the separate engine process")
+
+        # Minimum image of the pairs, and distinct neighbouring cells
+        boxsize = values.get("boxsize")
+        if boxsize is not None and values.get("potential") in POTENTIALS:
+            cutoff = potential_from_params(values).cutoff
+            if boxsize < 2 * cutoff:
+                errors.append(f"The box must be at least twice the cutoff ({cutoff}) wide")
+            elif (values.get("force_backend") == "cells" or mc_moves) and boxsize // cutoff < 3:
+                errors.append(f"The cells backend and Monte Carlo moves need a box "
+                              f"of at least 3 cutoffs ({3 * cutoff})")
+
+        workers = values.get("domain_workers") or 0
+        if workers < 0:
+            errors.append("Domain decomposition workers must be positive")
+        elif workers and values.get("engine_process"):
+            errors.append("The domain decomposition already runs in its own processes, "
+                          "untick the separate engine process")
+        elif workers and (values.get("eq_method") in ("mc", "pt") or any(k and k > 1 for k in respa_k)
+                          or values.get("eq_thermostat", "berendsen") != "berendsen"
+                          or values.get("prod_thermostat", "none") != "none"):
+            errors.append("Monte Carlo, parallel tempering, RESPA and the Langevin and Nosé-Hoover "
+                          "thermostats are not available with the domain decomposition")
+        elif workers and values.get("potential") in POTENTIALS and values.get("boxsize"):
+            cutoff = potential_from_params(values).cutoff
+            if values["boxsize"] / workers < cutoff or values["boxsize"] < 3 * cutoff:
+                errors.append(f"Each of the {workers} slabs must be at least one cutoff "
+                              f"({cutoff}) wide, and the box at least 3 cutoffs")
+
         if errors:
             return None, errors
         else: